@@ -0,0 +1,104 @@
+"""
+幸运屋页面解析耗时：单遍扫描的 parse_crowds vs 原来的回溯正则。
+
+用法：
+- python benchmarks/bench_crowd_parse.py
+- python benchmarks/bench_crowd_parse.py --sizes 500 1000 2000 4000
+
+两类合成页面：
+- normal：格式正常的页面（先校验两种实现结果一致）
+- truncated：页面被截断，只有按钮开头没有 </button>，正则对每个起点都会扫到页尾
+页面按钮数翻倍时，线性实现的耗时应大致翻倍，正则在 truncated 页面上约为 4 倍。
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from smzdm_tasklib import RE_CROWD_ID, RE_CROWD_TITLE, parse_crowds  # noqa: E402
+
+# 原 get_crowd 使用的正则（按档位泛化后的版本）
+RE_CROWD_BUTTON = re.compile(
+    r'<button\s+([^>]+?)>\s+?<div\s+[^>]+?>\s*([^<]+?)\s*</div>\s+<span\s+class="reduceNumber">-(\d+)</span>[\s\S]+?</button>',
+    re.I,
+)
+
+TIERS = [("免费抽奖", 0), ("免费", 0), ("5碎银子抽奖", 5), ("10碎银子", 10)]
+
+
+def parse_crowds_regex(html: str) -> List[Dict[str, Any]]:
+    crowds = []
+    for attrs, label, price in RE_CROWD_BUTTON.findall(html or ""):
+        m_id = RE_CROWD_ID.search(attrs)
+        m_title = RE_CROWD_TITLE.search(attrs)
+        crowds.append(
+            {
+                "crowd_id": m_id.group(1) if m_id else "",
+                "title": m_title.group(1) if m_title else "",
+                "name": label[:-2] if label.endswith("抽奖") else label,
+                "price": int(price),
+            }
+        )
+    return crowds
+
+
+def make_page(buttons: int, truncated: bool = False, seed: int = 0) -> str:
+    rnd = random.Random(seed)
+    parts = ['<html><body><div class="crowd-list">\n']
+    for i in range(buttons):
+        label, price = rnd.choice(TIERS)
+        parts.append(
+            f'<button class="J_crowd btn" data-crowd_id="{100000 + i}" data-title="礼品{i}">\n'
+            f'  <div class="crowd-name">{label}</div>\n'
+            f'  <span class="reduceNumber">-{price}</span>\n'
+            f"  <p>剩余 {rnd.randint(0, 99)} 份</p>\n"
+        )
+        if not truncated:
+            parts.append("</button>\n")
+        parts.append(f'<div class="gap">{"&nbsp;" * rnd.randint(0, 20)}</div>\n')
+    if not truncated:
+        parts.append("</div></body></html>")
+    return "".join(parts)
+
+
+def timed(fn: Callable[[str], Any], html: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(html)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="幸运屋页面解析耗时基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[250, 500, 1000, 2000])
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        html = make_page(size)
+        assert parse_crowds(html) == parse_crowds_regex(html), f"{size} 个按钮时结果不一致"
+    print("normal 页面两种实现结果一致")
+
+    print(f"{'page':<11}{'buttons':>8}{'KB':>8}{'linear ms':>12}{'regex ms':>12}")
+    for truncated in (False, True):
+        for size in args.sizes:
+            html = make_page(size, truncated=truncated)
+            linear = timed(parse_crowds, html, args.repeat)
+            regex = timed(parse_crowds_regex, html, args.repeat)
+            print(
+                f"{'truncated' if truncated else 'normal':<11}{size:>8}{len(html) / 1024:>8.0f}"
+                f"{linear * 1000:>12.2f}{regex * 1000:>12.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
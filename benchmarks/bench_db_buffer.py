@@ -0,0 +1,55 @@
+"""
+记录一条签到 / 兑换日志的调用耗时：同步提交 vs 写缓冲（write-behind）。
+
+用法：
+- python benchmarks/bench_db_buffer.py
+- python benchmarks/bench_db_buffer.py -n 2000
+
+使用临时目录下的 smzdm.db；计时结束后 close_writes()，校验全部记录都已落库、余额累加正确。
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import smzdm_db  # noqa: E402
+
+
+def run(number: int, buffered: bool) -> float:
+    os.environ["SMZDM_DB_BUFFER"] = "1" if buffered else "0"
+    started = time.perf_counter()
+    for i in range(number):
+        smzdm_db.adjust_balance(i % 10, delta_silver=1, remark="bench")
+        if i % 5 == 0:
+            smzdm_db.record_exchange(i % 10, "800626", "bench", "", 1, "silver", "success")
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="smzdm_db 写缓冲基准")
+    parser.add_argument("-n", "--number", type=int, default=1000)
+    args = parser.parse_args()
+
+    for buffered in (False, True):
+        with tempfile.TemporaryDirectory() as tmp:
+            smzdm_db.DB_PATH = os.path.join(tmp, "smzdm.db")
+            smzdm_db.init_db()
+            elapsed = run(args.number, buffered)
+            smzdm_db.close_writes()
+            with sqlite3.connect(smzdm_db.DB_PATH) as conn:
+                rows = conn.execute("SELECT COUNT(*) FROM checkin_logs").fetchone()[0]
+            assert rows == args.number, f"落库 {rows} 条，应为 {args.number}"
+            # 每次 adjust_balance 都基于上一条（可能尚未落库的）余额
+            assert smzdm_db.get_latest_balance(0)[0] == (args.number + 9) // 10
+            name = "write-behind" if buffered else "sync"
+            print(f"{name:<14}{elapsed / args.number * 1e6:>10.1f} us/次  落库 {rows} 条")
+
+
+if __name__ == "__main__":
+    main()
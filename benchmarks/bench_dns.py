@@ -0,0 +1,63 @@
+"""
+域名解析耗时：系统 getaddrinfo vs smzdm_dns 缓存。
+
+用法：
+- python benchmarks/bench_dns.py
+- python benchmarks/bench_dns.py -r 20 --hosts duihuan.smzdm.com user-api.smzdm.com
+
+对每个域名先用原始 getaddrinfo 解析 r 次（受系统 / nscd 缓存影响），
+再启用 smzdm_dns 后解析 r 次（第一次为未命中），输出中位数与最大值。
+解析失败（如无网络）的域名单独列出。
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import socket
+import statistics
+import sys
+import time
+from typing import Callable, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import smzdm_dns  # noqa: E402
+
+
+def timings(resolve: Callable[..., object], host: str, repeat: int) -> Optional[List[float]]:
+    result = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        try:
+            resolve(host, 443, socket.AF_UNSPEC, socket.SOCK_STREAM)
+        except OSError:
+            return None
+        result.append(time.perf_counter() - started)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="DNS 缓存基准")
+    parser.add_argument("-r", "--repeat", type=int, default=10)
+    parser.add_argument("--hosts", nargs="+", default=list(smzdm_dns.KNOWN_HOSTS))
+    args = parser.parse_args()
+
+    cache = smzdm_dns.DnsCache(ttl=300)
+    failed = []
+    print(f"{'host':<24}{'system p50':>12}{'system max':>12}{'cached p50':>12}{'first':>10}  (ms)")
+    for host in args.hosts:
+        system = timings(smzdm_dns._original_getaddrinfo, host, args.repeat)
+        cached = timings(cache.getaddrinfo, host, args.repeat)
+        if system is None or cached is None:
+            failed.append(host)
+            continue
+        print(
+            f"{host:<24}{statistics.median(system) * 1000:>12.3f}{max(system) * 1000:>12.3f}"
+            f"{statistics.median(cached[1:] or cached) * 1000:>12.4f}{cached[0] * 1000:>10.3f}"
+        )
+    if failed:
+        print(f"解析失败：{', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
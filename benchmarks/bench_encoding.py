@@ -0,0 +1,121 @@
+"""
+各接口在不同 Content-Encoding 下的传输字节数（bytes on wire）。
+
+用法：
+- python benchmarks/bench_encoding.py --local     # 使用本地模拟服务（合成的幸运屋页面）
+- python benchmarks/bench_encoding.py             # 访问真实页面，需配置 smzdm_duihuan 或 SMZDM_COOKIE
+
+对每个页面分别只声明 identity / gzip / br / zstd（后两者需安装 brotli / zstandard），
+读取未解压的原始响应体计数，并与 smzdm_bot.accept_encoding() 协商出的结果对比。
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import requests  # noqa: E402
+
+from smzdm_bot import PROXIES, accept_encoding  # noqa: E402
+
+# 重点关注的大页面
+ENDPOINTS: List[Tuple[str, str]] = [
+    ("duihuan 首页", "https://duihuan.smzdm.com/"),
+    ("礼品记录", "https://zhiyou.smzdm.com/user/gift/"),
+    ("幸运屋", "https://zhiyou.smzdm.com/user/crowd/"),
+]
+
+UA_WEB = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/143.0.0.0 Safari/537.36"
+)
+
+
+def measure(
+    session: requests.Session,
+    url: str,
+    encoding: str,
+    cookie: str = "",
+    proxies: Optional[Dict[str, str]] = None,
+) -> Tuple[str, int, int, float]:
+    """返回（服务端实际使用的编码, 传输字节数, 解压后字节数, 耗时秒）。"""
+    headers = {"Accept-Encoding": encoding, "User-Agent": UA_WEB}
+    if cookie:
+        headers["Cookie"] = cookie
+    started = time.perf_counter()
+    with session.get(url, headers=headers, stream=True, timeout=30, proxies=proxies) as resp:
+        raw = resp.raw.read(decode_content=False)
+        used = resp.headers.get("Content-Encoding", "identity") or "identity"
+    elapsed = time.perf_counter() - started
+
+    decoded = len(raw)
+    if used != "identity":
+        from urllib3.response import _get_decoder  # urllib3 内部的解码器，仅基准使用
+
+        decoder = _get_decoder(used)
+        decoded = len(decoder.decompress(raw) + decoder.flush())
+    return used, len(raw), decoded, elapsed
+
+
+def candidates() -> List[str]:
+    supported = [e.strip() for e in accept_encoding().split(",")]
+    result = ["identity", "gzip"]
+    result += [e for e in ("br", "zstd") if e in supported]
+    result.append(accept_encoding())
+    return result
+
+
+def run(endpoints: List[Tuple[str, str]], cookie: str, proxies: Optional[Dict[str, str]]) -> None:
+    session = requests.Session()
+    print(f"本机可解码：{accept_encoding()}")
+    print(f"{'endpoint':<14}{'Accept-Encoding':<24}{'used':<10}{'wire KB':>10}{'decoded KB':>12}{'ratio':>8}{'ms':>8}")
+    for name, url in endpoints:
+        for enc in candidates():
+            try:
+                used, wire, decoded, elapsed = measure(session, url, enc, cookie, proxies)
+            except Exception as e:
+                print(f"{name:<14}{enc:<24}失败：{e!r}")
+                continue
+            ratio = wire / decoded if decoded else 0
+            print(
+                f"{name:<14}{enc:<24}{used:<10}{wire / 1024:>10.1f}{decoded / 1024:>12.1f}"
+                f"{ratio:>8.2f}{elapsed * 1000:>8.0f}"
+            )
+
+
+def _live_cookie() -> str:
+    from smzdm_accounts import load_registry
+
+    registry = load_registry()
+    accounts = registry.exchange_accounts or registry.accounts
+    return accounts[0].cookie if accounts else ""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Content-Encoding 传输字节数基准")
+    parser.add_argument("--local", action="store_true", help="使用本地模拟服务")
+    parser.add_argument("--no-proxy", action="store_true", help="访问真实页面时不走 PROXIES")
+    args = parser.parse_args()
+
+    if args.local:
+        from mock_server import MockServer
+
+        with MockServer() as server:
+            run([("幸运屋(mock)", server.url + "/crowd/"), ("api(mock)", server.url + "/api/x")], "", None)
+        return
+
+    cookie = _live_cookie()
+    if not cookie:
+        print("请先配置 smzdm_duihuan 或 SMZDM_COOKIE，或使用 --local")
+        return
+    run(ENDPOINTS, cookie, None if args.no_proxy or not PROXIES else PROXIES)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+同一账号的并发请求：HTTP/1.1 连接池（requests）vs HTTP/2 多路复用（smzdm_http2，需安装 httpx、h2）。
+
+用法：
+- python benchmarks/bench_http2.py
+- python benchmarks/bench_http2.py -c 32 -n 256 --delay 0.05
+
+两边都通过 smzdm_bot.request_api 发请求（与脚本中的调用方式相同），
+对本地模拟服务并发发出 n 个请求（c 个线程），统计总耗时、单请求 p50 / p95 和服务端累计接受的连接数。
+HTTP/1.1 对比对象是本地 mock_server.MockServer，HTTP/2 是 mock_server_h2.H2MockServer（h2c）。
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from smzdm_bot import request_api  # noqa: E402
+
+
+def run_batch(session: Any, base_url: str, total: int, concurrency: int, delay: float) -> Tuple[float, List[float]]:
+    def one(i: int) -> float:
+        started = time.perf_counter()
+        res = request_api(
+            f"{base_url}/api/item/{i}?delay={delay}",
+            sign=False,
+            retry=0,
+            use_proxy=False,
+            session=session,
+        )
+        assert res.is_success, res.response
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one, range(total)))
+    return time.perf_counter() - started, latencies
+
+
+def report(name: str, server_factory: Callable[[], Any], session_factory: Callable[[], Any], args: argparse.Namespace) -> None:
+    with server_factory() as server:
+        session = session_factory()
+        try:
+            # 预热：建立连接（HTTP/2 还包括 SETTINGS 交换）
+            run_batch(session, server.url, args.concurrency, args.concurrency, 0)
+            warm_connections = server.connections
+            elapsed, latencies = run_batch(session, server.url, args.number, args.concurrency, args.delay)
+        finally:
+            session.close()
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{name:<10}{elapsed * 1000:>10.0f}{statistics.median(latencies) * 1000:>10.1f}{p95 * 1000:>10.1f}"
+        f"{args.number / elapsed:>10.0f}{warm_connections:>8}{server.connections:>8}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="HTTP/1.1 连接池 vs HTTP/2 多路复用")
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("-n", "--number", type=int, default=256)
+    parser.add_argument("--delay", type=float, default=0.02, help="模拟的服务端耗时（秒）")
+    args = parser.parse_args()
+
+    import requests
+
+    from mock_server import MockServer
+    from smzdm_http2 import Http2Session, is_available
+
+    print(f"{'transport':<10}{'total ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'req/s':>10}{'conn*':>8}{'conn':>8}")
+    report("http/1.1", lambda: MockServer(crowd_buttons=1), requests.Session, args)
+    if not is_available():
+        print("未安装 httpx / h2，跳过 HTTP/2")
+        return
+
+    from mock_server_h2 import H2MockServer
+
+    report("http/2", H2MockServer, lambda: Http2Session(http1=False), args)
+    print("conn* 为预热后的连接数，conn 为全部请求结束后的累计连接数")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+统计各 cron 入口脚本的导入耗时（基于 python -X importtime）。
+
+用法：
+- python benchmarks/bench_importtime.py                 # 默认统计全部入口，每个跑 5 次取中位数
+- python benchmarks/bench_importtime.py -n 10 smzdm_checkin_py
+- python benchmarks/bench_importtime.py --top 10        # 额外列出最耗时的 10 个依赖
+
+每次都在新的子进程里导入，避免 __pycache__ 以外的缓存影响结果。
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = [
+    "smzdm_checkin_py",
+    "smzdm_task_py",
+    "smzdm_lottery_py",
+    "smzdm_chaxun",
+    "smzdm_duihuan",
+    "smzdm_duihuan1",
+    "smzdm_runner",
+    "smzdm_orchestrator",
+]
+
+# import time:       self [us] |  cumulative | imported package
+RE_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def import_profile(module: str) -> Tuple[int, Dict[str, int]]:
+    """在子进程中导入 module，返回（模块累计耗时 us, {依赖: 自身耗时 us}）。"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败：{proc.stderr.strip().splitlines()[-1:]}")
+
+    total = 0
+    self_times: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        m = RE_LINE.match(line)
+        if not m:
+            continue
+        self_us, cumulative_us, _indent, name = m.groups()
+        self_times[name] = self_times.get(name, 0) + int(self_us)
+        if name == module:
+            total = int(cumulative_us)
+    return total, self_times
+
+
+def bench(modules: List[str], runs: int, top: int) -> None:
+    print(f"{'module':<22}{'median ms':>12}{'min ms':>10}{'max ms':>10}")
+    for module in modules:
+        totals: List[int] = []
+        heavy: Dict[str, int] = {}
+        for _ in range(runs):
+            total, self_times = import_profile(module)
+            totals.append(total)
+            for name, us in self_times.items():
+                heavy[name] = max(heavy.get(name, 0), us)
+
+        print(
+            f"{module:<22}{statistics.median(totals) / 1000:>12.1f}"
+            f"{min(totals) / 1000:>10.1f}{max(totals) / 1000:>10.1f}"
+        )
+        if top > 0:
+            for name, us in sorted(heavy.items(), key=lambda kv: kv[1], reverse=True)[:top]:
+                print(f"    {name:<40}{us / 1000:>8.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="cron 入口脚本导入耗时基准")
+    parser.add_argument("modules", nargs="*", default=ENTRY_POINTS)
+    parser.add_argument("-n", "--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=0, help="列出最耗时的前 N 个依赖（自身耗时）")
+    args = parser.parse_args()
+    bench(args.modules, max(1, args.runs), args.top)
+
+
+if __name__ == "__main__":
+    main()
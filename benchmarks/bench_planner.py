@@ -0,0 +1,94 @@
+"""
+兑换规划耗时：随机生成礼品表与账号余额，对比逐账号挑最贵礼品（旧逻辑）与 smzdm_planner 的背包规划。
+
+用法：
+- python benchmarks/bench_planner.py
+- python benchmarks/bench_planner.py --accounts 50 --gifts 300 --currencies silver,gold
+
+输出规划耗时、计划兑换件数和总价值，并校验每个账号不超余额、每件礼品不超库存。
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from smzdm_planner import plan_exchanges, value_function  # noqa: E402
+
+
+def make_data(accounts: int, gifts: int, seed: int) -> Tuple[Dict[int, Tuple[int, int]], List[Dict[str, Any]]]:
+    rng = random.Random(seed)
+    catalogue = [
+        {
+            "gift_id": str(800000 + i),
+            "name": f"礼品{i}",
+            "cost_value": rng.randrange(100, 5000, 10) if i % 3 else rng.randrange(10, 500, 10),
+            "cost_type": "silver" if i % 3 else "gold",
+            "remaining": rng.choice([-1, 1, 2, 5, 100]),
+        }
+        for i in range(gifts)
+    ]
+    balances = {a: (rng.randint(0, 20000), rng.randint(0, 2000)) for a in range(1, accounts + 1)}
+    return balances, catalogue
+
+
+def greedy(balances: Dict[int, Tuple[int, int]], gifts: List[Dict[str, Any]]) -> Dict[int, List[Dict[str, Any]]]:
+    """旧逻辑：每个账号只挑一件买得起的最贵碎银礼品，不看库存和其他账号。"""
+    silver = sorted(
+        (g for g in gifts if g["cost_type"] == "silver" and g["remaining"] != 0),
+        key=lambda g: -g["cost_value"],
+    )
+    plan = {}
+    for acc, (balance, _) in balances.items():
+        best = next((g for g in silver if g["cost_value"] <= balance), None)
+        if best:
+            plan[acc] = [best]
+    return plan
+
+
+def check(plan: Dict[int, List[Dict[str, Any]]], balances: Dict[int, Tuple[int, int]], gifts: List[Dict[str, Any]]) -> None:
+    for acc, items in plan.items():
+        assert sum(g["cost_value"] for g in items if g["cost_type"] == "silver") <= balances[acc][0]
+        assert sum(g["cost_value"] for g in items if g["cost_type"] == "gold") <= balances[acc][1]
+    used = Counter(g["gift_id"] for items in plan.values() for g in items)
+    for g in gifts:
+        assert g["remaining"] < 0 or used[g["gift_id"]] <= g["remaining"], g["gift_id"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="smzdm_planner 兑换规划基准")
+    parser.add_argument("--accounts", type=int, default=50)
+    parser.add_argument("--gifts", type=int, default=300)
+    parser.add_argument("--currencies", default="silver")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    balances, gifts = make_data(args.accounts, args.gifts, args.seed)
+    currencies = args.currencies.split(",")
+    value = value_function("cost", {})
+
+    for name, fn in (
+        ("greedy", lambda: greedy(balances, gifts)),
+        ("planner", lambda: plan_exchanges(balances, gifts, value=value, currencies=currencies, per_gift=1)),
+    ):
+        started = time.perf_counter()
+        plan = fn()
+        elapsed = time.perf_counter() - started
+        items = [g for v in plan.values() for g in v]
+        if name == "planner":
+            check(plan, balances, gifts)
+        print(
+            f"{name:<10}{elapsed * 1000:>9.1f} ms  {len(items):>5} 件  "
+            f"碎银 {sum(g['cost_value'] for g in items if g['cost_type'] == 'silver'):>8}  "
+            f"金币 {sum(g['cost_value'] for g in items if g['cost_type'] == 'gold'):>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+多进程共用限速：p 个进程 × t 个线程通过 request_api 请求本地模拟服务，统计实际请求速率。
+
+用法：
+- python benchmarks/bench_ratelimit.py                     # 4 进程 × 4 线程，限速 20 次/秒
+- python benchmarks/bench_ratelimit.py -p 8 -t 2 --rate 50 -n 400
+- python benchmarks/bench_ratelimit.py --rate 0            # 不限速，作对照
+
+令牌桶保存在临时目录的 smzdm.db（不影响项目目录下的数据库），
+实际速率应接近 rate（前 burst 个请求可以立即发出）；另外输出每次取令牌的平均开销。
+"""
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from typing import Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+
+def _worker(args: Tuple[str, str, float, int, int]) -> Tuple[int, float]:
+    db_path, url, rate, threads, count = args
+    os.environ["SMZDM_RATE_LIMIT"] = str(rate)
+    os.environ["SMZDM_DNS_CACHE"] = "0"
+
+    import smzdm_db
+    from concurrent.futures import ThreadPoolExecutor
+
+    from smzdm_bot import new_session, request_api
+
+    smzdm_db.DB_PATH = db_path
+    session = new_session()
+
+    def one(i: int) -> bool:
+        return request_api(f"{url}/api/{i}", sign=False, retry=0, use_proxy=False, session=session).is_success
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        ok = sum(pool.map(one, range(count)))
+    return ok, time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="多进程共用限速基准")
+    parser.add_argument("-p", "--processes", type=int, default=4)
+    parser.add_argument("-t", "--threads", type=int, default=4)
+    parser.add_argument("-n", "--number", type=int, default=200, help="总请求数")
+    parser.add_argument("--rate", type=float, default=20.0, help="每秒请求数，0 为不限速")
+    args = parser.parse_args()
+
+    from mock_server import MockServer
+
+    import smzdm_db
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "smzdm.db")
+        smzdm_db.DB_PATH = db_path
+        smzdm_db.init_db()
+
+        per_process = args.number // args.processes
+        with MockServer(crowd_buttons=1) as server:
+            jobs = [(db_path, server.url, args.rate, args.threads, per_process)] * args.processes
+            started = time.perf_counter()
+            with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+                results = pool.map(_worker, jobs)
+            elapsed = time.perf_counter() - started
+
+        # 单线程取令牌的开销（一次 IMMEDIATE 事务）
+        overhead_n = 500
+        t0 = time.perf_counter()
+        for _ in range(overhead_n):
+            smzdm_db.reserve_rate_token("bench:overhead", 1e9, 1e9)
+        overhead = (time.perf_counter() - t0) / overhead_n
+
+    ok = sum(r[0] for r in results)
+    total = per_process * args.processes
+    print(f"{args.processes} 进程 × {args.threads} 线程，{total} 次请求，成功 {ok}")
+    print(f"限速 {args.rate or '不限'} 次/秒，实际 {total / elapsed:.1f} 次/秒，总耗时 {elapsed:.2f}s（含进程启动）")
+    print(f"每次取令牌开销 {overhead * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
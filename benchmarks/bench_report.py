@@ -0,0 +1,87 @@
+"""
+收益报表耗时：直接扫描 checkin_logs（窗口函数算余额差值）vs 读取 daily_rollups。
+
+用法：
+- python benchmarks/bench_report.py                 # 100 万行日志
+- python benchmarks/bench_report.py -n 3000000 -a 20
+
+在临时目录生成 n 行、a 个账号、约一年的签到 / 任务日志，先做一次全量汇总（首次升级时的回填），
+再分别计时两种方式查询最近一个月「每个账号每天赚了多少碎银」，并校验结果一致。
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import smzdm_db  # noqa: E402
+
+RAW_SQL = """
+    SELECT account, day, SUM(CASE WHEN d > 0 THEN d ELSE 0 END) FROM (
+        SELECT account, substr(ts, 1, 10) AS day,
+               silver - LAG(silver) OVER (PARTITION BY account ORDER BY id) AS d
+        FROM checkin_logs
+    ) WHERE day BETWEEN ? AND ? GROUP BY account, day
+"""
+
+
+def generate(path: str, rows: int, accounts: int) -> None:
+    rnd = random.Random(0)
+    start = datetime(2025, 10, 1)
+    step = 365 * 86400 / rows
+    balances: Dict[int, int] = {}
+
+    def gen():
+        for i in range(rows):
+            account = rnd.randint(1, accounts)
+            silver = max(0, balances.get(account, 0) + rnd.randint(-5, 20))
+            balances[account] = silver
+            ts = (start + timedelta(seconds=i * step)).strftime("%Y-%m-%d %H:%M:%S")
+            yield account, silver, 0, ts, rnd.choice(("checkin", "task_reward"))
+
+    with sqlite3.connect(path) as conn:
+        conn.executemany("INSERT INTO checkin_logs(account, silver, gold, ts, remark) VALUES (?,?,?,?,?)", gen())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="收益报表耗时基准")
+    parser.add_argument("-n", "--rows", type=int, default=1_000_000)
+    parser.add_argument("-a", "--accounts", type=int, default=10)
+    args = parser.parse_args()
+
+    since, until = "2026-09-01", "2026-09-30"
+    with tempfile.TemporaryDirectory() as tmp:
+        smzdm_db.DB_PATH = os.path.join(tmp, "smzdm.db")
+        smzdm_db.init_db()
+        generate(smzdm_db.DB_PATH, args.rows, args.accounts)
+
+        started = time.perf_counter()
+        smzdm_db.refresh_rollups()
+        print(f"全量回填 {args.rows} 行：{time.perf_counter() - started:.2f}s（只在首次执行）")
+
+        started = time.perf_counter()
+        with sqlite3.connect(smzdm_db.DB_PATH) as conn:
+            raw = {(a, d): s for a, d, s in conn.execute(RAW_SQL, (since, until))}
+        raw_cost = time.perf_counter() - started
+
+        started = time.perf_counter()
+        rolled: Dict[Tuple[int, str], int] = {
+            (r["account"], r["day"]): r["silver_earned"] for r in smzdm_db.query_daily_rollups(since, until)
+        }
+        rollup_cost = time.perf_counter() - started
+
+        assert raw == rolled, "两种方式结果不一致"
+        print(f"扫描日志：{raw_cost * 1000:.1f} ms")
+        print(f"读汇总表：{rollup_cost * 1000:.2f} ms（{len(rolled)} 行，结果一致）")
+
+
+if __name__ == "__main__":
+    main()
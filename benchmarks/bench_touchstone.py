@@ -0,0 +1,104 @@
+"""
+对比 touchstone_event 的两种生成方式：每次 json.dumps 整个字典 vs 预序列化模板拼接。
+
+用法：
+- python benchmarks/bench_touchstone.py            # 先做逐字节一致性校验，再计时
+- python benchmarks/bench_touchstone.py -n 200000
+
+一致性校验覆盖任务脚本中的全部调用形态（含覆盖固定字段 sourceRoot、空对象），
+以及随机生成的对象；任何一处不一致都会直接 AssertionError 退出。
+不需要计时时直接跑 tests/test_touchstone.py（python -m pytest -q tests）。
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from smzdm_tasklib import SmzdmTaskBot  # noqa: E402
+
+
+def reference(obj: Dict[str, Any]) -> str:
+    """原实现：合并后整体 json.dumps。"""
+    merged = {**SmzdmTaskBot.TOUCHSTONE_DEFAULTS, **obj}
+    return json.dumps(merged, ensure_ascii=False)
+
+
+def sample_objects() -> List[Dict[str, Any]]:
+    aid, cid, keyword, keyword_id = "98765432", "11", "数码\"家电\"", "1234"
+    return [
+        {},
+        {
+            "event_value": {"cid": "null", "is_detail": False, "p": "1"},
+            "sourceMode": "我的_我的任务页",
+            "sourcePage": "Android/关注/达人/爆料榜",
+            "upperLevel_url": "关注/达人/推荐/",
+        },
+        {
+            "event_value": {"cid": "null", "is_detail": False},
+            "sourceMode": "栏目页",
+            "sourcePage": f"Android/栏目页/{keyword}/{keyword_id}/",
+            "source_page_type_id": str(keyword_id),
+            "upperLevel_url": "个人中心/赚奖励/",
+            "source_area": {"lanmu_id": str(keyword_id), "prev_source_scence": "我的_我的任务页"},
+        },
+        {
+            "event_value": {"aid": aid, "cid": cid, "is_detail": True, "pid": "无"},
+            "sourceMode": "排行榜_社区_好文精选",
+            "sourcePage": f"Android/长图文/P/{aid}/",
+            "upperLevel_url": "排行榜/社区/好文精选/文章_24H/",
+        },
+        {
+            "event_value": {"aid": aid, "cid": cid, "is_detail": True},
+            "sourceMode": "好物社区_全部",
+            "sourcePage": f"Android/长图文/{aid}/评论页/",
+            "upperLevel_url": "好物社区/首页/全部/",
+            "sourceRoot": "社区",
+        },
+        {"tv": "z2", "search_tv": None, "extra": [1, 2.5, " "]},
+    ]
+
+
+def random_objects(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rnd = random.Random(seed)
+    keys = list(SmzdmTaskBot.TOUCHSTONE_DEFAULTS) + ["sourceMode", "sourcePage", "event_value", "a\"b", "中文"]
+    values: List[Any] = ["", "x", "中文\n\t\"", 0, -1, 3.25, True, False, None, {"k": [1, "v"]}]
+    result = []
+    for _ in range(count):
+        picked = rnd.sample(keys, rnd.randint(0, len(keys)))
+        result.append({k: rnd.choice(values) for k in picked})
+    return result
+
+
+def check_equivalence(bot: SmzdmTaskBot) -> int:
+    objs = sample_objects() + random_objects(5000)
+    for obj in objs:
+        expected = reference(obj).encode("utf-8")
+        actual = bot.get_touchstone_event(obj).encode("utf-8")
+        assert actual == expected, f"不一致：{obj!r}\n{expected!r}\n{actual!r}"
+    return len(objs)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="touchstone_event 生成耗时基准")
+    parser.add_argument("-n", "--number", type=int, default=100000)
+    args = parser.parse_args()
+
+    bot = SmzdmTaskBot("sess=bench;")
+    checked = check_equivalence(bot)
+    print(f"逐字节一致：{checked} 个对象")
+
+    objs = sample_objects()[1:5]
+    for name, fn in (("json.dumps", reference), ("template", bot.get_touchstone_event)):
+        cost = timeit.timeit(lambda: [fn(o) for o in objs], number=max(1, args.number // len(objs)))
+        print(f"{name:<12}{cost / args.number * 1e6:>8.2f} us/次")
+
+
+if __name__ == "__main__":
+    main()
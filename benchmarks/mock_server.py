@@ -0,0 +1,147 @@
+"""
+基准测试用的本地 HTTP/1.1 模拟服务（不访问真实的什么值得买）。
+
+路由：
+- /crowd/      合成的幸运屋页面（见 bench_crowd_parse.make_page），约 250KB
+- /api/...     类似 user-api 的 JSON 响应：{"error_code": "0", "data": {...}}
+- 其他路径     返回 404
+
+按请求的 Accept-Encoding 选择 zstd / br / gzip / identity 压缩（前两者需安装对应的库），
+响应头带 Content-Length；query 参数 delay=秒 可模拟服务端耗时。
+
+用法：
+    with MockServer() as server:
+        requests.get(server.url + "/crowd/")
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def _encoders() -> Dict[str, Callable[[bytes], bytes]]:
+    encoders: Dict[str, Callable[[bytes], bytes]] = {"gzip": lambda b: gzip.compress(b, 6)}
+    try:
+        import brotli
+
+        encoders["br"] = lambda b: brotli.compress(b, quality=5)
+    except ImportError:
+        pass
+    try:
+        import zstandard
+
+        encoders["zstd"] = lambda b: zstandard.ZstdCompressor(level=3).compress(b)
+    except ImportError:
+        pass
+    return encoders
+
+
+ENCODERS = _encoders()
+# 客户端同时接受多种格式时的优先顺序
+PREFERENCE = ("zstd", "br", "gzip")
+
+
+def choose_encoding(accept: str) -> str:
+    offered = {e.split(";")[0].strip().lower() for e in (accept or "").split(",")}
+    return next((e for e in PREFERENCE if e in offered and e in ENCODERS), "identity")
+
+
+def route(path: str, pages: Dict[str, bytes]) -> Tuple[int, str, bytes]:
+    """按路径生成（状态码, Content-Type, 未压缩的响应体），HTTP/1.1 与 HTTP/2 模拟服务共用。"""
+    parsed = urlparse(path)
+    delay = float((parse_qs(parsed.query).get("delay") or ["0"])[0])
+    if delay > 0:
+        time.sleep(delay)
+    if parsed.path.rstrip("/") == "/crowd":
+        return 200, "text/html; charset=utf-8", pages["crowd"]
+    if parsed.path.startswith("/api/"):
+        payload = {"error_code": "0", "error_msg": "", "data": {"path": parsed.path, "rows": list(range(50))}}
+        return 200, "application/json", json.dumps(payload).encode("utf-8")
+    return 404, "text/plain", b"not found"
+
+
+class _CountingServer(ThreadingHTTPServer):
+    """记录累计接受的 TCP 连接数。"""
+
+    daemon_threads = True
+    request_queue_size = 128
+    connections = 0
+
+    def process_request(self, request: Any, client_address: Any) -> None:
+        self.connections += 1
+        super().process_request(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 响应头与响应体一起发出，避免 Nagle + 延迟 ACK 带来的 ~40ms 额外延迟
+    disable_nagle_algorithm = True
+    wbufsize = 64 * 1024
+    pages: Dict[str, bytes] = {}
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+    def _respond(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        status, ctype, body = route(self.path, self.pages)
+        encoding = choose_encoding(self.headers.get("Accept-Encoding", ""))
+        if encoding != "identity":
+            body = ENCODERS[encoding](body)
+
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        if encoding != "identity":
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _respond
+    do_POST = _respond
+
+
+class MockServer:
+    """在后台线程中运行的模拟服务，url 形如 http://127.0.0.1:端口；connections 为累计连接数。"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, crowd_buttons: int = 1000) -> None:
+        from bench_crowd_parse import make_page
+
+        _Handler.pages = {"crowd": make_page(crowd_buttons).encode("utf-8")}
+        self.httpd = _CountingServer((host, port), _Handler)
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def connections(self) -> int:
+        return self.httpd.connections
+
+    def __enter__(self) -> "MockServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    with MockServer(port=int(os.getenv("MOCK_PORT", "8765"))) as server:
+        print(f"mock server: {server.url}（Ctrl+C 退出），支持压缩：{', '.join(ENCODERS)}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,121 @@
+"""
+基准测试用的本地 HTTP/2 模拟服务（h2c，prior knowledge，不走 TLS），需安装 h2。
+
+路由与 mock_server.MockServer 相同（共用 mock_server.route），但只适合小响应体：
+没有实现发送方向的流量控制，响应体超过 64KB（如 /crowd/）时会被截断，基准只请求 /api/...。
+
+同一连接上的每个流在单独的线程中处理，delay 参数模拟的服务端耗时可以并行。
+"""
+from __future__ import annotations
+
+import os
+import socket
+import sys
+import threading
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_server import ENCODERS, choose_encoding, route  # noqa: E402
+
+MAX_FRAME = 16384
+
+
+class _Connection:
+    def __init__(self, sock: socket.socket, pages: Dict[str, bytes]) -> None:
+        import h2.config
+        import h2.connection
+
+        self.sock = sock
+        self.pages = pages
+        self.conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False, header_encoding="utf-8"))
+        self.lock = threading.Lock()
+        self.headers: Dict[int, Dict[str, str]] = {}
+
+    def _flush(self) -> None:
+        data = self.conn.data_to_send()
+        if data:
+            self.sock.sendall(data)
+
+    def serve(self) -> None:
+        import h2.events
+
+        with self.lock:
+            self.conn.initiate_connection()
+            self._flush()
+        try:
+            while True:
+                data = self.sock.recv(65535)
+                if not data:
+                    break
+                with self.lock:
+                    events = self.conn.receive_data(data)
+                    for event in events:
+                        if isinstance(event, h2.events.RequestReceived):
+                            self.headers[event.stream_id] = dict(event.headers)
+                        elif isinstance(event, h2.events.DataReceived):
+                            self.conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                        elif isinstance(event, h2.events.StreamEnded):
+                            headers = self.headers.pop(event.stream_id, {})
+                            threading.Thread(target=self.respond, args=(event.stream_id, headers), daemon=True).start()
+                        elif isinstance(event, h2.events.ConnectionTerminated):
+                            return
+                    self._flush()
+        except OSError:
+            pass
+        finally:
+            self.sock.close()
+
+    def respond(self, stream_id: int, headers: Dict[str, str]) -> None:
+        status, ctype, body = route(headers.get(":path", "/"), self.pages)
+        encoding = choose_encoding(headers.get("accept-encoding", ""))
+        if encoding != "identity":
+            body = ENCODERS[encoding](body)
+        response_headers = [(":status", str(status)), ("content-type", ctype), ("content-length", str(len(body)))]
+        if encoding != "identity":
+            response_headers.append(("content-encoding", encoding))
+        with self.lock:
+            try:
+                self.conn.send_headers(stream_id, response_headers)
+                window = min(len(body), self.conn.local_flow_control_window(stream_id))
+                for start in range(0, window, MAX_FRAME):
+                    self.conn.send_data(stream_id, body[start : min(start + MAX_FRAME, window)])
+                self.conn.end_stream(stream_id)
+                self._flush()
+            except Exception:
+                pass
+
+
+class H2MockServer:
+    """在后台线程中运行的 h2c 模拟服务，url 形如 http://127.0.0.1:端口；connections 为累计连接数。"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(128)
+        self.url = f"http://{host}:{self.sock.getsockname()[1]}"
+        self.connections = 0
+        self.pages: Dict[str, bytes] = {"crowd": b""}
+        self._threads: List[threading.Thread] = []
+        self._thread: Optional[threading.Thread] = None
+
+    def _accept_loop(self) -> None:
+        while True:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.connections += 1
+            thread = threading.Thread(target=_Connection(client, self.pages).serve, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def __enter__(self) -> "H2MockServer":
+        self._thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.sock.close()
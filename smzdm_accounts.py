@@ -0,0 +1,151 @@
+"""
+账号注册表：一次性解析所有凭据环境变量，得到带类型的账号记录，整个进程共享。
+
+支持的环境变量：
+- smzdm_duihuan: cookies1#cookies2#cookies3  （整份网页 Cookie）
+  形如：isg=...;MAWEBCUID=...;PSINO=7;PSTM=...;r_sort_type=score;sess=xxxx;...
+- smzdm_safe 或 SMZDM_SAFE: 158306#368041#...  （安全码列表，与 cookie 一一对应）
+- SMZDM_COOKIE: 旧方案，多账号用 & 或换行分隔；条目形如 cookie1#158306（# 后为安全码）
+
+规则（与原 get_env_cookies_raw / _iter_full_cookies_and_safe 保持一致）：
+- smzdm_duihuan 与 smzdm_safe 同时配置时，任务账号取自 smzdm_duihuan，
+  Cookie 只保留 sess 字段（找不到 sess 则用整份 Cookie）；否则回落到 SMZDM_COOKIE
+- 兑换账号始终取自 smzdm_duihuan（整份 Cookie），安全码取 smzdm_safe 或 SMZDM_SAFE
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from smzdm_bot import parse_cookie, to_android_cookie
+
+
+ENV_KEYS = ("smzdm_duihuan", "smzdm_safe", "SMZDM_SAFE", "SMZDM_COOKIE")
+
+
+@dataclass(frozen=True)
+class Account:
+    index: int  # 从 1 开始
+    cookie: str  # 任务脚本使用的 Cookie（不含安全码）
+    safe_pass: str
+    token: str  # Cookie 中的 sess
+    smzdm_id: str
+    device_id: str
+    android_cookie: str
+    raw: str  # 旧格式条目：cookie 或 cookie#安全码
+
+
+@dataclass(frozen=True)
+class AccountRegistry:
+    accounts: Tuple[Account, ...]  # 签到 / 任务 / 抽奖等普通脚本使用
+    exchange_accounts: Tuple[Account, ...]  # 兑换脚本使用（smzdm_duihuan 整份 Cookie）
+    raw_entries: Tuple[str, ...] = ()  # get_env_cookies_raw 的返回值（含只有安全码的条目）
+
+    def get(self, index: int) -> Optional[Account]:
+        return next((a for a in self.accounts if a.index == index), None)
+
+    def get_exchange(self, index: int) -> Optional[Account]:
+        return next((a for a in self.exchange_accounts if a.index == index), None)
+
+
+def _split(value: str, sep: str) -> List[str]:
+    return [v.strip() for v in (value or "").split(sep) if v.strip()]
+
+
+def make_account(index: int, cookie: str, safe_pass: str = "", raw: str = "") -> Account:
+    """对单个 Cookie 做一次解析，生成账号记录。"""
+    fields = parse_cookie(cookie)
+    return Account(
+        index=index,
+        cookie=cookie,
+        safe_pass=safe_pass,
+        token=fields.get("sess", ""),
+        smzdm_id=fields.get("smzdm_id", ""),
+        device_id=fields.get("device_id", ""),
+        android_cookie=to_android_cookie(cookie),
+        raw=raw or cookie,
+    )
+
+
+def _sess_only(raw_cookie: str) -> str:
+    sess_val = parse_cookie(raw_cookie).get("sess", "")
+    if sess_val:
+        return f"sess={sess_val};"
+    # 若未找到 sess 字段，则退回使用整份 Cookie（确保结尾有分号）
+    return raw_cookie if raw_cookie.endswith(";") else raw_cookie + ";"
+
+
+@lru_cache(maxsize=8)
+def _build_registry(env: Tuple[str, ...]) -> AccountRegistry:
+    raw_duihuan, raw_safe_lower, raw_safe_upper, raw_cookie = env
+
+    full_cookies = _split(raw_duihuan, "#")
+    exchange_safes = _split(raw_safe_lower or raw_safe_upper, "#")
+    exchange_accounts = tuple(
+        make_account(
+            idx,
+            ck,
+            exchange_safes[idx - 1] if idx - 1 < len(exchange_safes) else "",
+        )
+        for idx, ck in enumerate(full_cookies, start=1)
+    )
+
+    accounts: List[Account] = []
+    raw_entries: List[str] = []
+    task_safes = _split(raw_safe_lower, "#")
+    if full_cookies and task_safes:
+        # 新方案：只保留 sess，安全码取 smzdm_safe
+        for idx, ck in enumerate(full_cookies, start=1):
+            cookie = _sess_only(ck)
+            safe = task_safes[idx - 1] if idx - 1 < len(task_safes) else ""
+            raw = f"{cookie}#{safe}" if safe else cookie
+            raw_entries.append(raw)
+            accounts.append(make_account(idx, cookie, safe, raw))
+    elif raw_cookie:
+        # 旧方案：SMZDM_COOKIE
+        if "&" in raw_cookie:
+            entries = raw_cookie.split("&")
+        elif "\n" in raw_cookie:
+            entries = raw_cookie.splitlines()
+        else:
+            entries = [raw_cookie]
+        raw_entries = [e.strip() for e in entries if e.strip()]
+        for entry in raw_entries:
+            cookie, _, safe = entry.partition("#")
+            cookie = cookie.strip()
+            if cookie:
+                accounts.append(make_account(len(accounts) + 1, cookie, safe.strip(), entry))
+
+    return AccountRegistry(
+        accounts=tuple(accounts),
+        exchange_accounts=exchange_accounts,
+        raw_entries=tuple(raw_entries),
+    )
+
+
+def load_registry() -> AccountRegistry:
+    """
+    返回当前环境变量对应的账号注册表。
+    以环境变量内容为缓存键：同一进程内只解析一次，环境变量变化后自动重建。
+    """
+    return _build_registry(tuple(os.getenv(k, "") or "" for k in ENV_KEYS))
+
+
+def load_accounts() -> List[Account]:
+    return list(load_registry().accounts)
+
+
+def load_exchange_accounts() -> List[Account]:
+    return list(load_registry().exchange_accounts)
+
+
+__all__ = [
+    "Account",
+    "AccountRegistry",
+    "load_registry",
+    "load_accounts",
+    "load_exchange_accounts",
+    "make_account",
+]
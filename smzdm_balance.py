@@ -0,0 +1,75 @@
+"""
+余额同步：兑换前并发查询所有账号的实时碎银 / 金币，校准数据库中的余额。
+
+- 数据库余额只靠解析奖励文案推算，可能过期或不准；这里请求 zhiyou 的 jsonp_get_current
+  （smzdm_duihuan.get_user_info）拿到真实余额
+- 所有账号并发查询，并发数由 smzdm_concurrency 的 AIMD 控制器自适应调整
+- 与数据库不一致时写入一条 remark=sync 的快照，偏差记入 balance_drift 表
+- 查询失败的账号保留数据库余额，不影响兑换
+
+环境变量：
+- SMZDM_BALANCE_REFRESH: 设为 0 关闭（默认开启）
+- SMZDM_BALANCE_WORKERS: 最大并发数（默认 8）
+"""
+from __future__ import annotations
+
+import os
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from smzdm_db import reconcile_balance
+
+if TYPE_CHECKING:
+    import requests
+
+
+def fetch_balance(cookie: str, session: Optional[requests.Session] = None) -> Optional[Tuple[int, int]]:
+    """查询单个账号的实时（碎银, 金币），失败返回 None。"""
+    from smzdm_duihuan import get_user_info
+
+    info = get_user_info(cookie, session=session)
+    if not isinstance(info, dict):
+        return None
+    try:
+        return int(info["silver"]), int(info["gold"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def refresh_balances(
+    accounts: List[Tuple[int, str]],
+    max_workers: Optional[int] = None,
+    sessions: Optional[Dict[int, requests.Session]] = None,
+) -> Dict[int, Tuple[int, int]]:
+    """
+    并发查询 accounts（[(account_index, 兑换 Cookie), ...]）的实时余额并校准数据库，
+    返回查询成功的 {account_index: (碎银, 金币)}。
+    """
+    if not accounts or os.getenv("SMZDM_BALANCE_REFRESH", "1") == "0":
+        return {}
+
+    from smzdm_concurrency import AimdController, run_adaptive
+
+    workers = max_workers or int(os.getenv("SMZDM_BALANCE_WORKERS", "8") or 8)
+    sessions = sessions or {}
+    controller = AimdController(initial=2, maximum=max(1, workers), window=4)
+    results = run_adaptive(lambda acc: fetch_balance(acc[1], sessions.get(acc[0])), accounts, controller)
+
+    # sqlite 写入放在调用线程中执行（兼容 shared_connection）
+    balances: Dict[int, Tuple[int, int]] = {}
+    drifted = 0
+    for (idx, _), balance in zip(accounts, results):
+        if balance is None:
+            print(f"账号{idx} 实时余额查询失败，沿用数据库余额")
+            continue
+        balances[idx] = balance
+        drift_silver, drift_gold = reconcile_balance(idx, *balance)
+        if drift_silver or drift_gold:
+            drifted += 1
+            print(f"账号{idx} 余额已校准：碎银 {drift_silver:+d}，金币 {drift_gold:+d}（现为 {balance[0]} / {balance[1]}）")
+    print(
+        f"刷新 {len(accounts)} 个账号余额：成功 {len(balances)}，校准 {drifted}；{controller.format_metrics()}"
+    )
+    return balances
+
+
+__all__ = ["fetch_balance", "refresh_balances"]
@@ -4,23 +4,45 @@
 环境变量：
 - smzdm_duihuan: 兑换用 Cookie，多账号用 # 分隔，如 cookie1#cookie2
 - smzdm_safe 或 SMZDM_SAFE: 安全码，多账号用 # 分隔，与 cookie 一一对应（必填，否则跳过兑换）
+
+- SMZDM_EXCHANGE_FAIL_TTL: 按失败原因覆盖负缓存时长（秒），如 "out_of_stock=3600,ineligible=0"（0 表示不缓存）
+
+兑换前先并发查询所有账号的实时余额并校准数据库（smzdm_balance），
+再由 smzdm_planner 统一规划兑换哪些礼品（所有账号一起算，考虑库存），相关环境变量见这两个模块。
+
+兑换失败时按接口返回归类，已知原因写入 smzdm.db 的负缓存（exchange_failures），过期前规划时直接跳过：
+- out_of_stock（已兑完）：所有账号跳过该礼品，默认 6 小时
+- limit_reached（达到兑换上限）：该账号跳过该礼品，到次日 0 点
+- ineligible（不符合兑换条件）：该账号跳过该礼品，默认 7 天
+- insufficient（余额不足）：该账号跳过该礼品，默认 1 小时
+- auth / safe_pass（Cookie 失效 / 安全码错误）：该账号跳过所有礼品，默认 30 分钟
+- 网络异常等其他失败不缓存
 """
 from __future__ import annotations
 
 import os
+import re
 import time
-import requests
-from typing import Iterable
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
 
+from smzdm_balance import refresh_balances
 from smzdm_bot import PROXIES, bark_notify
+from smzdm_dns import install as install_dns_cache
+from smzdm_ratelimit import acquire as acquire_rate_token
 from smzdm_db import (
     init_db,
+    get_exchange_failures,
     get_latest_balance,
     list_gift_items,
-    pick_best_affordable_gift,
     record_exchange,
+    record_exchange_failure,
     adjust_balance,
 )
+from smzdm_planner import format_plan, plan_from_db
+
+if TYPE_CHECKING:
+    import requests
 
 
 UA_PC = (
@@ -29,7 +51,12 @@ UA_PC = (
 )
 
 
-def post_exchange(cookie: str, safe_pass: str, gift_id: str) -> dict:
+def post_exchange(
+    cookie: str,
+    safe_pass: str,
+    gift_id: str,
+    session: Optional[requests.Session] = None,
+) -> dict:
     """
     POST https://duihuan.smzdm.com/quan/lingqugift/{gift_id}
     """
@@ -58,13 +85,17 @@ def post_exchange(cookie: str, safe_pass: str, gift_id: str) -> dict:
         "sourcePage": f"https://duihuan.smzdm.com/d/{gift_id}/",
     }
 
+    import requests
+
     # 先走 SOCKS5 代理，如果失败再直连
     proxy_enabled = bool(PROXIES)
     last_error: Exception | None = None
 
     for _ in range(2):
         try:
-            resp = requests.post(
+            # 兑换请求不经过 request_api，这里单独按 host 限速
+            acquire_rate_token(url)
+            resp = (session or requests).post(
                 url,
                 headers=headers,
                 data=data,
@@ -86,22 +117,248 @@ def post_exchange(cookie: str, safe_pass: str, gift_id: str) -> dict:
     return {"isSuccess": False, "error": repr(last_error)}
 
 
+# 失败原因 -> (接口返回中的关键词, 作用范围, 默认缓存秒数)
+# 作用范围：gift 所有账号的该礼品；account_gift 该账号的该礼品；account 该账号的所有礼品
+# 默认秒数为 None 表示到次日 0 点
+EXCHANGE_FAILURES: Dict[str, Tuple[str, str, Optional[float]]] = {
+    "auth": (r"登录|登陆", "account", 1800),
+    "safe_pass": (r"安全码|密码", "account", 1800),
+    "out_of_stock": (r"库存|兑完|领完|抢光|抢完|售罄|已结束|下架", "gift", 6 * 3600),
+    "limit_reached": (r"上限|限兑|限领|次数|已兑换过|已领取过|每日|每天|今日", "account_gift", None),
+    "ineligible": (r"资格|条件|等级|仅限|专享|不满足|不符合", "account_gift", 7 * 86400),
+    "insufficient": (r"不足", "account_gift", 3600),
+}
+
+EXCHANGE_FAILURE_TITLES = {
+    "auth": "Cookie 失效",
+    "safe_pass": "安全码错误",
+    "out_of_stock": "已兑完",
+    "limit_reached": "达到兑换上限",
+    "ineligible": "不符合兑换条件",
+    "insufficient": "余额不足",
+}
+
+
+def classify_exchange_failure(resp: Any) -> str:
+    """
+    把 post_exchange 的失败返回归类为 EXCHANGE_FAILURES 中的原因；
+    网络异常、非 JSON 返回、无法识别的提示返回空串（不缓存）。
+    """
+    if not isinstance(resp, dict) or "error_code" not in resp:
+        return ""
+    if str(resp.get("error_code")) == "4":
+        return "auth"
+    msg = str(resp.get("error_msg") or "")
+    for reason, (pattern, _, _) in EXCHANGE_FAILURES.items():
+        if re.search(pattern, msg):
+            return reason
+    return ""
+
+
+def _failure_ttl(reason: str) -> float:
+    overrides = {
+        key.strip(): value.strip()
+        for key, _, value in (
+            item.partition("=") for item in os.getenv("SMZDM_EXCHANGE_FAIL_TTL", "").split(",") if "=" in item
+        )
+    }
+    if reason in overrides:
+        try:
+            return max(0.0, float(overrides[reason]))
+        except ValueError:
+            pass
+    ttl = EXCHANGE_FAILURES[reason][2]
+    if ttl is None:
+        tomorrow = (datetime.now() + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        return (tomorrow - datetime.now()).total_seconds()
+    return ttl
+
+
+def remember_exchange_failure(idx: int, gift_id: str, reason: str, message: str = "") -> None:
+    """按原因的作用范围与缓存时长写入负缓存。"""
+    ttl = _failure_ttl(reason)
+    if ttl <= 0:
+        return
+    scope = EXCHANGE_FAILURES[reason][1]
+    record_exchange_failure(
+        account=0 if scope == "gift" else idx,
+        gift_id="*" if scope == "account" else gift_id,
+        reason=reason,
+        message=message,
+        ttl=ttl,
+    )
+
+
+def cached_exchange_failure(idx: int, gift_id: str = "*") -> str:
+    """
+    查询负缓存中该账号兑换该礼品（gift_id 为 * 时只看整个账号）是否近期已知会失败，返回原因，没有则返回空串。
+    兑换过程中新写入的失败（如已兑完对所有账号生效）也会被后续账号看到。
+    """
+    failures = get_exchange_failures([idx])
+    for account in (idx, 0):
+        scoped = failures.get(account, {})
+        reason = scoped.get("*") or (scoped.get(gift_id) if gift_id != "*" else None)
+        if reason:
+            return reason
+    return ""
+
+
+def format_exchange_failures(failures: Dict[int, Dict[str, str]]) -> str:
+    lines = []
+    for account in sorted(failures):
+        for gift_id, reason in sorted(failures[account].items()):
+            who = "所有账号" if account == 0 else f"账号{account}"
+            what = "所有礼品" if gift_id == "*" else f"礼品 {gift_id}"
+            lines.append(f"  {who} {what}：{EXCHANGE_FAILURE_TITLES.get(reason, reason)}")
+    return "\n".join(lines)
+
+
 def _iter_full_cookies_and_safe() -> Iterable[tuple[int, str, str]]:
     """
     从环境变量读取 smzdm_duihuan（Cookie）与 安全码（smzdm_safe 或 SMZDM_SAFE）。
     安全码必填，否则该账号跳过兑换。
     """
-    raw_cookies = (os.getenv("smzdm_duihuan") or "").strip()
-    raw_safe = (os.getenv("smzdm_safe") or os.getenv("SMZDM_SAFE") or "").strip()
-    cookies = [c.strip() for c in raw_cookies.split("#") if c.strip()]
-    safes = [s.strip() for s in raw_safe.split("#") if s.strip()]
-    for idx, ck in enumerate(cookies, start=1):
-        safe = safes[idx - 1] if idx - 1 < len(safes) else ""
-        yield idx, ck, safe
+    from smzdm_accounts import load_exchange_accounts
+
+    for account in load_exchange_accounts():
+        yield account.index, account.cookie, account.safe_pass
+
+
+def _exchange_gift(
+    idx: int,
+    cookie: str,
+    safe_pass: str,
+    gift: Dict[str, Any],
+    session: Optional[requests.Session] = None,
+) -> Optional[str]:
+    """
+    兑换一件礼品：调用接口、写兑换记录，成功时扣减数据库余额并 Bark 通知。
+    成功返回 None，失败返回失败原因（见 classify_exchange_failure，无法归类时为空串）。
+    """
+    gift_id = gift["gift_id"]
+    gift_name = gift["name"]
+    cost_value = gift["cost_value"]
+    cost_type = gift["cost_type"]
+
+    print(
+        f"  兑换礼品：{gift_name}（ID: {gift_id}，消耗 {cost_value}{'碎银' if cost_type=='silver' else '金币'}）"
+    )
+
+    # 1. 执行兑换
+    resp = post_exchange(cookie, safe_pass, gift_id, session=session)
+    ok = False
+    reason = ""
+    if isinstance(resp, dict):
+        err_code = str(resp.get("error_code", ""))
+        err_msg = str(resp.get("error_msg", resp.get("error", "")))
+        if err_code == "0":
+            ok = True
+            print(f"  兑换接口返回成功：{gift_name}")
+        else:
+            print(f"  兑换失败：{err_msg or resp}")
+            if err_code == "4":
+                bark_notify("什么值得买兑换失败", f"账号{idx} Cookie 失效，请重新更新")
+            reason = classify_exchange_failure(resp)
+            if reason:
+                # 已知会持续失败的原因写入负缓存，之后的运行不再尝试
+                remember_exchange_failure(idx, gift_id, reason, err_msg)
+    else:
+        print(f"  兑换接口异常：{resp!r}")
+
+    # 2. 写入兑换记录（券码由 smzdm_duihuan1 爬取存库，此处不获取）
+    record_exchange(
+        account=idx,
+        gift_id=gift_id,
+        gift_name=gift_name,
+        code="",
+        cost_value=cost_value,
+        cost_type=cost_type,
+        status="success" if ok else "fail",
+    )
+
+    # 3. 成功时扣减数据库中的碎银/金币，并 Bark 通知
+    if ok:
+        if cost_type == "silver":
+            adjust_balance(idx, delta_silver=-cost_value, remark=f"exchange {gift_id}")
+        else:
+            adjust_balance(idx, delta_gold=-cost_value, remark=f"exchange {gift_id}")
+
+        bark_notify(
+            "什么值得买兑换成功",
+            f"账号{idx} 成功兑换 {gift_name}，消耗 {cost_value}{'碎银' if cost_type=='silver' else '金币'}",
+        )
+        return None
+    return reason
+
+
+def exchange_account(
+    idx: int,
+    cookie: str,
+    safe_pass: str,
+    session: Optional[requests.Session] = None,
+    plan: Optional[List[Dict[str, Any]]] = None,
+) -> str:
+    """
+    单个账号的自动兑换流程，返回一句结果摘要（供 main 与 smzdm_orchestrator 复用）。
+    plan 为 smzdm_planner 为该账号规划的礼品；不传时只按本账号的余额规划（不考虑其他账号抢库存）。
+    """
+    # 1. 碎银、金币从数据库获取
+    silver, gold = get_latest_balance(idx)
+    print(f"  当前碎银: {silver}，金币: {gold}（数据库）")
+
+    # 2. 兑换计划
+    if plan is None:
+        plan = plan_from_db([idx]).get(idx, [])
+    if not plan:
+        # 整个账号被负缓存屏蔽（鉴权失败、安全码错误等）时规划为空，报告缓存的原因而不是余额不足
+        blocked = cached_exchange_failure(idx)
+        if blocked:
+            title = EXCHANGE_FAILURE_TITLES.get(blocked, blocked)
+            print(f"  近期{title}，跳过。")
+            return f"近期{title}，未兑换"
+        print("  余额不足以兑换任何礼品，跳过。")
+        return "余额不足，未兑换"
+
+    # 3. 安全码通过环境变量获取，未配置则跳过兑换
+    names = "、".join(g["name"] for g in plan)
+    if not safe_pass:
+        print(f"  计划兑换：{names}，但未配置安全码（smzdm_safe / SMZDM_SAFE），跳过兑换。")
+        return "未配置安全码，未兑换"
+
+    # 4. 按计划逐件兑换（价格从高到低）。只影响这件礼品的失败（已兑完、达到上限等）继续兑换下一件，
+    #    其他失败即停止：余额或 Cookie 可能已与数据库不符。
+    #    计划在兑换开始前生成，每件礼品兑换前再查一次负缓存，跳过本次运行中新记下的失败
+    done: List[str] = []
+    failed: List[str] = []
+    skipped: List[str] = []
+    for gift in plan:
+        cached = cached_exchange_failure(idx, gift["gift_id"])
+        if cached:
+            print(f"  {gift['name']} 近期{EXCHANGE_FAILURE_TITLES.get(cached, cached)}，跳过。")
+            skipped.append(gift["name"])
+            continue
+        reason = _exchange_gift(idx, cookie, safe_pass, gift, session=session)
+        if reason is None:
+            done.append(gift["name"])
+            continue
+        failed.append(gift["name"])
+        if reason not in ("out_of_stock", "limit_reached", "ineligible"):
+            break
+
+    parts = []
+    if done:
+        parts.append(f"成功兑换 {'、'.join(done)}")
+    if failed:
+        parts.append(f"兑换 {'、'.join(failed)} 失败")
+    if skipped:
+        parts.append(f"跳过近期已知会失败的 {'、'.join(skipped)}")
+    return "，".join(parts)
 
 
 def main() -> None:
     init_db()
+    # 兑换请求不一定经过 new_session，这里先启用 DNS 缓存并预解析
+    install_dns_cache()
 
     # 从数据库打印礼品列表
     gifts = list_gift_items()
@@ -114,82 +371,37 @@ def main() -> None:
             print(f"  ID {g['gift_id']} | {g['name']} | {g['cost_value']} {ct} | 剩余 {g['remaining']}")
     print()
 
-    any_account = False
-    for idx, cookie, safe_pass in _iter_full_cookies_and_safe():
-        any_account = True
-        print(f"开始第{idx}个账号自动兑换流程：")
-        time.sleep(3)
+    accounts = list(_iter_full_cookies_and_safe())
+    planned = [idx for idx, _, safe_pass in accounts if safe_pass]
 
-        # 1. 碎银、金币从数据库获取
-        silver, gold = get_latest_balance(idx)
-        print(f"  当前碎银: {silver}，金币: {gold}（数据库）")
+    # 数据库余额只靠解析奖励文案推算，规划前用实时余额校准
+    refresh_balances([(idx, cookie) for idx, cookie, safe_pass in accounts if safe_pass])
+    print()
 
-        # 2. 从商品表选出可兑换的最高价礼品（只看碎银）
-        gift = pick_best_affordable_gift(silver)
-        if not gift:
-            print("  当前碎银不足以兑换任何礼品，跳过。")
-            print("-" * 50)
-            continue
+    failures = get_exchange_failures(planned)
+    if failures:
+        print("=== 近期已知会失败的兑换（跳过）===")
+        print(format_exchange_failures(failures))
+        print()
 
-        gift_id = gift["gift_id"]
-        gift_name = gift["name"]
-        cost_value = gift["cost_value"]
-        cost_type = gift["cost_type"]
+    # 所有账号一起规划（未配置安全码的账号不参与，不占库存）
+    plan = plan_from_db(planned, blocked=failures)
+    print("=== 兑换计划 ===")
+    print(format_plan(plan))
+    print()
 
-        # 3. 安全码通过环境变量获取，未配置则跳过兑换
-        if not safe_pass:
-            print(
-                f"  计划兑换：{gift_name}（ID: {gift_id}），但未配置安全码（smzdm_safe / SMZDM_SAFE），跳过兑换。"
-            )
+    for idx, cookie, safe_pass in accounts:
+        print(f"开始第{idx}个账号自动兑换流程：")
+        blocked = cached_exchange_failure(idx)
+        if blocked:
+            print(f"  近期{EXCHANGE_FAILURE_TITLES.get(blocked, blocked)}，跳过。")
             print("-" * 50)
             continue
-
-        print(
-            f"  计划兑换礼品：{gift_name}（ID: {gift_id}，消耗 {cost_value}{'碎银' if cost_type=='silver' else '金币'}）"
-        )
-
-        # 4. 执行兑换
-        resp = post_exchange(cookie, safe_pass, gift_id)
-        ok = False
-        if isinstance(resp, dict):
-            err_code = str(resp.get("error_code", ""))
-            err_msg = str(resp.get("error_msg", resp.get("error", "")))
-            if err_code == "0":
-                ok = True
-                print(f"  兑换接口返回成功：{gift_name}")
-            else:
-                print(f"  兑换失败：{err_msg or resp}")
-                if err_code == "4":
-                    bark_notify("什么值得买兑换失败", f"账号{idx} Cookie 失效，请重新更新")
-        else:
-            print(f"  兑换接口异常：{resp!r}")
-
-        # 5. 写入兑换记录（券码由 smzdm_duihuan1 爬取存库，此处不获取）
-        record_exchange(
-            account=idx,
-            gift_id=gift_id,
-            gift_name=gift_name,
-            code="",
-            cost_value=cost_value,
-            cost_type=cost_type,
-            status="success" if ok else "fail",
-        )
-
-        # 6. 成功时扣减数据库中的碎银/金币，并 Bark 通知
-        if ok:
-            if cost_type == "silver":
-                adjust_balance(idx, delta_silver=-cost_value, remark=f"exchange {gift_id}")
-            else:
-                adjust_balance(idx, delta_gold=-cost_value, remark=f"exchange {gift_id}")
-
-            bark_notify(
-                "什么值得买兑换成功",
-                f"账号{idx} 成功兑换 {gift_name}，消耗 {cost_value}{'碎银' if cost_type=='silver' else '金币'}",
-            )
-
+        time.sleep(3)
+        exchange_account(idx, cookie, safe_pass, plan=plan.get(idx, []) if safe_pass else None)
         print("-" * 50)
 
-    if not any_account:
+    if not accounts:
         print("未设置 smzdm_duihuan（及 smzdm_safe / SMZDM_SAFE）或未解析到任何账号。")
 
 
@@ -1,11 +1,14 @@
+from __future__ import annotations
+
 import os
-from typing import List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
-from Crypto.Cipher import DES
-from Crypto.Util.Padding import pad
+from smzdm_bot import SmzdmBot, remove_tags, get_env_cookies, wait, bark_notify
+from smzdm_db import get_identities, init_db, record_checkin, save_identities
+from smzdm_health import format_invalid, preflight, record_response
 
-from smzdm_bot import SmzdmBot, request_api, remove_tags, get_env_cookies, wait, bark_notify
-from smzdm_db import init_db, record_checkin
+if TYPE_CHECKING:
+    import requests
 
 
 class SmzdmCheckinBot(SmzdmBot):
@@ -13,8 +16,14 @@ class SmzdmCheckinBot(SmzdmBot):
     Python 版本签到 Bot，对应 smzdm_checkin.js 的主要逻辑。
     """
 
-    def __init__(self, cookie: str, sk: str, account_index: int = 1) -> None:
-        super().__init__(cookie)
+    def __init__(
+        self,
+        cookie: str,
+        sk: str,
+        account_index: int = 1,
+        session: Optional[requests.Session] = None,
+    ) -> None:
+        super().__init__(cookie, session=session)
         self.sk = (sk or "").strip()
         self.account_index = int(account_index)
 
@@ -25,7 +34,7 @@ class SmzdmCheckinBot(SmzdmBot):
         return f"{msg1}{msg2}{msg3}"
 
     def checkin(self) -> dict:
-        resp = request_api(
+        resp = self.request_api(
             "https://user-api.smzdm.com/checkin",
             method="post",
             headers=self.get_headers(),
@@ -36,6 +45,7 @@ class SmzdmCheckinBot(SmzdmBot):
                 "captcha": "",
             },
         )
+        record_response(self.account_index, resp)
 
         if resp["isSuccess"]:
             data = resp["data"]["data"]
@@ -69,7 +79,7 @@ class SmzdmCheckinBot(SmzdmBot):
             return {"isSuccess": False, "msg": "签到失败！"}
 
     def all_reward(self) -> dict:
-        resp = request_api(
+        resp = self.request_api(
             "https://user-api.smzdm.com/checkin/all_reward",
             method="post",
             headers=self.get_headers(),
@@ -99,7 +109,7 @@ class SmzdmCheckinBot(SmzdmBot):
 
         wait(5, 10)
 
-        resp = request_api(
+        resp = self.request_api(
             "https://user-api.smzdm.com/checkin/extra_reward",
             method="post",
             headers=self.get_headers(),
@@ -115,7 +125,7 @@ class SmzdmCheckinBot(SmzdmBot):
             return {"isSuccess": False, "msg": ""}
 
     def is_continue_checkin(self) -> bool:
-        resp = request_api(
+        resp = self.request_api(
             "https://user-api.smzdm.com/checkin/show_view_v2",
             method="post",
             headers=self.get_headers(),
@@ -133,7 +143,7 @@ class SmzdmCheckinBot(SmzdmBot):
             return False
 
     def get_vip_info(self) -> Optional[dict]:
-        resp = request_api(
+        resp = self.request_api(
             "https://user-api.smzdm.com/vip",
             method="post",
             headers=self.get_headers(),
@@ -146,43 +156,84 @@ class SmzdmCheckinBot(SmzdmBot):
             return None
 
 
+SK_DES_KEY = "geZm53XAspb02exN".encode("utf-8")[:8]
+
+
 def _random32() -> str:
     chars = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
     return "".join(os.urandom(1)[0] % len(chars) and chars[os.urandom(1)[0] % len(chars)] or chars[0] for _ in range(32))
 
 
-def _get_device_id(cookie: str) -> str:
+def _cookie_field(cookie: str, name: str) -> str:
     import re
 
-    m = re.search(r"device_id=([^;]*)", cookie)
-    if m:
-        return m.group(1)
-    return _random32()
+    m = re.search(rf"{name}=([^;]*)", cookie)
+    return m.group(1) if m else ""
+
+
+def _encrypt_sk(cipher: Any, user_id: str, device_id: str) -> str:
+    from Crypto.Util.Padding import pad
+    import base64
+
+    plaintext = (user_id + device_id).encode("utf-8")
+    encrypted = cipher.encrypt(pad(plaintext, 8))
+    # 与 CryptoJS 默认保持一致，使用 Base64 文本
+    return base64.b64encode(encrypted).decode("utf-8")
+
+
+def precompute_sks(cookies: List[str]) -> List[str]:
+    """
+    批量计算 sk，结果与 cookies 一一对应（没有 smzdm_id 的返回空串）。
+
+    - 先一次性查 smzdm.db 的 account_identity 缓存，命中则不做任何加密
+    - Cookie 里没有 device_id 时复用缓存中的 device_id，保证 sk 稳定；都没有才随机生成
+    - 缺失的账号共用一个 DES 实例计算，并在同一事务中写回缓存
+    """
+    ids = [(_cookie_field(c, "smzdm_id"), _cookie_field(c, "device_id")) for c in cookies]
+    cached = get_identities(uid for uid, _ in ids)
+    fresh: Dict[str, Tuple[str, str]] = {}
+    cipher = None
+    result: List[str] = []
+
+    for user_id, device_id in ids:
+        if not user_id:
+            result.append("")
+            continue
+
+        hit = fresh.get(user_id) or cached.get(user_id)
+        if hit and (not device_id or device_id == hit[0]):
+            result.append(hit[1])
+            continue
+
+        device_id = device_id or (hit[0] if hit else _random32())
+        if cipher is None:
+            # pycryptodome 只在需要自行计算 sk 时才导入（配置了 SMZDM_SK 或缓存命中就用不到）
+            from Crypto.Cipher import DES
+
+            # CryptoJS DES 使用 8 字节 key，这里取前 8 个字节
+            cipher = DES.new(SK_DES_KEY, DES.MODE_ECB)
+        sk = _encrypt_sk(cipher, user_id, device_id)
+        fresh[user_id] = (device_id, sk)
+        result.append(sk)
+
+    save_identities(fresh)
+    return result
 
 
 def calc_sk(cookie: str) -> str:
     """
     尽量复刻 JS 中的 getSk：
     CryptoJS.DES.encrypt(userId + deviceId, key, { mode: ECB, padding: Pkcs7 })
-    """
-    import re
-
-    m = re.search(r"smzdm_id=([^;]*)", cookie)
-    if not m:
-        return ""
 
-    user_id = m.group(1)
-    device_id = _get_device_id(cookie)
-    plaintext = (user_id + device_id).encode("utf-8")
+    结果按 smzdm_id 缓存在 smzdm.db 中，见 precompute_sks。
+    """
+    return precompute_sks([cookie])[0]
 
-    # CryptoJS DES 使用 8 字节 key，这里取前 8 个字节
-    key = "geZm53XAspb02exN".encode("utf-8")[:8]
-    cipher = DES.new(key, DES.MODE_ECB)
-    encrypted = cipher.encrypt(pad(plaintext, DES.block_size))
-    # 与 CryptoJS 默认保持一致，使用 Base64 文本
-    import base64
 
-    return base64.b64encode(encrypted).decode("utf-8")
+def prepare_accounts(cookies: List[str]) -> None:
+    """启动时为未配置 SMZDM_SK 的账号批量预计算 sk。"""
+    sks = _env_sks()
+    precompute_sks([c for i, c in enumerate(cookies) if c and i >= len(sks)])
 
 
 def _split_env_multi(value: str) -> List[str]:
@@ -193,6 +244,25 @@ def _split_env_multi(value: str) -> List[str]:
     return [value]
 
 
+def _env_sks() -> List[str]:
+    raw_sk = os.getenv("SMZDM_SK")
+    return _split_env_multi(raw_sk) if raw_sk else []
+
+
+def run_account(
+    account_index: int, cookie: str, session: Optional[requests.Session] = None
+) -> str:
+    """
+    单个账号的签到流程（account_index 从 1 开始），供 main 与 smzdm_runner 复用。
+    """
+    sks = _env_sks()
+    i = account_index - 1
+    sk = sks[i] if i < len(sks) else calc_sk(cookie)
+
+    bot = SmzdmCheckinBot(cookie, sk, account_index=account_index, session=session)
+    return bot.run()
+
+
 def main() -> None:
     # 初始化数据库
     init_db()
@@ -202,27 +272,22 @@ def main() -> None:
         print("\n请先设置 SMZDM_COOKIE 环境变量")
         return
 
-    sks: List[str] = []
-    raw_sk = os.getenv("SMZDM_SK")
-    if raw_sk:
-        sks = _split_env_multi(raw_sk)
-
-    notify_content = []
-
-    for i, cookie in enumerate(cookies):
-        if not cookie:
-            continue
+    # 先并发预检一次，失效账号不参与签到，也不占用账号间的等待时间
+    accounts, invalid = preflight([(i + 1, c) for i, c in enumerate(cookies) if c])
+    alive = {idx for idx, _ in accounts}
+    prepare_accounts([c if i + 1 in alive else "" for i, c in enumerate(cookies)])
 
-        sk = sks[i] if i < len(sks) else calc_sk(cookie)
+    # 失效账号不再签到，但仍出现在汇总里
+    notify_content = [format_invalid(invalid)] if invalid else []
 
-        if i > 0:
+    for n, (idx, cookie) in enumerate(accounts):
+        if n > 0:
             wait(10, 30)
 
-        sep = f"\n****** 账号{i + 1} ******\n"
+        sep = f"\n****** 账号{idx} ******\n"
         print(sep)
 
-        bot = SmzdmCheckinBot(cookie, sk, account_index=i + 1)
-        msg = bot.run()
+        msg = run_account(idx, cookie)
         notify_content.append(sep + msg + "\n")
 
     print("\n".join(notify_content))
@@ -0,0 +1,183 @@
+"""
+自适应并发（AIMD）：根据 request_api 的成功率与耗时，自动调整同时执行的账号 / 任务数。
+
+- 每收满一个窗口（window 次请求）评估一次：
+  错误率超过 error_rate、或耗时中位数超过 latency_target 时，并发上限乘以 decrease（乘性减）；
+  否则上限加 increase（加性增），不超过 maximum
+- 计入错误的情况：超时 / 网络异常、HTTP 5xx、error_code 非 0
+  （鉴权失败 error_code=4 是账号状态，不代表服务端过载，不计入）
+- controller.attach() 期间，所有线程中 request_api 的结果都会喂给控制器
+- 当前上限通过 controller.limit / controller.metrics() 暴露，history 记录每次调整
+
+用法：
+    controller = AimdController(initial=2, maximum=8)
+    results = run_adaptive(fn, items, controller)
+
+环境变量：
+- SMZDM_AIMD_WINDOW: 评估窗口（请求数，默认 8）
+- SMZDM_AIMD_ERROR_RATE: 窗口内错误率阈值（默认 0.25）
+- SMZDM_AIMD_LATENCY: 耗时中位数阈值（秒，默认 5）
+"""
+from __future__ import annotations
+
+import os
+import statistics
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+from smzdm_bot import add_request_observer, remove_request_observer
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# 不代表服务端过载的失败原因
+BENIGN_REASONS = frozenset({"error_code:4"})
+
+
+class AimdController:
+    """加性增、乘性减的并发上限控制器，同时充当动态上限的信号量。"""
+
+    def __init__(
+        self,
+        initial: int = 2,
+        minimum: int = 1,
+        maximum: int = 8,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        window: Optional[int] = None,
+        error_rate: Optional[float] = None,
+        latency_target: Optional[float] = None,
+    ) -> None:
+        self.minimum = max(1, int(minimum))
+        self.maximum = max(self.minimum, int(maximum))
+        self.increase = increase
+        self.decrease = decrease
+        self.window = window or int(os.getenv("SMZDM_AIMD_WINDOW", "8") or 8)
+        self.error_rate = error_rate if error_rate is not None else float(os.getenv("SMZDM_AIMD_ERROR_RATE", "0.25") or 0.25)
+        self.latency_target = (
+            latency_target if latency_target is not None else float(os.getenv("SMZDM_AIMD_LATENCY", "5") or 5)
+        )
+
+        self._limit = float(min(self.maximum, max(self.minimum, initial)))
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._samples: List[Tuple[bool, float]] = []
+        self.requests = 0
+        self.errors = 0
+        self.history: List[Tuple[float, int, str]] = [(time.time(), self.limit, "initial")]
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    # ---- 信号量 ----
+    def acquire(self) -> None:
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def __enter__(self) -> "AimdController":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.release()
+
+    # ---- 反馈 ----
+    def observe(self, ok: bool, latency: float, reason: str = "") -> None:
+        """记录一次请求结果；reason 为失败原因（timeout / exception / http_5xx / error_code:N）。"""
+        is_error = not ok and reason not in BENIGN_REASONS
+        with self._cond:
+            self.requests += 1
+            self.errors += int(is_error)
+            self._samples.append((is_error, latency))
+            if len(self._samples) < self.window:
+                return
+            samples, self._samples = self._samples, []
+
+            errors = sum(1 for e, _ in samples if e)
+            median = statistics.median(lat for _, lat in samples)
+            if errors / len(samples) > self.error_rate:
+                self._set_limit(self._limit * self.decrease, f"错误率 {errors}/{len(samples)}")
+            elif median > self.latency_target:
+                self._set_limit(self._limit * self.decrease, f"耗时中位数 {median:.1f}s")
+            else:
+                self._set_limit(self._limit + self.increase, "正常")
+
+    def _set_limit(self, value: float, reason: str) -> None:
+        old = self.limit
+        self._limit = min(float(self.maximum), max(float(self.minimum), value))
+        if self.limit != old:
+            self.history.append((time.time(), self.limit, reason))
+            # 上限变大时唤醒等待的线程
+            self._cond.notify_all()
+
+    def _on_request(self, url: str, ok: bool, latency: float, reason: str) -> None:
+        self.observe(ok, latency, reason)
+
+    def attach(self) -> "AimdController":
+        """开始接收 request_api 的结果（所有线程）。"""
+        add_request_observer(self._on_request)
+        return self
+
+    def detach(self) -> None:
+        remove_request_observer(self._on_request)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "in_flight": self._in_flight,
+                "requests": self.requests,
+                "errors": self.errors,
+                "max_limit": max(limit for _, limit, _ in self.history),
+                "adjustments": len(self.history) - 1,
+            }
+
+    def format_metrics(self) -> str:
+        m = self.metrics()
+        return (
+            f"并发上限 {m['limit']}（最高 {m['max_limit']}，调整 {m['adjustments']} 次），"
+            f"请求 {m['requests']} 次，错误 {m['errors']} 次"
+        )
+
+
+def run_adaptive(
+    fn: Callable[[T], R],
+    items: Iterable[T],
+    controller: AimdController,
+) -> List[R]:
+    """
+    用线程池执行 fn(item)，同时执行的数量受 controller 的当前上限约束；结果保持 items 的顺序。
+    执行期间 controller 自动 attach 到 request_api。
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    items = list(items)
+    if not items:
+        return []
+
+    def run_one(item: T) -> R:
+        with controller:
+            return fn(item)
+
+    controller.attach()
+    try:
+        with ThreadPoolExecutor(max_workers=min(controller.maximum, len(items))) as pool:
+            return list(pool.map(run_one, items))
+    finally:
+        controller.detach()
+
+
+__all__ = ["AimdController", "BENIGN_REASONS", "run_adaptive"]
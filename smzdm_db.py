@@ -1,17 +1,66 @@
 import os
+import json
+import time
+import glob
+import atexit
+import signal
+import socket
 import sqlite3
-from typing import Iterable, Dict, Any, Tuple, Optional
+import threading
+from contextlib import contextmanager
+from typing import Iterable, Dict, Any, Iterator, Tuple, Optional, List, Set
 from datetime import datetime
 
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "smzdm.db")
 
+# shared_connection() 期间复用的连接，仅供打开它的线程使用
+_shared_conn: Optional[sqlite3.Connection] = None
+_shared_thread: Optional[int] = None
+
+
+class _SharedConnection:
+    """共享连接的代理：close() 为空操作，由 shared_connection() 退出时统一关闭。"""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self._conn = conn
+
+    def close(self) -> None:
+        pass
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._conn, name)
+
 
 def _get_conn() -> sqlite3.Connection:
+    if _shared_conn is not None and _shared_thread == threading.get_ident():
+        return _SharedConnection(_shared_conn)  # type: ignore[return-value]
     return sqlite3.connect(DB_PATH)
 
 
-def init_db() -> None:
+@contextmanager
+def shared_connection() -> Iterator[None]:
+    """
+    在 with 块内让本线程的所有 smzdm_db 函数共用一个 sqlite 连接，
+    避免长流程里每条记录都重新打开数据库（smzdm_orchestrator 使用）。
+    """
+    global _shared_conn, _shared_thread
+    if _shared_conn is not None:
+        yield
+        return
+
+    _shared_conn = sqlite3.connect(DB_PATH)
+    _shared_thread = threading.get_ident()
+    try:
+        yield
+    finally:
+        conn = _shared_conn
+        _shared_conn = None
+        _shared_thread = None
+        conn.close()
+
+
+def init_db(refresh: bool = True) -> None:
     """
     初始化 sqlite3 数据库。
 
@@ -19,6 +68,17 @@ def init_db() -> None:
     1) checkin_logs：签到 & 资产变动记录（账号、碎银、金币、时间）
     2) gift_items：商品信息（由 smzdm_duihuan1 爬取）
     3) exchange_logs：兑换记录（由兑换脚本写入）
+
+    另有 task_checkpoints：任务脚本的断点日志（按天、账号、任务记录进度）；
+    account_health：账号凭据是否有效（最近一次成功 / 鉴权失败）；
+    kv_cache：带过期时间的键值缓存；
+    rate_buckets：按 host（可选再按账号）的令牌桶，多进程共享请求速率（见 smzdm_ratelimit）；
+    exchange_failures：兑换失败的负缓存（已兑完、达到上限等），过期前规划兑换时跳过；
+    balance_drift：实时余额与数据库余额的偏差记录（见 smzdm_balance）。
+
+    daily_rollups：按账号、按天的收支汇总（rollup_state / rollup_balances 记录汇总进度）。
+
+    最后回放已退出进程遗留的写缓冲 spill 文件（见 WriteBuffer），并补齐汇总表（refresh=False 时跳过）。
     """
     conn = _get_conn()
     cur = conn.cursor()
@@ -72,30 +132,474 @@ def init_db() -> None:
         """
     )
 
+    # 任务断点日志：进程中断后按 run_date + account + task_id 续跑
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS task_checkpoints (
+            run_date TEXT NOT NULL,
+            account INTEGER NOT NULL,
+            task_id TEXT NOT NULL,
+            step TEXT NOT NULL,
+            payload TEXT DEFAULT '{}',        -- JSON：待删除的 comment_id、待撤销的关注/收藏等
+            ts TEXT NOT NULL,
+            PRIMARY KEY (run_date, account, task_id)
+        )
+        """
+    )
+
+    # 账号设备身份缓存：固定 device_id，并缓存据此算出的签到 sk
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS account_identity (
+            smzdm_id TEXT PRIMARY KEY,
+            device_id TEXT NOT NULL,
+            sk TEXT NOT NULL,
+            ts TEXT NOT NULL
+        )
+        """
+    )
+
+    # 账号租约：多进程 / 多机器共享同一个 smzdm.db 时，按 job + 日期 + 账号领取，避免重复执行
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS account_leases (
+            job TEXT NOT NULL,
+            run_date TEXT NOT NULL,
+            account INTEGER NOT NULL,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            status TEXT NOT NULL,             -- running / done
+            result TEXT DEFAULT '',
+            PRIMARY KEY (job, run_date, account)
+        )
+        """
+    )
+
+    # 账号凭据健康状态：最近一次成功 / 鉴权失败，失效账号在预检阶段直接跳过
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS account_health (
+            account INTEGER PRIMARY KEY,
+            status TEXT NOT NULL,             -- ok / invalid
+            error_code TEXT DEFAULT '',
+            message TEXT DEFAULT '',
+            last_ok_ts TEXT DEFAULT '',
+            last_fail_ts TEXT DEFAULT '',
+            ts TEXT NOT NULL
+        )
+        """
+    )
+
+    # 通用键值缓存（带过期时间）：如抽奖活动 hashId，多个账号 / 多次运行共用
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS kv_cache (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            ts TEXT NOT NULL
+        )
+        """
+    )
+
+    # 兑换失败负缓存：按失败原因设置过期时间，过期前不再尝试
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS exchange_failures (
+            account INTEGER NOT NULL,         -- 0 表示对所有账号生效（如礼品已兑完）
+            gift_id TEXT NOT NULL,            -- * 表示该账号的所有礼品（如 Cookie 失效）
+            reason TEXT NOT NULL,
+            message TEXT DEFAULT '',
+            expires_at REAL NOT NULL,
+            ts TEXT NOT NULL,
+            PRIMARY KEY (account, gift_id)
+        )
+        """
+    )
+
+    # 余额偏差：实时查询到的余额与数据库推算余额不一致时记录一行
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS balance_drift (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account INTEGER NOT NULL,
+            db_silver INTEGER NOT NULL,
+            db_gold INTEGER NOT NULL,
+            live_silver INTEGER NOT NULL,
+            live_gold INTEGER NOT NULL,
+            ts TEXT NOT NULL
+        )
+        """
+    )
+
+    # 令牌桶：tokens 可以为负（已预约、尚在等待的请求）
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS rate_buckets (
+            key TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """
+    )
+
+    # 按账号、按天汇总（由 checkin_logs / exchange_logs 增量维护，报表只读这张表）
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS daily_rollups (
+            account INTEGER NOT NULL,
+            day TEXT NOT NULL,                -- YYYY-MM-DD
+            silver_earned INTEGER NOT NULL DEFAULT 0,
+            silver_spent INTEGER NOT NULL DEFAULT 0,
+            gold_earned INTEGER NOT NULL DEFAULT 0,
+            gold_spent INTEGER NOT NULL DEFAULT 0,
+            silver_end INTEGER,               -- 当天最后一条记录的余额
+            gold_end INTEGER,
+            checkins INTEGER NOT NULL DEFAULT 0,
+            tasks INTEGER NOT NULL DEFAULT 0,
+            exchanges INTEGER NOT NULL DEFAULT 0,
+            exchanges_ok INTEGER NOT NULL DEFAULT 0,
+            exchange_silver INTEGER NOT NULL DEFAULT 0,
+            exchange_gold INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (account, day)
+        )
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_daily_rollups_day ON daily_rollups(day)")
+    # 汇总进度：各日志表已汇总到的最大 id；以及各账号汇总到的最新余额（用于计算增减）
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL
+        )
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS rollup_balances (
+            account INTEGER PRIMARY KEY,
+            silver INTEGER NOT NULL,
+            gold INTEGER NOT NULL
+        )
+        """
+    )
+
     conn.commit()
     conn.close()
 
+    # 回放上次崩溃 / 被 kill 的进程遗留的写缓冲，再把历史日志补进汇总表（首次运行时全量，之后只有新增）
+    replay_spill_files()
+    if refresh:
+        refresh_rollups()
+
 
 def _now() -> str:
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
 
-def record_checkin(account: int, silver: int, gold: int, remark: str = "checkin") -> None:
-    """记录一次签到/资产快照。"""
+# ---------------- 写缓冲（write-behind） ----------------
+# record_checkin / adjust_balance / record_exchange 只把记录放进内存队列并追加到 spill 文件，
+# 由后台线程按条数 / 时间阈值在一个事务内批量落库，网络流程中不再等待 sqlite 提交。
+# - 进程退出（含 SIGTERM）时自动 flush
+# - spill 文件每行一条记录（写入后立即 flush 到内核，进程崩溃不丢），由下一次 init_db 回放
+# - 已落库的最大序号与数据在同一事务中写入 kv_cache，回放时跳过，不会重复插入
+# - spill 文件名带主机名和 pid，只回放本机已退出进程的文件：多台机器共享 smzdm.db（--lease）时，
+#   其他机器上仍在运行的进程无法从本机探测，它们的文件留给各自的机器回放
+# - get_latest_balance 优先读队列中尚未落库的余额
+#
+# 环境变量：
+# - SMZDM_DB_BUFFER: 设为 0 关闭写缓冲（每条记录同步提交）
+# - SMZDM_DB_BUFFER_SIZE: 累计多少条立即落库（默认 50）
+# - SMZDM_DB_BUFFER_INTERVAL: 最长落库间隔（秒，默认 2）
+
+_BUFFERED_SQL: Dict[str, str] = {
+    "checkin": "INSERT INTO checkin_logs(account, silver, gold, ts, remark) VALUES (?,?,?,?,?)",
+    "exchange": """
+        INSERT INTO exchange_logs
+            (account, gift_id, gift_name, code, cost_value, cost_type, ts, status)
+        VALUES (?,?,?,?,?,?,?,?)
+        """,
+}
+
+# spill 文件的落库序号在 kv_cache 中保留的时间（回放完成后删除）
+_SPILL_MARKER_TTL = 30 * 86400
+
+# spill 文件名中的主机名（只保留字母数字，"-" 用作文件名内的分隔符）
+_HOST = "".join(c if c.isalnum() else "_" for c in socket.gethostname()) or "localhost"
+
+
+def _spill_marker(path: str) -> str:
+    return f"write_buffer:{os.path.basename(path)}"
+
+
+def _write_rows(rows: List[Tuple[int, str, List[Any]]], spill_path: str = "") -> None:
+    """在一个事务内写入 [(序号, 类型, 参数), ...]，同时记录 spill 文件已落库的最大序号。"""
     conn = _get_conn()
     cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO checkin_logs(account, silver, gold, ts, remark) VALUES (?,?,?,?,?)",
-        (account, int(silver), int(gold), _now(), remark),
-    )
-    conn.commit()
-    conn.close()
+    try:
+        cur.execute("BEGIN IMMEDIATE")
+        for _, kind, params in rows:
+            cur.execute(_BUFFERED_SQL[kind], tuple(params))
+        # 汇总表与日志在同一事务中更新
+        _refresh_rollups(cur)
+        if spill_path and rows:
+            cur.execute(
+                "INSERT OR REPLACE INTO kv_cache (key, value, expires_at, ts) VALUES (?,?,?,?)",
+                (_spill_marker(spill_path), str(rows[-1][0]), time.time() + _SPILL_MARKER_TTL, _now()),
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+class WriteBuffer:
+    """按条数 / 时间阈值批量落库的写缓冲（每个进程一个，见 get_write_buffer）。"""
+
+    def __init__(self, max_rows: int = 50, interval: float = 2.0) -> None:
+        self.max_rows = max(1, int(max_rows))
+        self.interval = float(interval)
+        self.spill_path = f"{DB_PATH}.wb-{_HOST}-{os.getpid()}-{time.time_ns()}.jsonl"
+        self._spill: Optional[Any] = None
+        self._rows: List[Tuple[int, str, List[Any]]] = []
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._worker, name="smzdm-db-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def add(self, kind: str, params: Tuple[Any, ...]) -> None:
+        with self._cond:
+            self._seq += 1
+            row = (self._seq, kind, list(params))
+            if self._spill is None:
+                self._spill = open(self.spill_path, "a", encoding="utf-8")
+            self._spill.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self._spill.flush()
+            self._rows.append(row)
+            if len(self._rows) >= self.max_rows:
+                self._cond.notify_all()
+
+    @property
+    def pending_rows(self) -> int:
+        with self._cond:
+            return len(self._rows)
+
+    def pending_balance(self, account: int) -> Optional[Tuple[int, int]]:
+        """队列中该账号最新的一条余额记录（尚未落库），没有则返回 None。"""
+        with self._cond:
+            for _, kind, params in reversed(self._rows):
+                if kind == "checkin" and int(params[0]) == int(account):
+                    return int(params[1]), int(params[2])
+        return None
+
+    def flush(self) -> bool:
+        """把当前队列中的记录在一个事务内落库；失败时保留在队列中，下次重试。"""
+        with self._flush_lock:
+            with self._cond:
+                batch = list(self._rows)
+            if not batch:
+                return True
+            try:
+                _write_rows(batch, self.spill_path)
+            except Exception as e:
+                print(f"写缓冲落库失败（{len(batch)} 条，稍后重试）：{e!r}")
+                return False
+            with self._cond:
+                # flush 期间新加入的记录排在 batch 之后，保留
+                del self._rows[: len(batch)]
+                if not self._rows and self._spill is not None:
+                    self._spill.truncate(0)
+            return True
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                if len(self._rows) < self.max_rows:
+                    self._cond.wait(self.interval)
+            self.flush()
+
+    def close(self) -> None:
+        """flush 剩余记录；全部落库后删除 spill 文件。"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        ok = self.flush()
+        with self._cond:
+            if self._spill is not None:
+                self._spill.close()
+                self._spill = None
+                if ok and not self._rows:
+                    try:
+                        os.remove(self.spill_path)
+                        cache_delete(_spill_marker(self.spill_path))
+                    except Exception:
+                        pass
+
+
+_write_buffer: Optional[WriteBuffer] = None
+_write_buffer_pid: Optional[int] = None
+_write_buffer_lock = threading.Lock()
+
+
+def _on_sigterm(signum: int, frame: object) -> None:
+    # 转成 SystemExit，让 atexit 中的 flush 有机会执行
+    raise SystemExit(128 + signum)
+
+
+def get_write_buffer() -> Optional[WriteBuffer]:
+    """返回当前进程的写缓冲（fork 出的子进程各自新建）；SMZDM_DB_BUFFER=0 时返回 None。"""
+    global _write_buffer, _write_buffer_pid
+    if os.getenv("SMZDM_DB_BUFFER", "1") == "0":
+        return None
+    with _write_buffer_lock:
+        if _write_buffer is None or _write_buffer_pid != os.getpid() or _write_buffer.closed:
+            _write_buffer = WriteBuffer(
+                max_rows=int(os.getenv("SMZDM_DB_BUFFER_SIZE", "50") or 50),
+                interval=float(os.getenv("SMZDM_DB_BUFFER_INTERVAL", "2") or 2),
+            )
+            _write_buffer_pid = os.getpid()
+            atexit.register(_write_buffer.close)
+            if (
+                threading.current_thread() is threading.main_thread()
+                and signal.getsignal(signal.SIGTERM) is signal.SIG_DFL
+            ):
+                signal.signal(signal.SIGTERM, _on_sigterm)
+        return _write_buffer
+
+
+def flush_writes() -> bool:
+    """立即把本进程写缓冲中的记录落库（进程池子进程退出前调用，子进程不执行 atexit）。"""
+    if _write_buffer is None or _write_buffer_pid != os.getpid():
+        return True
+    return _write_buffer.flush()
+
+
+def close_writes() -> bool:
+    """落库并关闭本进程的写缓冲（删除 spill 文件）；之后再写入会新建缓冲。"""
+    if _write_buffer is None or _write_buffer_pid != os.getpid():
+        return True
+    _write_buffer.close()
+    return not _write_buffer.pending_rows
+
+
+def _buffered_write(kind: str, params: Tuple[Any, ...]) -> None:
+    buffer = get_write_buffer()
+    if buffer is None:
+        _write_rows([(0, kind, list(params))])
+    else:
+        buffer.add(kind, params)
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":
+        # Windows 上 os.kill(pid, 0) 会发送 CTRL_C_EVENT，不能用来探测，改用 OpenProcess 查询退出码
+        return _pid_alive_nt(pid)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except Exception:
+        return True
+    return True
+
+
+def _pid_alive_nt(pid: int) -> bool:
+    """Windows：进程仍在运行（或无权查询）返回 True，已退出 / 不存在返回 False。"""
+    import ctypes
+
+    process_query_limited_information = 0x1000
+    still_active = 259
+    error_access_denied = 5
+    try:
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        handle = kernel32.OpenProcess(process_query_limited_information, False, int(pid))
+        if not handle:
+            return ctypes.get_last_error() == error_access_denied
+        try:
+            code = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(handle, ctypes.byref(code)):
+                return True
+            return code.value == still_active
+        finally:
+            kernel32.CloseHandle(handle)
+    except Exception:
+        return True
+
+
+def _spill_owner(path: str) -> Optional[Tuple[str, int]]:
+    """从 spill 文件名解析 (主机名, pid)；旧版文件名（pid-时间戳）不带主机名，视为本机。"""
+    parts = os.path.basename(path).rsplit(".wb-", 1)[-1][: -len(".jsonl")].split("-")
+    try:
+        if len(parts) == 2:
+            return _HOST, int(parts[0])
+        if len(parts) == 3:
+            return parts[0], int(parts[1])
+    except ValueError:
+        pass
+    return None
+
+
+def replay_spill_files() -> int:
+    """
+    回放本机已退出进程遗留的 spill 文件（崩溃 / 被 kill 时未落库的记录），返回补写的条数。
+    序号不大于 kv_cache 中记录的部分已经落库，跳过；其他主机的文件无法判断进程是否存活，不回放。
+    """
+    replayed = 0
+    for path in glob.glob(f"{glob.escape(DB_PATH)}.wb-*.jsonl"):
+        owner = _spill_owner(path)
+        if owner is None:
+            continue
+        host, pid = owner
+        if host != _HOST or pid == os.getpid() or _pid_alive(pid):
+            continue
+
+        done = int(cache_get(_spill_marker(path)) or 0)
+        rows: List[Tuple[int, str, List[Any]]] = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    seq, kind, params = json.loads(line)
+                except ValueError:
+                    # 崩溃时写了一半的最后一行
+                    continue
+                if int(seq) > done and kind in _BUFFERED_SQL:
+                    rows.append((int(seq), str(kind), list(params)))
+        if rows:
+            _write_rows(rows, path)
+            replayed += len(rows)
+        os.remove(path)
+        cache_delete(_spill_marker(path))
+    if replayed:
+        print(f"已回放上次未落库的 {replayed} 条记录")
+    return replayed
+
+
+def record_checkin(account: int, silver: int, gold: int, remark: str = "checkin") -> None:
+    """记录一次签到/资产快照（经写缓冲异步落库）。"""
+    _buffered_write("checkin", (int(account), int(silver), int(gold), _now(), remark))
 
 
 def get_latest_balance(account: int) -> Tuple[int, int]:
     """
     获取某账号当前碎银/金币（取最近一条记录，没有则返回 0,0）。
+    写缓冲中尚未落库的记录比数据库中的更新，优先使用。
     """
+    if _write_buffer is not None and _write_buffer_pid == os.getpid():
+        pending = _write_buffer.pending_balance(account)
+        if pending is not None:
+            return pending
+
     conn = _get_conn()
     cur = conn.cursor()
     cur.execute(
@@ -109,6 +613,38 @@ def get_latest_balance(account: int) -> Tuple[int, int]:
     return int(row[0]), int(row[1])
 
 
+def reconcile_balance(account: int, silver: int, gold: int) -> Tuple[int, int]:
+    """
+    用实时查询到的余额校准数据库：与最新记录不一致时写入一条 remark=sync 的快照，并记录偏差。
+    返回偏差（实时 - 数据库）；该账号此前没有任何记录时只写入快照，偏差记为 0。
+    """
+    silver, gold = int(silver), int(gold)
+    db_silver, db_gold = get_latest_balance(account)
+    if (db_silver, db_gold) == (silver, gold):
+        return 0, 0
+
+    conn = _get_conn()
+    cur = conn.cursor()
+    pending = None
+    if _write_buffer is not None and _write_buffer_pid == os.getpid():
+        pending = _write_buffer.pending_balance(account)
+    cur.execute("SELECT 1 FROM checkin_logs WHERE account=? LIMIT 1", (int(account),))
+    known = pending is not None or cur.fetchone() is not None
+    if known:
+        cur.execute(
+            """
+            INSERT INTO balance_drift (account, db_silver, db_gold, live_silver, live_gold, ts)
+            VALUES (?,?,?,?,?,?)
+            """,
+            (int(account), db_silver, db_gold, silver, gold, _now()),
+        )
+        conn.commit()
+    conn.close()
+
+    record_checkin(account, silver, gold, "sync")
+    return (silver - db_silver, gold - db_gold) if known else (0, 0)
+
+
 def adjust_balance(account: int, delta_silver: int = 0, delta_gold: int = 0, remark: str = "") -> None:
     """
     在最近一次余额基础上做增减，并再写一条新记录。
@@ -264,15 +800,9 @@ def record_exchange(
     cost_type: str,
     status: str,
 ) -> None:
-    """记录一次兑换结果。"""
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO exchange_logs
-            (account, gift_id, gift_name, code, cost_value, cost_type, ts, status)
-        VALUES (?,?,?,?,?,?,?,?)
-        """,
+    """记录一次兑换结果（经写缓冲异步落库）。"""
+    _buffered_write(
+        "exchange",
         (
             int(account),
             str(gift_id),
@@ -284,5 +814,531 @@ def record_exchange(
             str(status or "success"),
         ),
     )
+
+
+def set_exchange_code(account: int, gift_id: str, code: str) -> bool:
+    """
+    把券码写入该账号该礼品最近一条尚无券码的成功兑换记录，返回是否写入。
+    兑换记录经写缓冲落库，这里先 flush，保证刚记录的兑换可以被更新。
+    """
+    flush_writes()
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        UPDATE exchange_logs SET code=?
+        WHERE id = (
+            SELECT id FROM exchange_logs
+            WHERE account=? AND gift_id=? AND status='success' AND code=''
+            ORDER BY id DESC LIMIT 1
+        )
+        """,
+        (str(code), int(account), str(gift_id)),
+    )
+    updated = cur.rowcount > 0
     conn.commit()
     conn.close()
+    return updated
+
+
+def get_exchange_codes(account: int, gift_id: str) -> Set[str]:
+    """该账号该礼品已入库的券码（轮询新券码时据此排除旧记录）。"""
+    flush_writes()
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT DISTINCT code FROM exchange_logs WHERE account=? AND gift_id=? AND code != ''",
+        (int(account), str(gift_id)),
+    )
+    codes = {row[0] for row in cur.fetchall()}
+    conn.close()
+    return codes
+
+
+def _today() -> str:
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def save_checkpoint(
+    account: int,
+    task_id: str,
+    step: str,
+    payload: Optional[Dict[str, Any]] = None,
+    run_date: Optional[str] = None,
+) -> None:
+    """
+    记录某账号某任务当天已完成到哪一步（覆盖写）。
+    payload 存放续跑/清理所需的信息，如 comment_id、关注对象等；
+    run_date 默认当天，补做往日遗留的清理时传入原记录的日期。
+    """
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        INSERT OR REPLACE INTO task_checkpoints
+            (run_date, account, task_id, step, payload, ts)
+        VALUES (?,?,?,?,?,?)
+        """,
+        (
+            run_date or _today(),
+            int(account),
+            str(task_id),
+            str(step),
+            json.dumps(payload or {}, ensure_ascii=False),
+            _now(),
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+def get_checkpoint(account: int, task_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """返回当天某账号某任务的 (step, payload)，没有则返回 None。"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT step, payload FROM task_checkpoints
+        WHERE run_date=? AND account=? AND task_id=?
+        """,
+        (_today(), int(account), str(task_id)),
+    )
+    row = cur.fetchone()
+    conn.close()
+    if not row:
+        return None
+    try:
+        payload = json.loads(row[1] or "{}")
+    except Exception:
+        payload = {}
+    return str(row[0]), payload
+
+
+def list_checkpoints(
+    account: int,
+    since: Optional[str] = None,
+    steps: Optional[Iterable[str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    返回某账号的断点记录（含 run_date / task_id / step / payload）。
+    since 为空时只返回当天的；传入 YYYY-MM-DD 时返回该日期（含）以来的（按日期、时间排序）。
+    steps 不为空时只返回处于这些 step 的记录。
+    """
+    sql = "SELECT run_date, task_id, step, payload FROM task_checkpoints WHERE account=?"
+    params: List[Any] = [int(account)]
+    if since:
+        sql += " AND run_date>=?"
+        params.append(since)
+    else:
+        sql += " AND run_date=?"
+        params.append(_today())
+    if steps is not None:
+        steps = list(steps)
+        sql += f" AND step IN ({','.join('?' * len(steps))})" if steps else " AND 0"
+        params.extend(steps)
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute(sql + " ORDER BY run_date, ts", params)
+    rows = cur.fetchall()
+    conn.close()
+    result = []
+    for r in rows:
+        try:
+            payload = json.loads(r[3] or "{}")
+        except Exception:
+            payload = {}
+        result.append({"run_date": str(r[0]), "task_id": str(r[1]), "step": str(r[2]), "payload": payload})
+    return result
+
+
+def acquire_lease(job: str, account: int, owner: str, ttl: float = 1800) -> bool:
+    """
+    领取某账号当天某 job 的执行租约。
+    - 无人持有 / 原持有者租约已过期：领取成功
+    - 已完成（done）或被他人持有且未过期：返回 False
+    """
+    conn = _get_conn()
+    cur = conn.cursor()
+    now = time.time()
+    try:
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute(
+            """
+            SELECT owner, expires_at, status FROM account_leases
+            WHERE job=? AND run_date=? AND account=?
+            """,
+            (job, _today(), int(account)),
+        )
+        row = cur.fetchone()
+        if row:
+            held_by, expires_at, status = str(row[0]), float(row[1]), str(row[2])
+            if status == "done":
+                conn.rollback()
+                return False
+            if held_by != owner and expires_at > now:
+                conn.rollback()
+                return False
+
+        cur.execute(
+            """
+            INSERT OR REPLACE INTO account_leases
+                (job, run_date, account, owner, expires_at, status, result)
+            VALUES (?,?,?,?,?,?,?)
+            """,
+            (job, _today(), int(account), owner, now + float(ttl), "running", ""),
+        )
+        conn.commit()
+        return True
+    finally:
+        conn.close()
+
+
+def finish_lease(job: str, account: int, owner: str, result: str = "") -> None:
+    """标记租约已完成，并保存该账号的执行结果（供汇总通知使用）。"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        UPDATE account_leases SET status='done', result=?
+        WHERE job=? AND run_date=? AND account=? AND owner=?
+        """,
+        (str(result or ""), job, _today(), int(account), owner),
+    )
+    conn.commit()
+    conn.close()
+
+
+def list_lease_results(job: str) -> Dict[int, str]:
+    """返回当天某 job 已完成账号的执行结果：{account: result}。"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT account, result FROM account_leases
+        WHERE job=? AND run_date=? AND status='done'
+        ORDER BY account
+        """,
+        (job, _today()),
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return {int(r[0]): str(r[1] or "") for r in rows}
+
+
+def get_identities(smzdm_ids: Iterable[str]) -> Dict[str, Tuple[str, str]]:
+    """批量读取账号身份缓存：{smzdm_id: (device_id, sk)}。"""
+    ids = [str(i) for i in smzdm_ids if i]
+    if not ids:
+        return {}
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        f"SELECT smzdm_id, device_id, sk FROM account_identity "
+        f"WHERE smzdm_id IN ({','.join('?' * len(ids))})",
+        ids,
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return {str(r[0]): (str(r[1]), str(r[2])) for r in rows}
+
+
+def save_identities(identities: Dict[str, Tuple[str, str]]) -> None:
+    """批量写入账号身份缓存（同一事务）：{smzdm_id: (device_id, sk)}。"""
+    if not identities:
+        return
+    conn = _get_conn()
+    cur = conn.cursor()
+    ts = _now()
+    cur.executemany(
+        """
+        INSERT OR REPLACE INTO account_identity (smzdm_id, device_id, sk, ts)
+        VALUES (?,?,?,?)
+        """,
+        [(uid, dev, sk, ts) for uid, (dev, sk) in identities.items()],
+    )
+    conn.commit()
+    conn.close()
+
+
+def record_account_health(
+    account: int, ok: bool, error_code: str = "", message: str = ""
+) -> None:
+    """
+    记录账号凭据的最新状态（覆盖写）。
+    ok=True 更新 last_ok_ts；ok=False（鉴权失败）更新 last_fail_ts 与错误信息。
+    """
+    conn = _get_conn()
+    cur = conn.cursor()
+    now = _now()
+    if ok:
+        cur.execute(
+            """
+            INSERT INTO account_health(account, status, error_code, message, last_ok_ts, ts)
+            VALUES (?, 'ok', '', '', ?, ?)
+            ON CONFLICT(account) DO UPDATE SET
+                status='ok', error_code='', message='', last_ok_ts=excluded.last_ok_ts, ts=excluded.ts
+            """,
+            (int(account), now, now),
+        )
+    else:
+        cur.execute(
+            """
+            INSERT INTO account_health(account, status, error_code, message, last_fail_ts, ts)
+            VALUES (?, 'invalid', ?, ?, ?, ?)
+            ON CONFLICT(account) DO UPDATE SET
+                status='invalid', error_code=excluded.error_code, message=excluded.message,
+                last_fail_ts=excluded.last_fail_ts, ts=excluded.ts
+            """,
+            (int(account), str(error_code or ""), str(message or "")[:500], now, now),
+        )
+    conn.commit()
+    conn.close()
+
+
+def cache_get(key: str) -> Optional[str]:
+    """读取未过期的缓存值，没有或已过期返回 None。"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT value FROM kv_cache WHERE key=? AND expires_at > ?",
+        (str(key), time.time()),
+    )
+    row = cur.fetchone()
+    conn.close()
+    return str(row[0]) if row else None
+
+
+def cache_set(key: str, value: str, ttl: float) -> None:
+    """写入缓存值，ttl 秒后过期（覆盖写）。"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        "INSERT OR REPLACE INTO kv_cache (key, value, expires_at, ts) VALUES (?,?,?,?)",
+        (str(key), str(value), time.time() + float(ttl), _now()),
+    )
+    conn.commit()
+    conn.close()
+
+
+def cache_delete(key: str) -> None:
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM kv_cache WHERE key=?", (str(key),))
+    conn.commit()
+    conn.close()
+
+
+def record_exchange_failure(
+    account: int, gift_id: str, reason: str, message: str, ttl: float
+) -> None:
+    """
+    记录一次已知原因的兑换失败，ttl 秒内规划兑换时跳过（覆盖写，顺带清理已过期的记录）。
+    account=0 对所有账号生效；gift_id='*' 对该账号的所有礼品生效。
+    """
+    conn = _get_conn()
+    cur = conn.cursor()
+    now = time.time()
+    cur.execute("DELETE FROM exchange_failures WHERE expires_at <= ?", (now,))
+    cur.execute(
+        """
+        INSERT OR REPLACE INTO exchange_failures (account, gift_id, reason, message, expires_at, ts)
+        VALUES (?,?,?,?,?,?)
+        """,
+        (int(account), str(gift_id), str(reason), str(message or "")[:500], now + float(ttl), _now()),
+    )
+    conn.commit()
+    conn.close()
+
+
+def get_exchange_failures(accounts: Iterable[int]) -> Dict[int, Dict[str, str]]:
+    """
+    查询未过期的兑换失败记录，返回 {account: {gift_id: reason}}；
+    键 0 为对所有账号生效的记录（不论 accounts 是否包含 0 都会返回）。
+    """
+    accounts = sorted({0, *(int(a) for a in accounts)})
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute(
+        f"""
+        SELECT account, gift_id, reason FROM exchange_failures
+        WHERE expires_at > ? AND account IN ({",".join("?" * len(accounts))})
+        """,
+        [time.time(), *accounts],
+    )
+    rows = cur.fetchall()
+    conn.close()
+    result: Dict[int, Dict[str, str]] = {}
+    for account, gift_id, reason in rows:
+        result.setdefault(int(account), {})[str(gift_id)] = str(reason)
+    return result
+
+
+def reserve_rate_token(key: str, rate: float, burst: float) -> float:
+    """
+    从令牌桶 key 中预约一个令牌（rate 个/秒，最多积攒 burst 个），返回需要等待的秒数（0 表示立即可用）。
+    预约在一个 IMMEDIATE 事务内完成，多个进程 / 线程共用同一个 smzdm.db 时互不超发。
+    """
+    conn = _get_conn()
+    cur = conn.cursor()
+    try:
+        cur.execute("BEGIN IMMEDIATE")
+        # 拿到写锁之后再取时间，否则等锁期间别人写入的 updated_at 可能比 now 新，补充的令牌会被重复计算
+        now = time.time()
+        cur.execute("SELECT tokens, updated_at FROM rate_buckets WHERE key=?", (str(key),))
+        row = cur.fetchone()
+        if row:
+            tokens = min(float(burst), float(row[0]) + max(0.0, now - float(row[1])) * rate)
+        else:
+            tokens = float(burst)
+        tokens -= 1
+        cur.execute(
+            "INSERT OR REPLACE INTO rate_buckets (key, tokens, updated_at) VALUES (?,?,?)",
+            (str(key), tokens, now),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return 0.0 if tokens >= 0 else -tokens / rate
+
+
+# ---------------- 按天汇总 ----------------
+# checkin_logs 每行是一次余额快照：与该账号上一条快照的差值计入当天的 earned / spent；
+# 账号的第一条快照只作为基准，不计入收支。remark 为 checkin 计一次签到，task 开头计一次任务奖励。
+
+_ROLLUP_COUNTERS = (
+    "silver_earned",
+    "silver_spent",
+    "gold_earned",
+    "gold_spent",
+    "checkins",
+    "tasks",
+    "exchanges",
+    "exchanges_ok",
+    "exchange_silver",
+    "exchange_gold",
+)
+
+
+def _refresh_rollups(cur: sqlite3.Cursor) -> int:
+    """把 id 大于汇总进度的日志行累加进 daily_rollups（调用方负责事务），返回处理的行数。"""
+    state = dict(cur.execute("SELECT name, last_id FROM rollup_state").fetchall())
+    balances: Dict[int, Tuple[int, int]] = {
+        int(r[0]): (int(r[1]), int(r[2]))
+        for r in cur.execute("SELECT account, silver, gold FROM rollup_balances").fetchall()
+    }
+    agg: Dict[Tuple[int, str], Dict[str, Any]] = {}
+    touched: Dict[int, Tuple[int, int]] = {}
+
+    def bucket(account: int, ts: str) -> Dict[str, Any]:
+        key = (account, str(ts)[:10])
+        if key not in agg:
+            agg[key] = dict.fromkeys(_ROLLUP_COUNTERS, 0)
+            agg[key]["silver_end"] = agg[key]["gold_end"] = None
+        return agg[key]
+
+    rows = cur.execute(
+        "SELECT id, account, silver, gold, ts, remark FROM checkin_logs WHERE id > ? ORDER BY id",
+        (int(state.get("checkin_logs", 0)),),
+    ).fetchall()
+    for _, account, silver, gold, ts, remark in rows:
+        account, silver, gold = int(account), int(silver), int(gold)
+        a = bucket(account, ts)
+        prev = balances.get(account)
+        if prev is not None:
+            ds, dg = silver - prev[0], gold - prev[1]
+            a["silver_earned"] += max(ds, 0)
+            a["silver_spent"] += max(-ds, 0)
+            a["gold_earned"] += max(dg, 0)
+            a["gold_spent"] += max(-dg, 0)
+        a["silver_end"], a["gold_end"] = silver, gold
+        remark = str(remark or "")
+        if remark == "checkin":
+            a["checkins"] += 1
+        elif remark.startswith("task"):
+            a["tasks"] += 1
+        balances[account] = touched[account] = (silver, gold)
+    last_checkin = int(rows[-1][0]) if rows else None
+
+    ex_rows = cur.execute(
+        "SELECT id, account, cost_value, cost_type, ts, status FROM exchange_logs WHERE id > ? ORDER BY id",
+        (int(state.get("exchange_logs", 0)),),
+    ).fetchall()
+    for _, account, cost_value, cost_type, ts, status in ex_rows:
+        a = bucket(int(account), ts)
+        a["exchanges"] += 1
+        if str(status) == "success":
+            a["exchanges_ok"] += 1
+            a["exchange_gold" if str(cost_type) == "gold" else "exchange_silver"] += int(cost_value or 0)
+    last_exchange = int(ex_rows[-1][0]) if ex_rows else None
+
+    if agg:
+        columns = ", ".join(_ROLLUP_COUNTERS)
+        updates = ", ".join(f"{c} = {c} + excluded.{c}" for c in _ROLLUP_COUNTERS)
+        cur.executemany(
+            f"""
+            INSERT INTO daily_rollups (account, day, {columns}, silver_end, gold_end)
+            VALUES (?, ?, {", ".join("?" for _ in _ROLLUP_COUNTERS)}, ?, ?)
+            ON CONFLICT(account, day) DO UPDATE SET
+                {updates},
+                silver_end = COALESCE(excluded.silver_end, silver_end),
+                gold_end = COALESCE(excluded.gold_end, gold_end)
+            """,
+            [
+                (account, day, *(a[c] for c in _ROLLUP_COUNTERS), a["silver_end"], a["gold_end"])
+                for (account, day), a in sorted(agg.items())
+            ],
+        )
+    if touched:
+        cur.executemany(
+            "INSERT OR REPLACE INTO rollup_balances (account, silver, gold) VALUES (?,?,?)",
+            [(account, s, g) for account, (s, g) in touched.items()],
+        )
+    for name, last_id in (("checkin_logs", last_checkin), ("exchange_logs", last_exchange)):
+        if last_id is not None:
+            cur.execute("INSERT OR REPLACE INTO rollup_state (name, last_id) VALUES (?,?)", (name, last_id))
+    return len(rows) + len(ex_rows)
+
+
+def refresh_rollups() -> int:
+    """把尚未汇总的日志行补进 daily_rollups，返回处理的行数（平时写入时已同步汇总，这里只补历史 / 遗漏）。"""
+    conn = _get_conn()
+    cur = conn.cursor()
+    try:
+        cur.execute("BEGIN IMMEDIATE")
+        count = _refresh_rollups(cur)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return count
+
+
+def query_daily_rollups(
+    since: str, until: str, accounts: Optional[Iterable[int]] = None
+) -> List[Dict[str, Any]]:
+    """读取 [since, until] 日期范围内（YYYY-MM-DD，含两端）的按天汇总，按账号、日期排序。"""
+    sql = f"""
+        SELECT account, day, {", ".join(_ROLLUP_COUNTERS)}, silver_end, gold_end
+        FROM daily_rollups WHERE day BETWEEN ? AND ?
+    """
+    params: List[Any] = [str(since), str(until)]
+    account_list = [int(a) for a in accounts] if accounts is not None else None
+    if account_list is not None:
+        if not account_list:
+            return []
+        sql += f" AND account IN ({','.join('?' for _ in account_list)})"
+        params += account_list
+    sql += " ORDER BY account, day"
+
+    conn = _get_conn()
+    cur = conn.cursor()
+    cur.execute(sql, params)
+    rows = cur.fetchall()
+    conn.close()
+    names = ("account", "day") + _ROLLUP_COUNTERS + ("silver_end", "gold_end")
+    return [dict(zip(names, r)) for r in rows]
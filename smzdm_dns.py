@@ -0,0 +1,206 @@
+"""
+进程内 DNS 缓存：替换 socket.getaddrinfo，同一域名在 TTL 内只解析一次。
+
+- requests / urllib3、httpx、PySocks（socks5 本地解析）都经由 socket.getaddrinfo 解析域名，
+  install() 之后新建连接不再重复查询 DNS
+- 同一域名并发解析时只发出一次查询，其他线程等待结果（最多等 wait_timeout 秒，超时直接用原始 getaddrinfo）
+- fork 出的子进程（如 multiprocessing.Pool）会重置锁和进行中的查询：父进程的解析线程不会被复制，
+  继承下来的等待事件永远不会被 set
+- 解析失败时若有过期的旧结果，继续使用旧结果（stale-if-error），失败本身不缓存
+- install() 时在后台并发预解析 KNOWN_HOSTS，兑换等热路径的首个连接不必等 DNS
+
+SOCKS 代理的解析方式由代理地址的 scheme 决定，这里显式化：
+- socks5://  本机解析域名（走本缓存），只把 IP 交给代理
+- socks5h:// 把域名交给代理解析（不走本缓存；直连回退时仍走本缓存）
+环境变量 SMZDM_PROXY_DNS=local / remote 可统一改写 PROXIES 中的 SOCKS 代理（见 proxy_resolution）。
+
+标准库的 getaddrinfo 拿不到记录本身的 TTL，缓存时间统一取 SMZDM_DNS_TTL。
+
+环境变量：
+- SMZDM_DNS_CACHE: 设为 0 关闭缓存（默认开启）
+- SMZDM_DNS_TTL: 缓存时间（秒，默认 300）
+- SMZDM_PROXY_DNS: local / remote，未设置时按 PROXIES 中写的 scheme
+"""
+from __future__ import annotations
+
+import os
+import socket
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# 脚本会访问的域名，install() 时预解析
+KNOWN_HOSTS: Tuple[str, ...] = (
+    "user-api.smzdm.com",
+    "duihuan.smzdm.com",
+    "zhiyou.smzdm.com",
+    "zhiyou.m.smzdm.com",
+    "m.smzdm.com",
+    "dingyue-api.smzdm.com",
+    "common-api.smzdm.com",
+    "comment-api.smzdm.com",
+    "article-api.smzdm.com",
+    "tag-api.smzdm.com",
+    "haojia-api.smzdm.com",
+    "brand-api.smzdm.com",
+)
+
+_original_getaddrinfo = socket.getaddrinfo
+
+_Key = Tuple[Any, Any, int, int, int, int]
+
+
+class DnsCache:
+    """getaddrinfo 结果的 TTL 缓存（线程安全，同一 key 的并发解析合并为一次）。"""
+
+    def __init__(self, ttl: float = 300.0, wait_timeout: float = 10.0) -> None:
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self._entries: Dict[_Key, Tuple[float, List[Any]]] = {}
+        self._inflight: Dict[_Key, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def getaddrinfo(
+        self, host: Any, port: Any, family: int = 0, type: int = 0, proto: int = 0, flags: int = 0
+    ) -> List[Any]:
+        key: _Key = (host, port, family, type, proto, flags)
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > time.monotonic():
+                    self.hits += 1
+                    return list(entry[1])
+                waiter = self._inflight.get(key)
+                if waiter is None:
+                    waiter = self._inflight[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # 其他线程正在解析同一个 key，等它的结果；等不到时自己解析（不写缓存）
+            if not waiter.wait(self.wait_timeout):
+                return _original_getaddrinfo(host, port, family, type, proto, flags)
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > time.monotonic():
+                    self.hits += 1
+                    return list(entry[1])
+
+        try:
+            result = _original_getaddrinfo(host, port, family, type, proto, flags)
+            with self._lock:
+                self._entries[key] = (time.monotonic() + self.ttl, result)
+        except OSError:
+            with self._lock:
+                stale = self._entries.get(key)
+            if stale is None:
+                raise
+            return list(stale[1])
+        finally:
+            # 结果写入后才唤醒等待者，保证它们醒来时能读到本次解析结果
+            with self._lock:
+                self._inflight.pop(key, None)
+            waiter.set()
+        return list(result)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _after_fork(self) -> None:
+        """fork 后在子进程中调用：父进程中持有锁或正在解析的线程没有被复制，重建锁并丢弃进行中的查询。"""
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+
+_cache: Optional[DnsCache] = None
+_install_lock = threading.Lock()
+
+
+def _after_fork_in_child() -> None:
+    global _install_lock
+    _install_lock = threading.Lock()
+    if _cache is not None:
+        _cache._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def _is_ip(host: str) -> bool:
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            socket.inet_pton(family, host)
+            return True
+        except (OSError, ValueError):
+            pass
+    return False
+
+
+def prewarm(hosts: Iterable[str] = KNOWN_HOSTS, port: int = 443, max_workers: int = 8) -> Dict[str, bool]:
+    """
+    并发预解析，参数与 urllib3 建连时一致（AF_UNSPEC + SOCK_STREAM），返回 {host: 是否成功}。
+    """
+    hosts = [h for h in hosts if h and not _is_ip(h)]
+
+    def resolve(host: str) -> bool:
+        try:
+            socket.getaddrinfo(host, port, socket.AF_UNSPEC, socket.SOCK_STREAM)
+            return True
+        except OSError:
+            return False
+
+    if not hosts:
+        return {}
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(hosts))) as pool:
+        return dict(zip(hosts, pool.map(resolve, hosts)))
+
+
+def install(prewarm_hosts: Optional[Iterable[str]] = KNOWN_HOSTS) -> Optional[DnsCache]:
+    """
+    启用 DNS 缓存（可重复调用，只生效一次），首次启用时在后台线程预解析 prewarm_hosts。
+    SMZDM_DNS_CACHE=0 时不做任何事，返回 None。
+    """
+    global _cache
+    if os.getenv("SMZDM_DNS_CACHE", "1").strip() == "0":
+        return None
+    with _install_lock:
+        if _cache is not None:
+            return _cache
+        _cache = DnsCache(float(os.getenv("SMZDM_DNS_TTL", "300") or 300))
+        socket.getaddrinfo = _cache.getaddrinfo  # type: ignore[assignment]
+
+    if prewarm_hosts:
+        threading.Thread(target=prewarm, args=(tuple(prewarm_hosts),), name="smzdm-dns-prewarm", daemon=True).start()
+    return _cache
+
+
+def uninstall() -> None:
+    global _cache
+    with _install_lock:
+        socket.getaddrinfo = _original_getaddrinfo
+        _cache = None
+
+
+def proxy_resolution(proxies: Dict[str, str], mode: Optional[str] = None) -> Dict[str, str]:
+    """
+    按 mode 改写 SOCKS 代理的解析方式：local -> socks5://（本机解析），remote -> socks5h://（代理解析）。
+    mode 为空时读取 SMZDM_PROXY_DNS，仍为空则原样返回。
+    """
+    mode = (mode if mode is not None else os.getenv("SMZDM_PROXY_DNS", "")).strip().lower()
+    if mode not in ("local", "remote"):
+        return proxies
+
+    result: Dict[str, str] = {}
+    for scheme, url in proxies.items():
+        prefix, sep, rest = url.partition("://")
+        if sep and prefix.lower() in ("socks5", "socks5h"):
+            url = f"{'socks5h' if mode == 'remote' else 'socks5'}://{rest}"
+        result[scheme] = url
+    return result
+
+
+__all__ = ["DnsCache", "KNOWN_HOSTS", "install", "uninstall", "prewarm", "proxy_resolution"]
@@ -1,13 +1,21 @@
 """
 兑换礼品 + 获取「我的礼品」列表并解析审核状态/券码。
 
-环境变量：
-- SMZDM_COOKIE: 「cookies;en_safepass=368041;」这样的结构
+环境变量（账号统一由 smzdm_accounts 注册表解析，序号与 smzdm_chaxun / 签到脚本一致）：
+- smzdm_duihuan + smzdm_safe / SMZDM_SAFE: 兑换账号（整份 Cookie 与安全码，# 分隔），优先使用
+- SMZDM_COOKIE: 未配置 smzdm_duihuan 时使用，兼容「cookies;en_safepass=368041;」这样的结构
   - 可配置多账号：用 & 分隔多个条目
   - 例：SMZDM_COOKIE="cookie1;en_safepass=111111;&cookie2;en_safepass=222222;"
 - SMZDM_GIFT_ID: 要兑换的礼品 ID（默认 800626）
 - SMZDM_GIFT_HTML_FILE: 若设置，从该文件读取 HTML（调试用，不请求网络）
 - SMZDM_DEBUG_HTML: 设为 1 时，将请求到的 HTML 保存为 smzdm_gift_debug.html
+- SMZDM_CODE_POLL_TIMEOUT: 兑换成功后等待券码的最长时间（秒，默认 120）
+- SMZDM_CODE_POLL_INTERVAL: 轮询「我的礼品」的初始间隔（秒，默认 2，之后指数退避，最长 60）
+- SMZDM_CODE_POLL_WORKERS: 同时轮询的账号数（默认 8）
+
+兑换成功的账号先全部记下，再并发轮询各自的「我的礼品」第 1 页：
+该礼品最新一条记录审核通过、出现新券码（不在 exchange_logs 已有的券码中）后立即写入 exchange_logs.code，
+并按 gift_items 中的价格扣减数据库余额。
 """
 
 from __future__ import annotations
@@ -16,20 +24,44 @@ import os
 import re
 import json
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import TYPE_CHECKING, Any, Iterable, List, Optional, Set, Tuple
 import builtins
+import random
 import time
-import requests
-from notify import send
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from smzdm_bot import accept_encoding, request_api
+from smzdm_db import (
+    adjust_balance,
+    get_exchange_codes,
+    init_db,
+    list_gift_items,
+    record_exchange,
+    set_exchange_code,
+)
+from smzdm_dns import install as install_dns_cache
+from smzdm_ratelimit import acquire as acquire_rate_token
 
+if TYPE_CHECKING:
+    import requests
 
-try:
-    from bs4 import BeautifulSoup
-except Exception:  # pragma: no cover
-    BeautifulSoup = None  # type: ignore[assignment]
+# requests / bs4 / notify 均在用到时才导入，缩短脚本启动时间
+_BeautifulSoup: Any = None
 mse: list[str] = []
 
 
+def _load_beautifulsoup() -> Any:
+    """按需导入 bs4.BeautifulSoup，未安装时返回 None。"""
+    global _BeautifulSoup
+    if _BeautifulSoup is None:
+        try:
+            from bs4 import BeautifulSoup
+        except Exception:  # pragma: no cover
+            return None
+        _BeautifulSoup = BeautifulSoup
+    return _BeautifulSoup
+
+
 def log(message: str) -> None:
     """
     简单日志函数：
@@ -95,6 +127,8 @@ def post_exchange(cookie: str, safe_pass: str, gift_id: str) -> dict:
         "client_type": "PC",
         "sourcePage": f"https://duihuan.smzdm.com/d/{gift_id}/",
     }
+    import requests
+
     try:
         resp = requests.post(
             url,
@@ -138,7 +172,11 @@ def get_gift_page(cookie: str, page: int = 1) -> str:
         "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8,zh-TW;q=0.7",
         "Cookie": cookie,
     }
+    import requests
+
     try:
+        # 多个账号并发轮询时与其他脚本共用按 host 的限速
+        acquire_rate_token(url)
         resp = requests.get(
             url,
             headers=headers,
@@ -149,9 +187,13 @@ def get_gift_page(cookie: str, page: int = 1) -> str:
         return f"请求礼品页面失败: {e!r}"
 
 
-def get_user_info(cookie: str) -> Optional[dict]:
+RE_JSONP_BODY = re.compile(rb"(\{.*\})[^}]*\Z", re.DOTALL)
+
+
+def get_user_info(cookie: str, session: Optional[requests.Session] = None) -> Optional[dict]:
     """
     使用账户 cookies 请求当前账户信息（昵称 / 金币 / 银币）。
+    传入 session 时复用其连接（smzdm_balance 批量刷新余额时使用）。
     """
     url = (
         "https://zhiyou.smzdm.com/user/info/jsonp_get_current"
@@ -171,20 +213,33 @@ def get_user_info(cookie: str) -> Optional[dict]:
         "Sec-Fetch-Mode": "no-cors",
         "Sec-Fetch-Dest": "script",
         "Referer": "https://duihuan.smzdm.com/",
-        "Accept-Encoding": "gzip, deflate, br, zstd",
+        "Accept-Encoding": accept_encoding(),
         "Accept-Language": "zh-CN,zh;q=0.9",
         "Cookie": cookie,
     }
 
+    # 流式按字节匹配 JSONP 中的 JSON 部分（第一个 { 到最后一个 }），不做整页文本解码；
+    # 模式以 \Z 结尾，需读完整个响应体才能确认，overlap 设得足够大以保留已读内容
+    resp = request_api(
+        url,
+        headers=headers,
+        sign=False,
+        timeout=20,
+        retry=0,
+        use_proxy=False,
+        match=RE_JSONP_BODY,
+        match_overlap=1 << 20,
+        session=session,
+    )
+    if not resp["isSuccess"]:
+        log(f"  获取用户信息失败: {resp['response']}")
+        return None
+    if not resp["data"]:
+        log("  未能在用户信息响应中找到 JSON 部分")
+        return None
+
     try:
-        resp = requests.get(url, headers=headers, timeout=20)
-        text = resp.text
-        m = re.search(r"\{.*\}", text, re.DOTALL)
-        if not m:
-            log("  未能在用户信息响应中找到 JSON 部分")
-            return None
-        data = json.loads(m.group(0))
-        return data
+        return json.loads(resp["data"])
     except Exception as e:
         log(f"  获取用户信息失败: {e!r}")
         return None
@@ -270,6 +325,7 @@ def parse_gift_records(html: str) -> List[GiftRecord]:
     if not html:
         return []
 
+    BeautifulSoup = _load_beautifulsoup()
     if BeautifulSoup is None:
         raise RuntimeError("缺少依赖 beautifulsoup4：请先 pip install beautifulsoup4")
 
@@ -329,6 +385,103 @@ def parse_gift_records(html: str) -> List[GiftRecord]:
     return records
 
 
+def fetch_gift_records(cookie: str) -> Optional[List[GiftRecord]]:
+    """请求并解析「我的礼品」第 1 页，请求失败返回 None。"""
+    page1 = get_gift_page(cookie, 1)
+    if page1.startswith("请求礼品页面失败"):
+        return None
+    return parse_gift_records(page1)
+
+
+def poll_gift_code(
+    cookie: str,
+    gift_id: str,
+    known_secrets: Iterable[str] = (),
+    timeout: Optional[float] = None,
+    interval: Optional[float] = None,
+    max_interval: float = 60,
+) -> Tuple[Optional[GiftRecord], List[GiftRecord]]:
+    """
+    兑换成功后轮询「我的礼品」第 1 页，直到该礼品最新一条记录审核通过并出现券码。
+    间隔从 interval 开始指数退避（每次翻倍、带抖动，最长 max_interval），超过 timeout 放弃。
+    known_secrets 为兑换前已有的券码（礼品页快照 + 已入库的券码），避免把旧记录当成这次兑换。
+    返回（新记录，未等到为 None；最后一次解析到的记录列表）。
+    """
+    if timeout is None:
+        timeout = float(os.getenv("SMZDM_CODE_POLL_TIMEOUT", "120") or 120)
+    interval = interval or float(os.getenv("SMZDM_CODE_POLL_INTERVAL", "2") or 2)
+    deadline = time.monotonic() + timeout
+    known = set(known_secrets)
+    records: List[GiftRecord] = []
+
+    while True:
+        left = deadline - time.monotonic()
+        if left <= 0:
+            return None, records
+        time.sleep(min(interval * random.uniform(0.8, 1.2), left))
+        interval = min(interval * 2, max_interval)
+
+        fetched = fetch_gift_records(cookie)
+        if fetched is None:
+            continue
+        records = fetched
+        latest = next((r for r in records if r.gift_id == gift_id), None)
+        if latest and "审核通过" in latest.status and latest.secret and latest.secret not in known:
+            return latest, records
+
+
+def _log_records(records: List[GiftRecord]) -> None:
+    if records:
+        log(f"  找到 {len(records)} 条礼品记录（仅展示前 3 条）:")
+        for i, record in enumerate(records[:3], 1):
+            output = (
+                f"    {i}. {record.date_text} | {record.status} | {record.title}"
+            )
+            if "审核通过" in record.status and record.secret:
+                output += f" | 券码: {record.secret}"
+            log(output)
+    else:
+        log("  未找到礼品记录")
+
+
+def _record_exchange(idx: int, gift_id: str) -> None:
+    """
+    记下兑换成功（券码为空，轮询到后再补），礼品名称 / 价格取自 gift_items；
+    价格已知时同步扣减数据库中的碎银 / 金币（与 smzdm_chaxun 一致）。
+    """
+    gift = next((g for g in list_gift_items() if g["gift_id"] == gift_id), None)
+    cost_value = int(gift["cost_value"]) if gift else 0
+    cost_type = gift["cost_type"] if gift else "silver"
+    record_exchange(
+        account=idx,
+        gift_id=gift_id,
+        gift_name=gift["name"] if gift else f"礼品 {gift_id}",
+        code="",
+        cost_value=cost_value,
+        cost_type=cost_type,
+        status="success",
+    )
+    if cost_value:
+        if cost_type == "silver":
+            adjust_balance(idx, delta_silver=-cost_value, remark=f"exchange {gift_id}")
+        else:
+            adjust_balance(idx, delta_gold=-cost_value, remark=f"exchange {gift_id}")
+
+
+def _wait_for_code(idx: int, cookie: str, gift_id: str, known: Set[str]) -> List[str]:
+    """轮询一个账号的券码，等到后立即写库；返回该账号要输出的日志行。"""
+    record, records = poll_gift_code(cookie, gift_id, known)
+    lines = [f"第{idx}个账号（礼品 {gift_id}）："]
+    if record:
+        stored = set_exchange_code(idx, gift_id, record.secret)
+        lines.append(f"  券码: {record.secret}{'（已写入数据库）' if stored else ''}")
+    else:
+        lines.append("  等待超时，暂未获取到券码（可稍后运行 smzdm_duihuan1 或再次运行本脚本查看）")
+    for i, r in enumerate(records[:3], 1):
+        lines.append(f"    {i}. {r.date_text} | {r.status} | {r.title}")
+    return lines
+
+
 def _parse_cookie_and_safe_pass(entry: str) -> tuple[str, str]:
     """
     解析单个账号字符串：
@@ -349,18 +502,37 @@ def _parse_cookie_and_safe_pass(entry: str) -> tuple[str, str]:
     return cookie, safe_pass
 
 
+def _iter_accounts() -> Iterable[Tuple[int, str, str]]:
+    """
+    从 smzdm_accounts 注册表读取账号，返回 (序号, cookie, 安全码)：
+    优先使用兑换账号（smzdm_duihuan），否则回落到 SMZDM_COOKIE；
+    没有单独配置安全码时，兼容 Cookie 中的 ;en_safepass=xxx; 写法。
+    """
+    from smzdm_accounts import load_registry
+
+    registry = load_registry()
+    for account in registry.exchange_accounts or registry.accounts:
+        cookie, safe_pass = account.cookie, account.safe_pass
+        if not safe_pass:
+            cookie, safe_pass = _parse_cookie_and_safe_pass(cookie)
+        yield account.index, cookie, safe_pass
+
+
 def main() -> None:
-    SMZDM_COOKIE = os.getenv("SMZDM_COOKIE")
-    if not SMZDM_COOKIE:
-        log("未设置 SMZDM_COOKIE 环境变量")
+    accounts = list(_iter_accounts())
+    if not accounts:
+        log("未设置 smzdm_duihuan 或 SMZDM_COOKIE 环境变量")
         return
 
-    # 多账号使用 & 分割
-    raw_accounts = [c for c in SMZDM_COOKIE.split("&") if c.strip()]
+    init_db()
+    # 兑换请求直接用 requests，先启用 DNS 缓存并预解析
+    install_dns_cache()
 
-    for idx, raw in enumerate(raw_accounts, start=1):
+    # 兑换成功、等待券码的账号：(账号序号, cookie, 礼品 ID, 兑换前已有的券码)
+    pending: List[Tuple[int, str, str, Set[str]]] = []
+
+    for idx, cookie, safe_pass in accounts:
         log(f"开始第{idx}个账号：")
-        cookie, safe_pass = _parse_cookie_and_safe_pass(raw)
         if not cookie:
             log("  本账号 cookie 为空，跳过")
             continue
@@ -387,42 +559,54 @@ def main() -> None:
 
         gift_id = os.getenv("SMZDM_GIFT_ID", "800626")
 
+        # 第三步：查询「我的礼品」第一页（每个账号只请求一次）：
+        # 不兑换时解析展示卷码信息（只展示前三条），兑换时作为兑换前的快照，轮询时据此识别新记录
+        page1 = get_gift_page(cookie, 1)
+        records = None if page1.startswith("请求礼品页面失败") else parse_gift_records(page1)
+
         if silver_val < 600:
             log("  银币不足 600，不尝试兑换。")
         else:
             log(f"  银币充足，尝试兑换礼品 {gift_id} ...")
             resp = post_exchange(cookie, safe_pass, gift_id)
             log(f"  兑换接口返回: {resp}")
+            if isinstance(resp, dict) and str(resp.get("error_code", "")) == "0":
+                _record_exchange(idx, gift_id)
+                known = {r.secret for r in records or [] if r.secret} | get_exchange_codes(idx, gift_id)
+                if records is None:
+                    log("  兑换前礼品页请求失败，只能按已入库的券码识别新记录")
+                pending.append((idx, cookie, gift_id, known))
+                log("  兑换成功，券码稍后统一轮询获取")
+                log("-" * 50)
+                continue
 
-        time.sleep(2)
-
-        # 第三步：查询「我的礼品」第一页，并解析卷码信息（只展示前三条）
-        page1 = get_gift_page(cookie, 1)
-
-        if page1.startswith("请求礼品页面失败"):
+        if records is None:
             log(f"  请求失败: {page1}")
             log("-" * 50)
             continue
 
-        records = parse_gift_records(page1)
-
-        if records:
-            log(f"  找到 {len(records)} 条礼品记录（仅展示前 3 条）:")
-            for i, record in enumerate(records[:3], 1):
-                output = (
-                    f"    {i}. {record.date_text} | {record.status} | {record.title}"
-                )
-                if "审核通过" in record.status and record.secret:
-                    output += f" | 券码: {record.secret}"
-                log(output)
-        else:
-            log("  未找到礼品记录")
-
-            log("-" * 50)
+        _log_records(records)
+        log("-" * 50)
+
+    # 第四步：并发轮询兑换成功的账号的券码（指数退避 + 截止时间），谁先等到谁先写库、输出
+    if pending:
+        log(f"等待 {len(pending)} 个账号的券码：")
+        workers = min(len(pending), int(os.getenv("SMZDM_CODE_POLL_WORKERS", "8") or 8))
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = [pool.submit(_wait_for_code, *job) for job in pending]
+            for future in as_completed(futures):
+                try:
+                    lines = future.result()
+                except Exception as e:
+                    lines = [f"  轮询券码异常：{e!r}"]
+                for line in lines:
+                    log(line)
 
     # 所有账号处理完毕后，把所有打印信息合并成一段文案发送通知
     if mse:
-        send("什么值得买兑换", "\n".join(mse))
+        from smzdm_notify import send_notify
+
+        send_notify("什么值得买兑换", "\n".join(mse))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,125 @@
+"""
+账号凭据健康检查：批量并发预检 Cookie 是否有效，失效账号直接跳过，不再浪费等待时间。
+
+- 预检只请求一次 user-api 的 vip 接口（与签到后查询会员信息是同一个接口）
+- error_code 为 4（未登录 / 登录失效）视为失效；网络异常等无法判断的情况保留账号
+- 失效账号逐个 Bark 通知，并由调用方写进汇总通知（format_invalid），不会悄悄消失
+- 结果写入 smzdm.db 的 account_health 表，签到 / 任务脚本运行中遇到鉴权失败也会更新
+
+环境变量：
+- SMZDM_PREFLIGHT: 设为 0 关闭预检（默认开启）
+- SMZDM_PREFLIGHT_WORKERS: 预检最大并发数（默认 8，实际并发由 smzdm_concurrency 自适应调整）
+"""
+from __future__ import annotations
+
+import os
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from smzdm_bot import SmzdmBot, bark_notify
+from smzdm_db import record_account_health
+
+if TYPE_CHECKING:
+    import requests
+
+
+# 视为「凭据失效」的 error_code
+AUTH_ERROR_CODES = frozenset({"4"})
+
+
+def auth_error_code(resp: Dict[str, Any]) -> str:
+    """request_api 的返回若为鉴权失败，给出其 error_code，否则返回空串。"""
+    data = resp.get("data")
+    if resp.get("isSuccess") or not isinstance(data, dict):
+        return ""
+    code = str(data.get("error_code", ""))
+    return code if code in AUTH_ERROR_CODES else ""
+
+
+def record_response(account: int, resp: Dict[str, Any]) -> Optional[bool]:
+    """
+    根据一次接口返回更新账号健康状态：
+    成功记为有效，鉴权失败记为失效，其他失败不改变状态；返回 True / False / None。
+    """
+    if resp.get("isSuccess"):
+        record_account_health(account, True)
+        return True
+    code = auth_error_code(resp)
+    if code:
+        data = resp.get("data") or {}
+        record_account_health(account, False, code, str(data.get("error_msg") or ""))
+        return False
+    return None
+
+
+def probe_account(
+    cookie: str, session: Optional[requests.Session] = None
+) -> Tuple[Optional[bool], Dict[str, Any]]:
+    """
+    探测单个账号的 Cookie 是否有效，返回（True 有效 / False 失效 / None 无法判断, 原始返回）。
+    """
+    bot = SmzdmBot(cookie, session=session)
+    resp = bot.request_api(
+        "https://user-api.smzdm.com/vip",
+        method="post",
+        headers=bot.get_headers(),
+        data={"token": bot.token},
+        retry=0,
+    )
+    if resp["isSuccess"]:
+        return True, resp
+    if auth_error_code(resp):
+        return False, resp
+    return None, resp
+
+
+def preflight(
+    accounts: List[Tuple[int, str]],
+    max_workers: Optional[int] = None,
+    sessions: Optional[Dict[int, requests.Session]] = None,
+) -> Tuple[List[Tuple[int, str]], List[Tuple[int, str]]]:
+    """
+    并发预检全部账号，返回（仍可用的 [(account_index, cookie), ...]，失效的 [(account_index, 原因), ...]），
+    均保持原顺序。失效账号会逐个 Bark 通知。
+    sessions 可传入 {account_index: Session}，让预检预热的连接留给后续 job 复用。
+    """
+    if not accounts or os.getenv("SMZDM_PREFLIGHT", "1") == "0":
+        return list(accounts), []
+
+    from smzdm_concurrency import AimdController, run_adaptive
+
+    workers = max_workers or int(os.getenv("SMZDM_PREFLIGHT_WORKERS", "8") or 8)
+    sessions = sessions or {}
+    # 从 2 个并发起步，接口正常时逐步加到 workers，超时 / 5xx 增多时减半
+    controller = AimdController(initial=2, maximum=max(1, workers), window=4)
+    results = run_adaptive(lambda acc: probe_account(acc[1], sessions.get(acc[0])), accounts, controller)
+    print(f"预检 {len(accounts)} 个账号：{controller.format_metrics()}")
+
+    # sqlite 写入放在调用线程中执行（兼容 shared_connection）
+    alive: List[Tuple[int, str]] = []
+    invalid: List[Tuple[int, str]] = []
+    for (idx, cookie), (ok, resp) in zip(accounts, results):
+        record_response(idx, resp)
+        if ok is False:
+            data = resp["data"]
+            reason = f"Cookie 已失效（error_code={data.get('error_code')}）：{data.get('error_msg') or ''}"
+            print(f"账号{idx} {reason}，跳过")
+            bark_notify("什么值得买账号失效", f"账号{idx} {reason}，请重新更新 Cookie", account=idx)
+            invalid.append((idx, reason))
+            continue
+        alive.append((idx, cookie))
+    return alive, invalid
+
+
+def format_invalid(invalid: List[Tuple[int, str]]) -> str:
+    """把预检失效的账号格式化成汇总通知中的段落（与各脚本的「账号N」段落格式一致）。"""
+    return "".join(f"\n****** 账号{idx} ******\n{reason}，已跳过\n" for idx, reason in invalid)
+
+
+__all__ = [
+    "AUTH_ERROR_CODES",
+    "auth_error_code",
+    "record_response",
+    "probe_account",
+    "preflight",
+    "format_invalid",
+]
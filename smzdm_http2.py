@@ -0,0 +1,173 @@
+"""
+可选的 HTTP/2 传输：基于 httpx（需安装 httpx 与 h2，走 SOCKS 代理还需 socksio）。
+
+Http2Session 实现了 request_api 用到的 requests.Session 接口子集（request / close），
+同一 Session 的并发请求在每个 host 的一条连接上多路复用（user-api.smzdm.com 等）。
+
+启用方式：环境变量 SMZDM_HTTP2=1。依赖未安装时 new_session() 自动回落到 requests.Session。
+
+httpx 的异常会转换成对应的 requests.exceptions（ConnectionError / Timeout / HTTPError 等），
+调用方只需 except requests.exceptions.RequestException。
+"""
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional
+
+if TYPE_CHECKING:
+    import httpx
+
+
+def is_available(proxies: Optional[Dict[str, str]] = None) -> bool:
+    """httpx、h2 已安装，且 proxies 中有 socks 代理时 socksio 也已安装。"""
+    try:
+        import h2  # noqa: F401
+        import httpx  # noqa: F401
+
+        if any(str(p).startswith("socks") for p in (proxies or {}).values()):
+            import socksio  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+@contextmanager
+def _requests_errors() -> Iterator[None]:
+    """把 httpx 抛出的异常转换成 requests.exceptions 中对应的类型（保留原异常为 __cause__）。"""
+    import httpx
+    from requests import exceptions
+
+    try:
+        yield
+    except httpx.ConnectTimeout as e:
+        raise exceptions.ConnectTimeout(str(e)) from e
+    except httpx.TimeoutException as e:
+        raise exceptions.Timeout(str(e)) from e
+    except httpx.ProxyError as e:
+        raise exceptions.ProxyError(str(e)) from e
+    except httpx.TransportError as e:
+        raise exceptions.ConnectionError(str(e)) from e
+    except httpx.HTTPStatusError as e:
+        raise exceptions.HTTPError(str(e), response=Http2Response(e.response)) from e
+    except (httpx.HTTPError, httpx.InvalidURL) as e:
+        raise exceptions.RequestException(str(e)) from e
+
+
+class Http2Response:
+    """把 httpx.Response 包装成 request_api 用到的 requests.Response 接口。"""
+
+    def __init__(self, resp: httpx.Response) -> None:
+        self._resp = resp
+        self.status_code = resp.status_code
+        self.headers = resp.headers
+        self.url = str(resp.url)
+        self.http_version = resp.http_version
+
+    @property
+    def content(self) -> bytes:
+        with _requests_errors():
+            return self._resp.read()
+
+    @property
+    def text(self) -> str:
+        with _requests_errors():
+            self._resp.read()
+        return self._resp.text
+
+    def json(self) -> Any:
+        with _requests_errors():
+            self._resp.read()
+        return self._resp.json()
+
+    def iter_content(self, chunk_size: int = 8192) -> Iterator[bytes]:
+        with _requests_errors():
+            yield from self._resp.iter_bytes(chunk_size)
+
+    def raise_for_status(self) -> None:
+        with _requests_errors():
+            self._resp.raise_for_status()
+
+    def close(self) -> None:
+        self._resp.close()
+
+    def __enter__(self) -> "Http2Response":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+class Http2Session:
+    """
+    requests.Session 风格的 HTTP/2 会话。
+
+    httpx 不支持按请求切换代理，这里按代理地址各建一个 httpx.Client（线程安全，可并发使用）。
+    http1=False 时对 http:// 直接使用 HTTP/2（prior knowledge），仅用于本地基准测试。
+    """
+
+    def __init__(self, http1: bool = True, verify: bool = True) -> None:
+        self._http1 = http1
+        self._verify = verify
+        self._clients: Dict[Optional[str], httpx.Client] = {}
+        self._lock = threading.Lock()
+
+    def _client(self, proxies: Optional[Dict[str, str]]) -> httpx.Client:
+        proxy = (proxies or {}).get("https") or (proxies or {}).get("http")
+        with self._lock:
+            client = self._clients.get(proxy)
+            if client is None:
+                import httpx
+
+                kwargs: Dict[str, Any] = {"http1": self._http1, "http2": True, "verify": self._verify}
+                if proxy:
+                    kwargs["proxy"] = proxy
+                client = httpx.Client(**kwargs)
+                self._clients[proxy] = client
+            return client
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        data: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+        proxies: Optional[Dict[str, str]] = None,
+        stream: bool = False,
+        **_: Any,
+    ) -> Http2Response:
+        client = self._client(proxies)
+        with _requests_errors():
+            req = client.build_request(
+                method.upper(),
+                url,
+                params=params or None,
+                data=data or None,
+                headers=headers,
+                timeout=timeout,
+            )
+            resp = client.send(req, stream=stream)
+        return Http2Response(resp)
+
+    def get(self, url: str, **kwargs: Any) -> Http2Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> Http2Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self) -> None:
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+    def __enter__(self) -> "Http2Session":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+__all__ = ["Http2Session", "Http2Response", "is_available"]
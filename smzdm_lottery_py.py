@@ -1,36 +1,61 @@
+from __future__ import annotations
+
+import os
 import re
 import time
-from typing import Any, Dict, Optional
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from smzdm_bot import SmzdmBot, get_env_cookies, parse_json, wait
+from smzdm_db import cache_delete, cache_get, cache_set, init_db
+from smzdm_health import format_invalid, preflight
+
+if TYPE_CHECKING:
+    import requests
+
+
+# 转盘活动页里的 hashId（页面中是转义过的 JSON：\"hashId\":\"xxx\"）
+RE_HASH_ID = re.compile(rb'\\"hashId\\":\\"([^\\]+)\\"', re.I)
+
+# hashId 与账号无关，缓存在 smzdm.db 中供所有账号 / 后续运行复用（秒，默认 6 小时）
+LOTTERY_ID_TTL = float(os.getenv("SMZDM_LOTTERY_ID_TTL", "21600") or 21600)
+
+LOTTERY_PAGES = (
+    "https://m.smzdm.com/topic/bwrzf5/516lft",
+    "https://m.smzdm.com/topic/zhyzhuanpan/cjzp/",
+)
+
 
-from smzdm_bot import SmzdmBot, get_env_cookies, parse_json, request_api, wait
+def _hash_id_cache_key(url: str) -> str:
+    return f"lottery_hash_id:{url}"
 
 
 class SmzdmLotteryBot(SmzdmBot):
     def run(self) -> str:
         notify_msg = ""
 
-        vip_id1 = self.get_activity_id_from_vip("https://m.smzdm.com/topic/bwrzf5/516lft")
-        if vip_id1:
-            wait(3, 10)
-            notify_msg += f"转盘抽奖ID: {vip_id1}\n"
-            notify_msg += self.draw(vip_id1)
-            notify_msg += "\n\n"
-
-        print()
-        wait(5, 15)
-        print()
+        for n, url in enumerate(LOTTERY_PAGES):
+            if n > 0:
+                print()
+                wait(5, 15)
+                print()
 
-        vip_id2 = self.get_activity_id_from_vip("https://m.smzdm.com/topic/zhyzhuanpan/cjzp/")
-        if vip_id2:
+            vip_id = self.get_activity_id_from_vip(url)
+            if not vip_id:
+                continue
             wait(3, 10)
-            notify_msg += f"转盘抽奖ID: {vip_id2}\n"
-            notify_msg += self.draw(vip_id2)
+            msg = self.draw(vip_id)
+            if msg == "转盘抽奖失败，接口响应异常":
+                # 活动可能已更换，丢弃缓存的 hashId，下次重新获取
+                cache_delete(_hash_id_cache_key(url))
+            notify_msg += f"转盘抽奖ID: {vip_id}\n{msg}"
+            if n < len(LOTTERY_PAGES) - 1:
+                notify_msg += "\n\n"
 
         return notify_msg
 
     def draw(self, active_id: str) -> str:
         callback = f"jQuery34107538452897131465_{int(time.time() * 1000)}"
-        resp = request_api(
+        resp = self.request_api(
             "https://zhiyou.smzdm.com/user/lottery/jsonp_draw",
             method="get",
             sign=False,
@@ -68,47 +93,66 @@ class SmzdmLotteryBot(SmzdmBot):
         return "转盘抽奖失败，接口响应异常"
 
     def get_activity_id_from_vip(self, url: str) -> Optional[str]:
-        resp = request_api(
+        key = _hash_id_cache_key(url)
+        cached = cache_get(key)
+        if cached:
+            print(f"转盘抽奖ID: {cached}（缓存）")
+            return cached
+
+        # 流式读取活动页，找到 hashId 后立即断开，不下载页面剩余部分
+        resp = self.request_api(
             url,
             method="get",
             sign=False,
-            parse_json_resp=False,
             headers={**self.get_headers_for_web(), "x-requested-with": "com.smzdm.client.android"},
+            match=RE_HASH_ID,
         )
         if not resp["isSuccess"]:
             print(f"获取转盘抽奖失败: {resp['response']}")
             return None
 
-        html = resp["data"]
-        m = re.search(r'\\"hashId\\":\\"([^\\]+)\\"', html or "", re.I)
-        if m:
-            print(f"转盘抽奖ID: {m.group(1)}")
-            return m.group(1)
+        hash_id = resp["data"]
+        if hash_id:
+            print(f"转盘抽奖ID: {hash_id}")
+            cache_set(key, hash_id, LOTTERY_ID_TTL)
+            return hash_id
 
         print("未找到转盘抽奖ID")
         return None
 
 
+def run_account(
+    account_index: int, cookie: str, session: Optional[requests.Session] = None
+) -> str:
+    """
+    单个账号的抽奖流程（account_index 从 1 开始），供 main 与 smzdm_runner 复用。
+    """
+    bot = SmzdmLotteryBot(cookie, session=session)
+    return bot.run()
+
+
 def main() -> None:
+    init_db()
+
     cookies = get_env_cookies()
     if not cookies:
         print("\n请先设置 SMZDM_COOKIE 环境变量")
         return
 
-    notify_content = ""
-    for i, cookie in enumerate(cookies):
-        if not cookie:
-            continue
-        if i > 0:
+    # 先并发预检一次，失效账号直接跳过
+    accounts, invalid = preflight([(i + 1, c) for i, c in enumerate(cookies) if c])
+
+    notify_content = format_invalid(invalid)
+    for n, (idx, cookie) in enumerate(accounts):
+        if n > 0:
             print()
             wait(10, 30)
             print()
 
-        sep = f"\n****** 账号{i + 1} ******\n"
+        sep = f"\n****** 账号{idx} ******\n"
         print(sep)
 
-        bot = SmzdmLotteryBot(cookie)
-        msg = bot.run()
+        msg = run_account(idx, cookie)
         notify_content += sep + msg + "\n"
 
     print("\n" + notify_content)
@@ -0,0 +1,194 @@
+"""
+后台通知分发：bark_notify / notify.send 只负责入队，由后台线程合并、发送。
+
+- 同一通道、同一标题在 SMZDM_NOTIFY_INTERVAL 秒内的多条消息合并为一条摘要（按账号分行）
+- 发送失败按指数退避重试（SMZDM_NOTIFY_RETRIES 次）
+- 进程退出（含 SIGTERM）时自动 flush，未发出的通知不会丢失
+
+环境变量：
+- BARK_KEY / BARK_URL: 见 smzdm_bot.bark_notify
+- SMZDM_NOTIFY_INTERVAL: 合并窗口（秒，默认 2）
+- SMZDM_NOTIFY_RETRIES: 失败重试次数（默认 3）
+"""
+from __future__ import annotations
+
+import atexit
+import os
+import queue
+import signal
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote as urlquote
+
+
+def send_bark(title: str, body: str) -> None:
+    """同步发送一条 Bark 推送，失败抛异常（供分发线程重试）。"""
+    key = os.getenv("BARK_KEY") or ""
+    if not key:
+        return
+
+    import requests
+
+    base = os.getenv("BARK_URL", "https://api.day.app").rstrip("/")
+    title_q = urlquote(str(title or ""), safe="")
+    body_q = urlquote(str(body or ""), safe="")
+    resp = requests.get(f"{base}/{key}/{title_q}/{body_q}", timeout=5)
+    resp.raise_for_status()
+
+
+def send_qinglong(title: str, body: str) -> None:
+    """同步调用青龙的 notify.send，不可用时直接打印。"""
+    try:
+        from notify import send
+    except Exception:
+        print(f"{title}\n{body}")
+        return
+    send(title, body)
+
+
+CHANNELS: Dict[str, Callable[[str, str], None]] = {
+    "bark": send_bark,
+    "notify": send_qinglong,
+}
+
+
+class NotifyDispatcher:
+    """
+    通知队列 + 后台发送线程。
+
+    submit() 立即返回；后台线程在合并窗口内收集消息，按 (通道, 标题) 合并后发送。
+    """
+
+    def __init__(self, interval: float = 2.0, retries: int = 3, backoff: float = 1.0) -> None:
+        self.interval = float(interval)
+        self.retries = int(retries)
+        self.backoff = float(backoff)
+        self._queue: "queue.Queue[Tuple[str, str, str, Optional[int]]]" = queue.Queue()
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._worker, name="smzdm-notify", daemon=True)
+        self._thread.start()
+
+    def submit(self, channel: str, title: str, body: str, account: Optional[int] = None) -> None:
+        if channel not in CHANNELS:
+            raise ValueError(f"未知通知通道: {channel}")
+        with self._cond:
+            self._pending += 1
+        self._queue.put((channel, str(title or ""), str(body or ""), account))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待已入队的通知全部发送完（或超时），返回是否已全部处理。"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending > 0:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    # ---------------------- 后台线程 ----------------------
+    def _collect(self) -> List[Tuple[str, str, str, Optional[int]]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.interval
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def coalesce(
+        batch: List[Tuple[str, str, str, Optional[int]]]
+    ) -> List[Tuple[str, str, str]]:
+        """把一批消息按 (通道, 标题) 合并成摘要，保持首次出现的顺序。"""
+        groups: Dict[Tuple[str, str], List[str]] = {}
+        for channel, title, body, account in batch:
+            line = f"账号{account}: {body}" if account is not None else body
+            lines = groups.setdefault((channel, title), [])
+            if line not in lines:
+                lines.append(line)
+        return [(channel, title, "\n".join(lines)) for (channel, title), lines in groups.items()]
+
+    def _deliver(self, channel: str, title: str, body: str) -> None:
+        sender = CHANNELS[channel]
+        for attempt in range(self.retries + 1):
+            try:
+                sender(title, body)
+                return
+            except Exception as e:
+                if attempt >= self.retries:
+                    # 通知失败不影响主流程，只打印一行
+                    print(f"通知发送失败（{channel}）：{e!r}")
+                    return
+                time.sleep(self.backoff * (2 ** attempt))
+
+    def _worker(self) -> None:
+        while True:
+            batch = self._collect()
+            try:
+                for channel, title, body in self.coalesce(batch):
+                    self._deliver(channel, title, body)
+            finally:
+                with self._cond:
+                    self._pending -= len(batch)
+                    self._cond.notify_all()
+
+
+_dispatcher: Optional[NotifyDispatcher] = None
+_dispatcher_pid: Optional[int] = None
+_lock = threading.Lock()
+
+
+def _on_sigterm(signum: int, frame: object) -> None:
+    # 转成 SystemExit，让 atexit 中的 flush 有机会执行
+    raise SystemExit(128 + signum)
+
+
+def get_dispatcher() -> NotifyDispatcher:
+    """返回当前进程的分发器（fork 出的子进程会各自新建，后台线程不跨进程）。"""
+    global _dispatcher, _dispatcher_pid
+    with _lock:
+        if _dispatcher is None or _dispatcher_pid != os.getpid():
+            _dispatcher = NotifyDispatcher(
+                interval=float(os.getenv("SMZDM_NOTIFY_INTERVAL", "2") or 2),
+                retries=int(os.getenv("SMZDM_NOTIFY_RETRIES", "3") or 3),
+            )
+            _dispatcher_pid = os.getpid()
+            atexit.register(_dispatcher.flush, 60)
+            if (
+                threading.current_thread() is threading.main_thread()
+                and signal.getsignal(signal.SIGTERM) is signal.SIG_DFL
+            ):
+                signal.signal(signal.SIGTERM, _on_sigterm)
+        return _dispatcher
+
+
+def notify_async(channel: str, title: str, body: str, account: Optional[int] = None) -> None:
+    """入队一条通知，立即返回。"""
+    get_dispatcher().submit(channel, title, body, account)
+
+
+def send_notify(title: str, content: str) -> None:
+    """通过青龙 notify.send 发送（后台线程执行，进程退出前保证发出）。"""
+    notify_async("notify", title, content)
+
+
+def flush_notifications(timeout: Optional[float] = None) -> bool:
+    if _dispatcher is None or _dispatcher_pid != os.getpid():
+        return True
+    return _dispatcher.flush(timeout)
+
+
+__all__ = [
+    "NotifyDispatcher",
+    "notify_async",
+    "send_notify",
+    "flush_notifications",
+    "send_bark",
+]
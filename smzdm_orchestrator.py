@@ -0,0 +1,313 @@
+"""
+统一调度：一次启动跑完 签到 -> 任务 -> 抽奖 -> 爬取礼品 -> 兑换。
+
+与分别运行 smzdm_checkin_py / smzdm_task_py / smzdm_lottery_py / smzdm_duihuan1 / smzdm_chaxun 相比：
+- 环境变量只解析一次、数据库只初始化一次，全程共用一个 sqlite 连接
+- 每个账号只创建一个请求会话（smzdm_bot.new_session），所有 job 共用（连接只预热一次）
+- 开始前并发预检全部账号的 Cookie，失效账号整个周期都跳过
+- 按依赖关系（DAG）排序执行；某账号的前置 job 异常时，跳过它的后续 job
+- 输出每个 job 的耗时统计，并汇总成一条通知
+
+用法：
+- python smzdm_orchestrator.py                        # 全部 job
+- python smzdm_orchestrator.py --jobs checkin,task    # 只跑部分 job
+- python smzdm_orchestrator.py --dep exchange=scrape  # 覆盖某个 job 的依赖
+
+环境变量：
+- SMZDM_JOBS: 默认要执行的 job 列表（逗号分隔）
+- SMZDM_CONCURRENCY: 同时执行的账号数上限（默认 1，即按顺序执行；大于 1 时由 AIMD 控制器自适应调整）
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from dataclasses import dataclass, field
+from graphlib import CycleError, TopologicalSorter
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Set, Tuple
+
+from smzdm_accounts import load_registry
+from smzdm_bot import new_session, wait
+from smzdm_concurrency import AimdController, run_adaptive
+from smzdm_db import init_db, shared_connection
+from smzdm_health import format_invalid, preflight
+from smzdm_notify import send_notify
+
+# 各 job 的脚本模块在 job 真正执行时才导入（只跑 checkin 时不必加载 bs4 等依赖）
+if TYPE_CHECKING:
+    import requests
+
+
+@dataclass
+class AccountContext:
+    """一个账号在整个调度周期内共享的状态。"""
+
+    index: int
+    cookie: str
+    exchange_cookie: str = ""
+    safe_pass: str = ""
+    session: requests.Session = field(default_factory=new_session)
+    failed_jobs: Set[str] = field(default_factory=set)
+    # smzdm_planner 为该账号规划的兑换礼品（exchange job 的 prepare 中统一计算）
+    exchange_plan: Optional[List[Dict[str, Any]]] = None
+
+
+@dataclass
+class Job:
+    name: str
+    title: str
+    run: Callable[..., str]
+    deps: Tuple[str, ...] = ()
+    # True：按账号逐个执行；False：整个周期只执行一次
+    per_account: bool = True
+    # 账号之间的随机等待（秒）
+    pace: Tuple[float, float] = (10, 30)
+    # 执行前对全部账号做一次批量准备（如预计算 sk）
+    prepare: Optional[Callable[[List[AccountContext]], None]] = None
+
+
+def _prepare_checkin(contexts: List[AccountContext]) -> None:
+    import smzdm_checkin_py
+
+    smzdm_checkin_py.prepare_accounts([c.cookie for c in contexts])
+
+
+def _run_checkin(ctx: AccountContext) -> str:
+    import smzdm_checkin_py
+
+    return smzdm_checkin_py.run_account(ctx.index, ctx.cookie, session=ctx.session)
+
+
+def _run_task(ctx: AccountContext) -> str:
+    import smzdm_task_py
+
+    return smzdm_task_py.run_account(ctx.index, ctx.cookie, session=ctx.session)
+
+
+def _run_lottery(ctx: AccountContext) -> str:
+    import smzdm_lottery_py
+
+    return smzdm_lottery_py.run_account(ctx.index, ctx.cookie, session=ctx.session)
+
+
+def _run_scrape(contexts: List[AccountContext]) -> str:
+    import smzdm_duihuan1
+
+    session = contexts[0].session if contexts else None
+    return smzdm_duihuan1.scrape_catalogue([c.cookie for c in contexts], session=session)
+
+
+def _prepare_exchange(contexts: List[AccountContext]) -> None:
+    from smzdm_balance import refresh_balances
+    from smzdm_planner import format_plan, plan_from_db
+
+    planned = [c for c in contexts if c.exchange_cookie and c.safe_pass]
+    # 先并发刷新实时余额，再把所有账号一起规划，同一份库存不会被多个账号重复计划
+    refresh_balances(
+        [(c.index, c.exchange_cookie) for c in planned],
+        sessions={c.index: c.session for c in planned},
+    )
+    plan = plan_from_db(c.index for c in planned)
+    for ctx in planned:
+        ctx.exchange_plan = plan.get(ctx.index, [])
+    print(f"兑换计划：\n{format_plan(plan)}\n")
+
+
+def _run_exchange(ctx: AccountContext) -> str:
+    import smzdm_chaxun
+
+    if not ctx.exchange_cookie:
+        return "未配置 smzdm_duihuan，跳过兑换"
+    return smzdm_chaxun.exchange_account(
+        ctx.index, ctx.exchange_cookie, ctx.safe_pass, session=ctx.session, plan=ctx.exchange_plan
+    )
+
+
+JOBS: Dict[str, Job] = {
+    "checkin": Job("checkin", "签到", _run_checkin, prepare=_prepare_checkin),
+    "task": Job("task", "任务", _run_task, deps=("checkin",)),
+    "lottery": Job("lottery", "抽奖", _run_lottery, deps=("task",)),
+    "scrape": Job("scrape", "爬取礼品", _run_scrape, deps=("lottery",), per_account=False),
+    "exchange": Job("exchange", "兑换", _run_exchange, deps=("scrape",), pace=(3, 3), prepare=_prepare_exchange),
+}
+
+
+def plan_jobs(selected: List[str], dep_overrides: Optional[Dict[str, Tuple[str, ...]]] = None) -> List[str]:
+    """
+    按依赖关系对选中的 job 做拓扑排序；未选中的依赖只影响顺序，不会被自动加入。
+    """
+    unknown = [name for name in selected if name not in JOBS]
+    if unknown:
+        raise ValueError(f"未知 job: {', '.join(unknown)}，可选：{', '.join(JOBS)}")
+
+    deps = {name: tuple(JOBS[name].deps) for name in JOBS}
+    deps.update(dep_overrides or {})
+
+    # 把未选中的中间 job 折叠掉，保留传递依赖（如只选 checkin,exchange 时仍是 checkin 在前）
+    def _closure(name: str, seen: Set[str]) -> Set[str]:
+        result: Set[str] = set()
+        for dep in deps.get(name, ()):
+            if dep in seen:
+                continue
+            seen.add(dep)
+            if dep in selected:
+                result.add(dep)
+            else:
+                result |= _closure(dep, seen)
+        return result
+
+    graph = {name: _closure(name, set()) for name in selected}
+    try:
+        return list(TopologicalSorter(graph).static_order())
+    except CycleError as e:
+        raise ValueError(f"job 依赖存在环：{e.args[1]}") from e
+
+
+def build_contexts() -> List[AccountContext]:
+    """解析一次环境变量，为每个账号建立共享上下文。"""
+    registry = load_registry()
+    return [
+        AccountContext(
+            index=account.index,
+            cookie=account.cookie,
+            exchange_cookie=exchange.cookie if exchange else "",
+            safe_pass=exchange.safe_pass if exchange else "",
+        )
+        for account in registry.accounts
+        for exchange in [registry.get_exchange(account.index)]
+    ]
+
+
+def _run_account_job(job: Job, ctx: AccountContext) -> str:
+    """执行单个账号的一个 job，返回通知中该账号的一段内容。"""
+    sep = f"\n****** [{job.title}] 账号{ctx.index} ******\n"
+    print(sep)
+    account_started = time.perf_counter()
+    try:
+        msg = job.run(ctx)
+    except Exception as e:
+        msg = f"执行异常：{e!r}"
+        ctx.failed_jobs.add(job.name)
+        print(msg)
+    print(f"账号{ctx.index} {job.title}耗时 {time.perf_counter() - account_started:.1f} 秒")
+    return f"{sep}{msg}\n"
+
+
+def run_jobs(
+    order: List[str],
+    contexts: List[AccountContext],
+    controller: Optional[AimdController] = None,
+) -> Tuple[str, List[Tuple[str, float]]]:
+    """
+    依次执行 job，返回（通知内容, [(job, 耗时秒), ...]）。
+
+    传入 controller 时，同一 job 的各账号并发执行，并发数由 AIMD 控制器按请求结果自动调整
+    （账号间不再 wait，请求节奏交给 smzdm_ratelimit）；否则按顺序执行，账号间按 job.pace 等待。
+    """
+    content = ""
+    timings: List[Tuple[str, float]] = []
+
+    for name in order:
+        job = JOBS[name]
+        print(f"\n========== {job.title} ==========\n")
+        started = time.perf_counter()
+
+        if job.prepare:
+            job.prepare(contexts)
+
+        if not job.per_account:
+            try:
+                msg = job.run(contexts)
+            except Exception as e:
+                msg = f"执行异常：{e!r}"
+                for ctx in contexts:
+                    ctx.failed_jobs.add(name)
+            print(msg)
+            content += f"\n****** [{job.title}] ******\n{msg}\n"
+            timings.append((name, time.perf_counter() - started))
+            continue
+
+        runnable: List[AccountContext] = []
+        for ctx in contexts:
+            blocked = [dep for dep in job.deps if dep in ctx.failed_jobs]
+            if blocked:
+                print(f"账号{ctx.index} 前置 job {','.join(blocked)} 失败，跳过{job.title}")
+                ctx.failed_jobs.add(name)
+                continue
+            runnable.append(ctx)
+
+        if controller is not None:
+            content += "".join(run_adaptive(lambda ctx: _run_account_job(job, ctx), runnable, controller))
+            print(f"{job.title}：{controller.format_metrics()}")
+        else:
+            for i, ctx in enumerate(runnable):
+                if i:
+                    wait(*job.pace)
+                content += _run_account_job(job, ctx)
+
+        timings.append((name, time.perf_counter() - started))
+
+    return content, timings
+
+
+def format_timings(timings: List[Tuple[str, float]]) -> str:
+    lines = [f"{JOBS[name].title}: {cost:.1f} 秒" for name, cost in timings]
+    lines.append(f"合计: {sum(cost for _, cost in timings):.1f} 秒")
+    return "\n".join(lines)
+
+
+def _parse_dep_overrides(items: List[str]) -> Dict[str, Tuple[str, ...]]:
+    result: Dict[str, Tuple[str, ...]] = {}
+    for item in items:
+        name, _, deps = item.partition("=")
+        result[name.strip()] = tuple(d.strip() for d in deps.split(",") if d.strip())
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="什么值得买统一调度")
+    parser.add_argument(
+        "--jobs",
+        default=os.getenv("SMZDM_JOBS") or ",".join(JOBS),
+        help=f"要执行的 job（逗号分隔），可选：{', '.join(JOBS)}",
+    )
+    parser.add_argument(
+        "--dep",
+        action="append",
+        default=[],
+        metavar="JOB=DEP1,DEP2",
+        help="覆盖某个 job 的依赖，可多次指定",
+    )
+    args = parser.parse_args(argv)
+
+    selected = [j.strip() for j in args.jobs.split(",") if j.strip()]
+    order = plan_jobs(selected, _parse_dep_overrides(args.dep))
+
+    contexts = build_contexts()
+    if not contexts:
+        print("\n请先设置 SMZDM_COOKIE 环境变量")
+        return
+
+    init_db()
+    with shared_connection():
+        alive, invalid = preflight(
+            [(c.index, c.cookie) for c in contexts],
+            sessions={c.index: c.session for c in contexts},
+        )
+        alive_idx = {idx for idx, _ in alive}
+        contexts = [c for c in contexts if c.index in alive_idx]
+        max_concurrency = int(os.getenv("SMZDM_CONCURRENCY", "1") or 1)
+        controller = AimdController(initial=min(2, max_concurrency), maximum=max_concurrency) if max_concurrency > 1 else None
+        content, timings = run_jobs(order, contexts, controller)
+        # 预检失效的账号不参与任何 job，但仍出现在汇总通知里
+        content = format_invalid(invalid) + content
+
+    report = format_timings(timings)
+    if controller is not None:
+        report += "\n" + controller.format_metrics()
+    print("\n=== 耗时统计 ===\n" + report)
+    send_notify("什么值得买", f"{content}\n=== 耗时统计 ===\n{report}")
+
+
+if __name__ == "__main__":
+    main()
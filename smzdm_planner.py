@@ -0,0 +1,218 @@
+"""
+兑换规划：根据所有账号的碎银 / 金币余额和 gift_items 礼品表（价格、币种、库存），
+算出每个账号兑换哪些礼品，使总价值最大。
+
+- 每个账号、每种币种是一个 0/1 背包：容量为余额，重量为礼品价格，价值由价值函数给出；
+  价格按最大公约数缩放后做 DP，每个账号内部是精确解
+- 多个账号抢同一份库存：按余额从少到多依次分配（小余额账号的可选项少，先分配），
+  分配后扣减库存；所有账号共用同一张 DP 表，库存变化时只重算受影响的部分
+- remaining 为 0 的礼品视为已兑完，不参与规划
+- blocked（兑换失败负缓存，见 smzdm_db.get_exchange_failures）中的礼品 / 账号不参与规划；
+  只屏蔽了个别礼品的账号单独建表
+
+价值函数（SMZDM_PLAN_VALUE）：
+- cost: 礼品价格（默认，尽量花完余额，换最贵的组合）
+- count: 礼品数量优先，数量相同时再比价格
+SMZDM_PLAN_VALUES 可以按礼品覆盖价值，如 "800626=500,800627=0"（0 表示不兑换该礼品）。
+
+环境变量：
+- SMZDM_PLAN_VALUE: 价值函数（cost / count，默认 cost）
+- SMZDM_PLAN_VALUES: 按礼品 ID 指定价值
+- SMZDM_PLAN_CURRENCIES: 参与规划的币种（逗号分隔，默认 silver；加上 gold 才会花金币）
+- SMZDM_PLAN_PER_GIFT: 同一礼品每个账号最多兑换几份（默认 1）
+"""
+from __future__ import annotations
+
+import os
+from functools import reduce
+from math import gcd
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+GiftValue = Callable[[Dict[str, Any]], int]
+
+CURRENCIES = ("silver", "gold")
+
+# count 模式下每份礼品的基础价值，远大于任何余额，保证数量优先、价格其次
+_COUNT_WEIGHT = 10**9
+
+
+def _parse_values(spec: str) -> Dict[str, int]:
+    """解析 "800626=500,800627=0"，无法解析的项忽略。"""
+    values: Dict[str, int] = {}
+    for item in (spec or "").split(","):
+        gift_id, sep, value = item.strip().partition("=")
+        if not sep:
+            continue
+        try:
+            values[gift_id.strip()] = max(0, int(value))
+        except ValueError:
+            continue
+    return values
+
+
+def value_function(mode: Optional[str] = None, overrides: Optional[Dict[str, int]] = None) -> GiftValue:
+    """按 mode（cost / count）构造价值函数；overrides 按 gift_id 覆盖价值。"""
+    mode = (mode or os.getenv("SMZDM_PLAN_VALUE", "cost") or "cost").strip().lower()
+    if overrides is None:
+        overrides = _parse_values(os.getenv("SMZDM_PLAN_VALUES", ""))
+    if mode not in ("cost", "count"):
+        raise ValueError(f"未知的价值函数: {mode}，可选：cost, count")
+
+    def value(gift: Dict[str, Any]) -> int:
+        gift_id = str(gift["gift_id"])
+        if gift_id in overrides:
+            return overrides[gift_id]
+        cost = int(gift["cost_value"])
+        return _COUNT_WEIGHT + cost if mode == "count" else cost
+
+    return value
+
+
+class _Table:
+    """
+    0/1 背包 DP 表，容量 0..capacity；同一张表可以回答任意不超过 capacity 的余额。
+    保留每加入一件礼品后的一轮结果：礼品列表只有尾部变化时（库存少的礼品排在后面），只重算尾部。
+    """
+
+    def __init__(self, scale: int, capacity: int) -> None:
+        self.scale = scale
+        self.items: List[Tuple[int, int, Dict[str, Any]]] = []
+        self.rounds: List[List[int]] = [[0] * (capacity // scale + 1)]
+
+    def update(self, items: Sequence[Tuple[int, int, Dict[str, Any]]]) -> None:
+        """把礼品列表换成 items（元素为 (缩放后的价格, 价值, 礼品)），复用相同的前缀。"""
+        keep = 0
+        while keep < min(len(items), len(self.items)) and items[keep] is self.items[keep]:
+            keep += 1
+        del self.items[keep:], self.rounds[keep + 1 :]
+
+        # dp[w]：容量不超过 w 时的最大价值
+        dp = self.rounds[-1]
+        for item in items[keep:]:
+            cost, value, _ = item
+            if cost:
+                shifted = [b + value for b in dp]
+                dp = dp[:cost] + [a if a >= b else b for a, b in zip(dp[cost:], shifted)]
+            else:
+                dp = [a + value for a in dp]
+            self.items.append(item)
+            self.rounds.append(dp)
+
+    def solve(self, budget: int) -> List[Dict[str, Any]]:
+        """余额为 budget 时的最优礼品组合。"""
+        w = min(budget // self.scale, len(self.rounds[0]) - 1)
+        chosen: List[Dict[str, Any]] = []
+        for i in range(len(self.items) - 1, -1, -1):
+            if self.rounds[i + 1][w] != self.rounds[i][w]:
+                cost, _, gift = self.items[i]
+                chosen.append(gift)
+                w -= cost
+        return chosen
+
+
+def plan_exchanges(
+    balances: Dict[int, Tuple[int, int]],
+    gifts: Iterable[Dict[str, Any]],
+    value: Optional[GiftValue] = None,
+    currencies: Optional[Iterable[str]] = None,
+    per_gift: Optional[int] = None,
+    blocked: Optional[Dict[int, Iterable[str]]] = None,
+) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    balances: {账号: (碎银, 金币)}；gifts: list_gift_items() 的结果。
+    blocked: {账号: [gift_id, ...]}，账号 0 对所有账号生效，gift_id 为 * 时跳过整个账号。
+    返回 {账号: [礼品, ...]}（每个账号内按价格从高到低，没有可兑换礼品的账号不出现）。
+    """
+    value = value or value_function()
+    if currencies is None:
+        currencies = (os.getenv("SMZDM_PLAN_CURRENCIES", "silver") or "silver").split(",")
+    currencies = [c.strip() for c in currencies if c.strip() in CURRENCIES]
+    if per_gift is None:
+        per_gift = int(os.getenv("SMZDM_PLAN_PER_GIFT", "1") or 1)
+    per_gift = max(1, per_gift)
+
+    blocked_sets = {int(acc): set(ids) for acc, ids in (blocked or {}).items()}
+    everyone = blocked_sets.pop(0, set())
+    if "*" in everyone:
+        return {}
+    balances = {acc: bal for acc, bal in balances.items() if "*" not in blocked_sets.get(acc, ())}
+
+    # remaining < 0 表示不限量，0 表示已兑完
+    stock: Dict[str, int] = {}
+    for g in gifts:
+        if int(g.get("remaining") or 0) != 0 and int(g["cost_value"]) >= 0 and g["gift_id"] not in everyone:
+            stock[g["gift_id"]] = int(g["remaining"])
+    catalogue = {g["gift_id"]: g for g in gifts if g["gift_id"] in stock}
+    plan: Dict[int, List[Dict[str, Any]]] = {}
+
+    for currency in currencies:
+        pos = CURRENCIES.index(currency)
+        accounts = sorted(
+            ((acc, int(bal[pos])) for acc, bal in balances.items() if int(bal[pos]) > 0),
+            key=lambda x: (x[1], x[0]),
+        )
+        capacity = accounts[-1][1] if accounts else 0
+        candidates = [
+            g for g in catalogue.values() if g["cost_type"] == currency and int(g["cost_value"]) <= capacity
+        ]
+        candidates = [g for g in candidates if value(g) > 0]
+        if not candidates:
+            continue
+
+        # 库存多的礼品排在前面：库存变化只影响 DP 表的尾部
+        candidates.sort(key=lambda g: stock[g["gift_id"]] if stock[g["gift_id"]] > 0 else float("inf"), reverse=True)
+        scale = reduce(gcd, (int(g["cost_value"]) for g in candidates), 0) or 1
+        copies = {g["gift_id"]: [(int(g["cost_value"]) // scale, value(g), g)] * per_gift for g in candidates}
+        table = _Table(scale, capacity)
+
+        for account, budget in accounts:
+            excluded = blocked_sets.get(account, set()) & copies.keys()
+            items = [
+                item
+                for gift_id, items_ in copies.items()
+                if gift_id not in excluded
+                for item in (items_ if stock[gift_id] < 0 else items_[: stock[gift_id]])
+            ]
+            if excluded:
+                # 该账号有单独屏蔽的礼品，不动共用的表
+                private = _Table(scale, budget)
+                private.update(items)
+                chosen = private.solve(budget)
+            else:
+                table.update(items)
+                chosen = table.solve(budget)
+            for gift in chosen:
+                if stock[gift["gift_id"]] > 0:
+                    stock[gift["gift_id"]] -= 1
+            if chosen:
+                plan.setdefault(account, []).extend(
+                    {k: gift[k] for k in ("gift_id", "name", "cost_value", "cost_type")} for gift in chosen
+                )
+
+    for items in plan.values():
+        items.sort(key=lambda g: (g["cost_type"] != "silver", -int(g["cost_value"])))
+    return plan
+
+
+def plan_from_db(accounts: Iterable[int], **kwargs: Any) -> Dict[int, List[Dict[str, Any]]]:
+    """用数据库中的余额（get_latest_balance）、礼品表和兑换失败负缓存为 accounts 做规划。"""
+    from smzdm_db import get_exchange_failures, get_latest_balance, list_gift_items
+
+    balances = {int(acc): get_latest_balance(int(acc)) for acc in accounts}
+    kwargs.setdefault("blocked", get_exchange_failures(balances))
+    return plan_exchanges(balances, list_gift_items(), **kwargs)
+
+
+def format_plan(plan: Dict[int, List[Dict[str, Any]]]) -> str:
+    if not plan:
+        return "（没有可兑换的礼品）"
+    lines = []
+    for account in sorted(plan):
+        items = "、".join(
+            f"{g['name']}（{g['cost_value']}{'碎银' if g['cost_type'] == 'silver' else '金币'}）" for g in plan[account]
+        )
+        lines.append(f"账号{account}：{items}")
+    return "\n".join(lines)
+
+
+__all__ = ["value_function", "plan_exchanges", "plan_from_db", "format_plan"]
@@ -0,0 +1,141 @@
+"""
+按 host 的全局限速：令牌桶保存在 smzdm.db 的 rate_buckets 表，线程、asyncio 任务、多个进程共用。
+
+request_api 每次发请求（含重试）前调用 acquire(url, scope)：
+- 先按 host 取令牌（所有账号共用），scope 非空时再按 host + scope（单个账号）取令牌
+- 令牌不足时预约一个令牌并 sleep 到可用时刻，而不是直接失败
+- smzdm.db 不可用（未 init_db、被锁超时等）时退回进程内的令牌桶
+
+未配置 SMZDM_RATE_LIMIT 时不限速，也不访问数据库。
+
+环境变量：
+- SMZDM_RATE_LIMIT: 每个 host 每秒请求数，可按 host 覆盖，如 "5" 或 "5,duihuan.smzdm.com=1,user-api.smzdm.com=10"
+- SMZDM_RATE_LIMIT_ACCOUNT: 单个账号对每个 host 每秒请求数（格式同上，默认不限）
+- SMZDM_RATE_BURST: 令牌桶容量（默认等于速率，至少 1）
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+class RateLimits:
+    """一组按 host 的速率配置：default 为未单独配置的 host 使用的速率，0 表示不限速。"""
+
+    def __init__(self, default: float = 0.0, per_host: Optional[Dict[str, float]] = None) -> None:
+        self.default = default
+        self.per_host = per_host or {}
+
+    def rate_for(self, host: str) -> float:
+        return self.per_host.get(host, self.default)
+
+    def __bool__(self) -> bool:
+        return self.default > 0 or any(r > 0 for r in self.per_host.values())
+
+
+def parse_limits(spec: str) -> RateLimits:
+    """解析 "5,duihuan.smzdm.com=1" 这样的配置，无法解析的项忽略。"""
+    limits = RateLimits()
+    for item in (spec or "").split(","):
+        host, sep, value = item.strip().rpartition("=")
+        try:
+            rate = max(0.0, float(value))
+        except ValueError:
+            continue
+        if sep:
+            limits.per_host[host.strip().lower()] = rate
+        else:
+            limits.default = rate
+    return limits
+
+
+@lru_cache(maxsize=1)
+def _config() -> Tuple[RateLimits, RateLimits, float]:
+    burst = float(os.getenv("SMZDM_RATE_BURST", "0") or 0)
+    return (
+        parse_limits(os.getenv("SMZDM_RATE_LIMIT", "")),
+        parse_limits(os.getenv("SMZDM_RATE_LIMIT_ACCOUNT", "")),
+        burst,
+    )
+
+
+def reload_config() -> None:
+    """环境变量改变后重新读取配置（测试 / 基准用）。"""
+    _config.cache_clear()
+
+
+class _MemoryBuckets:
+    """进程内的令牌桶，smzdm.db 不可用时使用。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def reserve(self, key: str, rate: float, burst: float) -> float:
+        with self._lock:
+            now = time.time()
+            tokens, updated_at = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + max(0.0, now - updated_at) * rate) - 1
+            self._buckets[key] = (tokens, now)
+        return 0.0 if tokens >= 0 else -tokens / rate
+
+
+_memory = _MemoryBuckets()
+
+
+def _reserve(key: str, rate: float, burst: float) -> float:
+    try:
+        from smzdm_db import reserve_rate_token
+
+        return reserve_rate_token(key, rate, burst)
+    except Exception:
+        return _memory.reserve(key, rate, burst)
+
+
+def _host(url_or_host: str) -> str:
+    if "://" in url_or_host:
+        return (urlsplit(url_or_host).hostname or "").lower()
+    return url_or_host.lower()
+
+
+def reserve(url_or_host: str, scope: Optional[str] = None) -> float:
+    """为一次请求预约令牌，返回需要等待的秒数（不 sleep）；未配置限速时返回 0。"""
+    host_limits, account_limits, burst = _config()
+    if not host_limits and not account_limits:
+        return 0.0
+    host = _host(url_or_host)
+    delay = 0.0
+
+    rate = host_limits.rate_for(host)
+    if rate > 0:
+        delay = _reserve(f"host:{host}", rate, burst or max(1.0, rate))
+
+    rate = account_limits.rate_for(host) if scope else 0.0
+    if rate > 0:
+        delay = max(delay, _reserve(f"account:{host}:{scope}", rate, burst or max(1.0, rate)))
+    return delay
+
+
+def acquire(url_or_host: str, scope: Optional[str] = None) -> float:
+    """预约令牌并 sleep 到可用时刻，返回实际等待的秒数。"""
+    delay = reserve(url_or_host, scope)
+    if delay > 0:
+        time.sleep(delay)
+    return delay
+
+
+async def acquire_async(url_or_host: str, scope: Optional[str] = None) -> float:
+    """acquire 的 asyncio 版本：数据库事务放到线程里执行，等待用 asyncio.sleep。"""
+    import asyncio
+
+    delay = await asyncio.to_thread(reserve, url_or_host, scope)
+    if delay > 0:
+        await asyncio.sleep(delay)
+    return delay
+
+
+__all__ = ["RateLimits", "parse_limits", "reload_config", "reserve", "acquire", "acquire_async"]
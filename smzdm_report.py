@@ -0,0 +1,145 @@
+"""
+收益报表：只读 smzdm.db 的 daily_rollups（按账号、按天的汇总），历史再多也是即时出结果。
+
+用法：
+- python smzdm_report.py                          # 本月，按账号汇总
+- python smzdm_report.py --month 2026-09 --daily  # 指定月份，按天列出
+- python smzdm_report.py --since 2026-10-01 --until 2026-10-15 --account 1 --account 2
+- python smzdm_report.py --notify                 # 同时通过 notify 发送
+
+汇总表在写入日志时同步维护；这里先补一次尚未汇总的日志行（只扫描新增部分），可用 --no-refresh 跳过。
+"""
+from __future__ import annotations
+
+import argparse
+import calendar
+import unicodedata
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from smzdm_db import init_db, query_daily_rollups
+
+
+def month_range(month: Optional[str] = None) -> Tuple[str, str]:
+    """'YYYY-MM'（默认本月）-> (首日, 末日)。"""
+    if month:
+        year, mon = (int(x) for x in month.split("-", 1))
+    else:
+        today = date.today()
+        year, mon = today.year, today.month
+    last = calendar.monthrange(year, mon)[1]
+    return f"{year:04d}-{mon:02d}-01", f"{year:04d}-{mon:02d}-{last:02d}"
+
+
+def summarize(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """把按天的汇总行合并成按账号的汇总（rows 需按账号、日期排序）。"""
+    result: Dict[int, Dict[str, Any]] = {}
+    for row in rows:
+        acc = result.setdefault(
+            row["account"],
+            {
+                "account": row["account"],
+                "days": 0,
+                "silver_earned": 0,
+                "silver_spent": 0,
+                "gold_earned": 0,
+                "gold_spent": 0,
+                "checkins": 0,
+                "tasks": 0,
+                "exchanges": 0,
+                "exchanges_ok": 0,
+                "silver_end": None,
+                "gold_end": None,
+            },
+        )
+        acc["days"] += 1
+        for key in ("silver_earned", "silver_spent", "gold_earned", "gold_spent", "checkins", "tasks", "exchanges", "exchanges_ok"):
+            acc[key] += int(row[key] or 0)
+        if row["silver_end"] is not None:
+            acc["silver_end"], acc["gold_end"] = row["silver_end"], row["gold_end"]
+    return list(result.values())
+
+
+def _width(text: str) -> int:
+    return sum(2 if unicodedata.east_asian_width(ch) in "WF" else 1 for ch in text)
+
+
+def _row(cells: List[Tuple[str, int]]) -> str:
+    """按显示宽度对齐（中文占两列）：第一、二列左对齐，其余右对齐。"""
+    out = []
+    for i, (text, width) in enumerate(cells):
+        pad = " " * max(0, width - _width(text))
+        out.append(text + pad if i < 2 else pad + text)
+    return "".join(out)
+
+
+COLUMNS: List[Tuple[str, int]] = [
+    ("账号", 6),
+    ("", 12),
+    ("碎银+", 8),
+    ("碎银-", 8),
+    ("金币+", 8),
+    ("金币-", 8),
+    ("签到", 6),
+    ("任务", 6),
+    ("兑换", 8),
+    ("碎银余额", 10),
+]
+
+
+def format_report(rows: List[Dict[str, Any]], daily: bool = False) -> str:
+    widths = [w for _, w in COLUMNS]
+    header = [name or ("日期" if daily else "天数") for name, _ in COLUMNS]
+    lines = [_row(list(zip(header, widths)))]
+    items = rows if daily else summarize(rows)
+    for r in items:
+        cells = [
+            str(r["account"]),
+            str(r["day"] if daily else r["days"]),
+            str(r["silver_earned"]),
+            str(r["silver_spent"]),
+            str(r["gold_earned"]),
+            str(r["gold_spent"]),
+            str(r["checkins"]),
+            str(r["tasks"]),
+            f"{r['exchanges_ok']}/{r['exchanges']}",
+            "-" if r["silver_end"] is None else str(r["silver_end"]),
+        ]
+        lines.append(_row(list(zip(cells, widths))))
+    if not items:
+        lines.append("（没有记录）")
+    else:
+        total_silver = sum(int(r["silver_earned"]) for r in items)
+        total_gold = sum(int(r["gold_earned"]) for r in items)
+        lines.append(f"合计：碎银 +{total_silver}，金币 +{total_gold}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="什么值得买收益报表（读取按天汇总表）")
+    parser.add_argument("--month", help="月份 YYYY-MM（默认本月）")
+    parser.add_argument("--since", help="开始日期 YYYY-MM-DD（覆盖 --month 的首日）")
+    parser.add_argument("--until", help="结束日期 YYYY-MM-DD（覆盖 --month 的末日）")
+    parser.add_argument("--account", type=int, action="append", help="只看指定账号，可多次指定")
+    parser.add_argument("--daily", action="store_true", help="按天列出，而不是按账号汇总")
+    parser.add_argument("--no-refresh", action="store_true", help="不补汇总尚未处理的日志行")
+    parser.add_argument("--notify", action="store_true", help="同时通过 notify 发送")
+    args = parser.parse_args(argv)
+
+    since, until = month_range(args.month)
+    since, until = args.since or since, args.until or until
+
+    init_db(refresh=not args.no_refresh)
+
+    rows = query_daily_rollups(since, until, args.account)
+    report = f"=== 收益报表 {since} ~ {until} ===\n" + format_report(rows, args.daily)
+    print(report)
+
+    if args.notify:
+        from smzdm_notify import send_notify
+
+        send_notify("什么值得买收益报表", report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+多进程分片执行签到 / 任务 / 抽奖，结果汇总成一条通知。
+
+用法：
+- python smzdm_runner.py checkin task lottery -p 4
+- 多台机器共享同一个 smzdm.db 时加 --lease：账号按「job + 日期 + 账号」领取租约，
+  已被其他机器/进程领取或完成的账号自动跳过。
+
+环境变量：
+- SMZDM_RUNNER_PROCESSES: 默认进程数（默认 1，即单进程顺序执行）
+"""
+from __future__ import annotations
+
+import argparse
+import importlib
+import os
+import socket
+from typing import Callable, Dict, List, Optional, Tuple
+
+from smzdm_bot import get_env_cookies, wait
+from smzdm_db import acquire_lease, close_writes, finish_lease, init_db, list_lease_results
+from smzdm_health import format_invalid, preflight
+from smzdm_notify import flush_notifications, send_notify
+
+
+# job 名 -> 提供 run_account(account_index, cookie) -> str 的脚本模块；
+# 模块若还提供 prepare_accounts(cookies)，会在分片前于主进程中调用一次（如批量预计算 sk）
+JOBS: Dict[str, str] = {
+    "checkin": "smzdm_checkin_py",
+    "task": "smzdm_task_py",
+    "lottery": "smzdm_lottery_py",
+}
+
+JOB_TITLES: Dict[str, str] = {
+    "checkin": "签到",
+    "task": "任务",
+    "lottery": "抽奖",
+}
+
+
+def _load_job(job: str) -> Callable[[int, str], str]:
+    module = importlib.import_module(JOBS[job])
+    return getattr(module, "run_account")
+
+
+def shard_accounts(
+    accounts: List[Tuple[int, str]], shards: int
+) -> List[List[Tuple[int, str]]]:
+    """按账号序号轮转切分：第 k 个分片拿 accounts[k::shards]。"""
+    shards = max(1, int(shards))
+    return [accounts[k::shards] for k in range(shards) if accounts[k::shards]]
+
+
+def run_shard(
+    job: str,
+    accounts: List[Tuple[int, str]],
+    use_lease: bool = False,
+    lease_ttl: float = 1800,
+) -> List[Tuple[int, str]]:
+    """
+    在当前进程内顺序执行一个分片的账号，返回 [(account_index, msg), ...]。
+    """
+    run = _load_job(job)
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    results: List[Tuple[int, str]] = []
+
+    for idx, cookie in accounts:
+        if use_lease and not acquire_lease(job, idx, owner, lease_ttl):
+            print(f"账号{idx} 已被其他进程领取或已完成，跳过")
+            continue
+
+        if results:
+            wait(10, 30)
+
+        print(f"\n****** [{JOB_TITLES.get(job, job)}] 账号{idx} ******\n")
+        try:
+            msg = run(idx, cookie)
+        except Exception as e:
+            # 单个账号异常不影响同分片内的其他账号
+            msg = f"执行异常：{e!r}"
+            print(msg)
+
+        results.append((idx, msg))
+        if use_lease:
+            finish_lease(job, idx, owner, msg)
+
+    # 进程池子进程退出时不会执行 atexit，这里先把本分片的通知发完、写缓冲落库
+    flush_notifications(60)
+    close_writes()
+    return results
+
+
+def run_sharded(
+    job: str,
+    processes: int = 1,
+    use_lease: bool = False,
+    lease_ttl: float = 1800,
+    cookies: Optional[List[str]] = None,
+) -> List[Tuple[int, str]]:
+    """
+    把账号切成 processes 个分片，用进程池并行执行，返回按账号排序的结果。
+    开启租约时，汇总结果取自 smzdm.db，包含其他机器已完成的账号。
+    """
+    if job not in JOBS:
+        raise ValueError(f"未知 job: {job}，可选：{', '.join(JOBS)}")
+
+    cookies = cookies if cookies is not None else (get_env_cookies() or [])
+    accounts = [(i + 1, c) for i, c in enumerate(cookies) if c]
+    shards = shard_accounts(accounts, processes)
+    if not shards:
+        return []
+
+    prepare = getattr(importlib.import_module(JOBS[job]), "prepare_accounts", None)
+    if prepare:
+        prepare(cookies)
+
+    if len(shards) == 1:
+        results = run_shard(job, shards[0], use_lease, lease_ttl)
+    else:
+        from multiprocessing import Pool
+
+        with Pool(processes=len(shards)) as pool:
+            parts = pool.starmap(
+                run_shard, [(job, shard, use_lease, lease_ttl) for shard in shards]
+            )
+        results = [r for part in parts for r in part]
+
+    if use_lease:
+        return sorted(list_lease_results(job).items())
+    return sorted(results)
+
+
+def format_results(job: str, results: List[Tuple[int, str]]) -> str:
+    title = JOB_TITLES.get(job, job)
+    return "".join(f"\n****** [{title}] 账号{idx} ******\n{msg}\n" for idx, msg in results)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="什么值得买多账号分片执行")
+    parser.add_argument("jobs", nargs="+", choices=list(JOBS), help="要执行的 job，按顺序执行")
+    parser.add_argument(
+        "-p",
+        "--processes",
+        type=int,
+        default=int(os.getenv("SMZDM_RUNNER_PROCESSES", "1") or 1),
+        help="进程数（分片数）",
+    )
+    parser.add_argument("--lease", action="store_true", help="通过 smzdm.db 租约表跨机器领取账号")
+    parser.add_argument("--lease-ttl", type=float, default=1800, help="租约有效期（秒）")
+    args = parser.parse_args(argv)
+
+    init_db()
+
+    cookies = get_env_cookies()
+    if not cookies:
+        print("\n请先设置 SMZDM_COOKIE 环境变量")
+        return
+
+    # 分片前并发预检一次，失效账号置空（保持序号不变），所有 job 都跳过它们
+    alive, invalid = preflight([(i + 1, c) for i, c in enumerate(cookies) if c])
+    alive_idx = {idx for idx, _ in alive}
+    cookies = [c if i + 1 in alive_idx else "" for i, c in enumerate(cookies)]
+
+    content = format_invalid(invalid)
+    for job in args.jobs:
+        results = run_sharded(job, args.processes, args.lease, args.lease_ttl, cookies)
+        content += format_results(job, results)
+
+    if content:
+        send_notify("什么值得买", content)
+
+
+if __name__ == "__main__":
+    main()
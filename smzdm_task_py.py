@@ -1,20 +1,37 @@
+from __future__ import annotations
+
 import os
-from typing import Any, Dict, List, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
-from smzdm_bot import get_env_cookies, request_api, remove_tags, wait
+from smzdm_bot import get_env_cookies, remove_tags, wait
 from smzdm_tasklib import SmzdmTaskBot
-from smzdm_db import init_db, adjust_balance
+from smzdm_db import init_db, adjust_balance, get_checkpoint, save_checkpoint
+from smzdm_health import format_invalid, preflight, record_response
 import re
 
+if TYPE_CHECKING:
+    import requests
+
 
 class SmzdmNormalTaskBot(SmzdmTaskBot):
-    def __init__(self, cookie: str, account_index: int = 1) -> None:
-        super().__init__(cookie)
+    def __init__(
+        self,
+        cookie: str,
+        account_index: int = 1,
+        session: Optional[requests.Session] = None,
+    ) -> None:
+        super().__init__(cookie, session=session)
         self.account_index = int(account_index)
+        # 获取任务列表时遇到鉴权失败（Cookie 失效）置为 True
+        self.auth_failed = False
 
     def run(self) -> str:
+        self.resume_pending_cleanups()
+
         self.log("获取任务列表")
         tasks, _detail = self.get_task_list()
+        if self.auth_failed:
+            return "Cookie 已失效，跳过任务"
         wait(5, 10)
 
         notify_msg = self.do_tasks(tasks)
@@ -36,11 +53,12 @@ class SmzdmNormalTaskBot(SmzdmTaskBot):
         return notify_msg or "无可执行任务"
 
     def get_task_list(self) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
-        resp = request_api(
+        resp = self.request_api(
             "https://user-api.smzdm.com/task/list_v2",
             method="post",
             headers=self.get_headers(),
         )
+        self.auth_failed = record_response(self.account_index, resp) is False
         if not resp["isSuccess"]:
             self.log(f"任务列表获取失败！{resp['response']}")
             return [], {}
@@ -66,7 +84,7 @@ class SmzdmNormalTaskBot(SmzdmTaskBot):
 
     def receive_activity(self, activity: Dict[str, Any]) -> Dict[str, Any]:
         self.log(f"领取奖励: {activity.get('activity_name','')}")
-        resp = request_api(
+        resp = self.request_api(
             "https://user-api.smzdm.com/task/activity_receive",
             method="post",
             headers=self.get_headers(),
@@ -95,7 +113,7 @@ class SmzdmNormalTaskBot(SmzdmTaskBot):
         if not robot_token:
             return {"isSuccess": False, "msg": "领取任务奖励失败！"}
 
-        resp = request_api(
+        resp = self.request_api(
             "https://user-api.smzdm.com/task/activity_task_receive",
             method="post",
             headers=self.get_headers(),
@@ -127,6 +145,10 @@ class SmzdmNormalTaskBot(SmzdmTaskBot):
         return {"isSuccess": False, "msg": "领取任务奖励失败！"}
 
 
+# 断点日志中代表「整个账号已跑完」的伪 task_id
+ACCOUNT_CHECKPOINT = "__account__"
+
+
 def _parse_reward_delta(text: str) -> Tuple[int, int]:
     """
     从奖励描述中提取增加的碎银/金币数量。
@@ -150,6 +172,31 @@ def _parse_reward_delta(text: str) -> Tuple[int, int]:
     return silver, gold
 
 
+def run_account(
+    account_index: int, cookie: str, session: Optional[requests.Session] = None
+) -> str:
+    """
+    单个账号的任务流程（account_index 从 1 开始），供 main 与 smzdm_runner 复用。
+    今天已跑完的账号直接返回上次结果（断点续跑）。
+    """
+    done = get_checkpoint(account_index, ACCOUNT_CHECKPOINT)
+    if done and done[0] == "done":
+        print("今天已完成，跳过")
+        return str(done[1].get("msg", ""))
+
+    bot = SmzdmNormalTaskBot(cookie, account_index=account_index, session=session)
+    msg = bot.run()
+    # Cookie 失效时不记完成，更新 Cookie 后当天还能重跑
+    if not bot.auth_failed:
+        save_checkpoint(account_index, ACCOUNT_CHECKPOINT, "done", {"msg": msg})
+    return msg
+
+
+def is_account_done(account_index: int) -> bool:
+    done = get_checkpoint(account_index, ACCOUNT_CHECKPOINT)
+    return bool(done and done[0] == "done")
+
+
 def main() -> None:
     # 确保数据库已初始化
     init_db()
@@ -159,20 +206,28 @@ def main() -> None:
         print("\n请先设置 SMZDM_COOKIE 环境变量")
         return
 
-    notify_content = ""
-    for i, cookie in enumerate(cookies):
-        if not cookie:
+    # 今天已完成的账号不需要预检；其余账号并发预检一次，失效账号直接跳过
+    accounts = [(i + 1, c) for i, c in enumerate(cookies) if c]
+    alive, invalid = preflight([a for a in accounts if not is_account_done(a[0])])
+    pending = {idx for idx, _ in alive}
+
+    notify_content = format_invalid(invalid)
+    ran_any = False
+    for idx, cookie in accounts:
+        # 今天已完成的账号不需要等待间隔
+        done = is_account_done(idx)
+        if not done and idx not in pending:
             continue
-        if i > 0:
+        if ran_any and not done:
             print()
             wait(10, 30)
             print()
+        ran_any = ran_any or not done
 
-        sep = f"\n****** 账号{i + 1} ******\n"
+        sep = f"\n****** 账号{idx} ******\n"
         print(sep)
 
-        bot = SmzdmNormalTaskBot(cookie, account_index=i + 1)
-        msg = bot.run()
+        msg = run_account(idx, cookie)
         notify_content += f"{sep}{msg}\n"
 
     # Python 版本默认直接输出；如你需要对接青龙通知，可再做 sendNotify 迁移
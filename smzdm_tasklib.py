@@ -2,9 +2,151 @@ import json
 import os
 import random
 import re
+import time
+from datetime import date, timedelta
 from typing import Any, Dict, List, Optional, Tuple
 
-from smzdm_bot import SmzdmBot, request_api, remove_tags, wait
+from smzdm_bot import SmzdmBot, remove_tags, wait
+from smzdm_db import get_checkpoint, list_checkpoints, save_checkpoint
+
+
+# 文章页脚本中的 'channel_id': '123'
+RE_CHANNEL_ID = re.compile(rb"'channel_id'\s*:\s*'(\d+)'")
+
+# 幸运屋抽奖按钮：<button 属性>  <div ...>免费抽奖</div>  <span class="reduceNumber">-0</span> ... </button>
+RE_CROWD_ID = re.compile(r'data-crowd_id="(\d+)"', re.I)
+RE_CROWD_TITLE = re.compile(r'data-title="([^"]+)"', re.I)
+
+# 只把 ASCII 字母转小写：标签名都是 ASCII，且不改变字符串长度（下标需与原文一一对应）
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+
+def _skip_ws(s: str, i: int) -> int:
+    n = len(s)
+    while i < n and s[i].isspace():
+        i += 1
+    return i
+
+
+def _parse_crowd_body(low: str, html: str, i: int, end: int) -> Optional[Tuple[str, int]]:
+    """
+    解析按钮内部开头的 `<div ...>档位</div> <span class="reduceNumber">-价格</span>`，
+    i 为按钮标签结束后的位置，end 为 </button> 的位置；不符合格式返回 None。
+    """
+    j = _skip_ws(low, i)
+    if j == i or not low.startswith("<div", j) or not low[j + 4 : j + 5].isspace():
+        return None
+    gt = low.find(">", j + 5)
+    if gt < 0 or gt >= end:
+        return None
+    lt = low.find("<", gt + 1)
+    if lt < 0 or not low.startswith("</div>", lt):
+        return None
+    label = html[gt + 1 : lt].strip()
+    if not label:
+        return None
+
+    k = _skip_ws(low, lt + 6)
+    if k == lt + 6 or not low.startswith("<span", k):
+        return None
+    k2 = _skip_ws(low, k + 5)
+    prefix = 'class="reducenumber">-'
+    if k2 == k + 5 or not low.startswith(prefix, k2):
+        return None
+    d = k2 + len(prefix)
+    d_end = d
+    while d_end < end and low[d_end].isdigit():
+        d_end += 1
+    if d_end == d or not low.startswith("</span>", d_end) or d_end + 7 >= end:
+        return None
+    return label, int(html[d:d_end])
+
+
+def parse_crowds(html: str) -> List[Dict[str, Any]]:
+    """
+    单遍扫描解析幸运屋页面中的全部抽奖按钮：
+    [{"crowd_id", "title", "name"（档位，如 免费 / 5碎银子）, "price"}, ...]
+
+    只用 str.find 顺序查找标签，不依赖回溯正则；下一个 `>` / `</button>` 的位置
+    在多个起点间复用，即使页面被截断或格式错乱，耗时也与页面长度成线性。
+    """
+    html = html or ""
+    low = html.lower()
+    if len(low) != len(html):
+        # 极少数 Unicode 字符转小写后长度会变，此时退回只转换 ASCII
+        low = html.translate(_ASCII_LOWER)
+    crowds: List[Dict[str, Any]] = []
+    next_gt = next_close = -1
+    pos = 0
+
+    while True:
+        start = low.find("<button", pos)
+        if start < 0:
+            break
+        pos = start + 7
+        if not low[pos : pos + 1].isspace():
+            continue
+
+        if next_close < pos:
+            next_close = low.find("</button>", pos)
+            if next_close < 0:
+                # 后面再没有完整的按钮
+                break
+        if next_gt < pos:
+            next_gt = low.find(">", pos)
+        attrs = html[pos:next_gt].strip()
+        if not attrs or next_gt > next_close:
+            continue
+
+        parsed = _parse_crowd_body(low, html, next_gt + 1, next_close)
+        if parsed is None:
+            continue
+
+        label, price = parsed
+        m_id = RE_CROWD_ID.search(attrs)
+        m_title = RE_CROWD_TITLE.search(attrs)
+        crowds.append(
+            {
+                "crowd_id": m_id.group(1) if m_id else "",
+                "title": m_title.group(1) if m_title else "",
+                "name": label[:-2] if label.endswith("抽奖") else label,
+                "price": price,
+            }
+        )
+        pos = next_close + 9
+
+    return crowds
+
+
+class CrowdCatalogue:
+    """幸运屋抽奖列表：按（档位, 价格）建索引，标题关键词的查找结果按需缓存。"""
+
+    def __init__(self, crowds: List[Dict[str, Any]]) -> None:
+        self.crowds = crowds
+        self.by_tier: Dict[Tuple[str, int], List[Dict[str, Any]]] = {}
+        for crowd in crowds:
+            self.by_tier.setdefault((crowd["name"], crowd["price"]), []).append(crowd)
+        self._by_keyword: Dict[Tuple[str, int, str], List[Dict[str, Any]]] = {}
+
+    def find(self, name: str, price: int, keyword: str = "") -> List[Dict[str, Any]]:
+        """返回某档位的抽奖；给出 keyword 时只返回标题包含该关键词的。"""
+        tier = self.by_tier.get((name, int(price)), [])
+        if not keyword:
+            return tier
+        key = (name, int(price), keyword)
+        if key not in self._by_keyword:
+            self._by_keyword[key] = [c for c in tier if keyword in c["title"]]
+        return self._by_keyword[key]
+
+
+# 续跑清理时回看的天数：前几天中断遗留的评论、关注/收藏也要补做，更早的不再尝试
+CLEANUP_LOOKBACK_DAYS = 7
+# 需要补做清理的 step（清理成功后置为 *_removed / *_reverted）
+_CLEANUP_STEPS = ("comment_submitted", "favorite_created", "follow_created", "follow_destroyed", "brand_followed")
+
+# 抽奖列表与账号无关，同一进程内的多个账号共用（SMZDM_CROWD_SHARED=no 时每个账号各自获取）
+CROWD_CACHE_TTL = 600
+_crowd_cache: Dict[str, Any] = {}
 
 
 class SmzdmTaskBot(SmzdmBot):
@@ -14,11 +156,115 @@ class SmzdmTaskBot(SmzdmBot):
     说明：
     - 原 JS 里通过 this.$env.log 输出；这里统一用 print。
     - 所有方法尽量保持原行为（含随机等待、touchstone_event 等）。
+    - account_index > 0 时，任务进度写入 smzdm_db 的断点日志，重启后可续跑/清理。
     """
 
+    account_index: int = 0
+    _crowd_catalogue: Optional[CrowdCatalogue] = None
+
+    # touchstone_event 的固定字段：在类加载时序列化一次，每次调用只拼接可变部分
+    TOUCHSTONE_DEFAULTS: Dict[str, Any] = {
+        "search_tv": "f",
+        "sourceRoot": "个人中心",
+        "trafic_version": (
+            "113_a,115_b,116_e,118_b,131_b,132_b,134_b,136_b,139_a,144_a,150_b,153_a,179_a,"
+            "183_b,185_b,188_b,189_b,193_a,196_b,201_a,204_a,205_a,208_b,222_b,226_a,228_a,"
+            "22_b,230_b,232_b,239_b,254_a,255_b,256_b,258_b,260_b,265_a,267_a,269_a,270_c,"
+            "273_b,276_a,278_a,27_a,280_a,281_a,283_b,286_a,287_a,290_a,291_b,295_a,302_a,"
+            "306_b,308_b,312_b,314_a,317_a,318_a,322_b,325_a,326_a,329_b,32_c,332_b,337_c,"
+            "341_a,347_a,349_b,34_a,351_a,353_b,355_a,357_b,366_b,373_B,376_b,378_b,380_b,"
+            "388_b,391_b,401_d,403_b,405_b,407_b,416_a,421_a,424_b,425_b,427_a,436_b,43_j,"
+            "440_a,442_a,444_b,448_a,450_b,451_b,454_b,455_a,458_c,460_a,463_c,464_b,466_b,"
+            "467_b,46_a,470_b,471_b,474_b,475_a,484_b,489_a,494_b,496_b,498_a,500_a,503_b,"
+            "507_b,510_bb,512_b,515_a,520_a,522_b,525_c,527_b,528_a,59_a,65_b,85_b,102_b,"
+            "103_a,106_b,107_b,10_f,11_b,120_a,143_b,157_g,158_c,159_c,160_f,161_d,162_e,"
+            "163_a,164_a,165_a,166_f,171_a,174_a,175_e,176_d,209_b,225_a,235_a,236_b,237_c,"
+            "272_b,296_c,2_f,309_a,315_b,334_a,335_d,339_b,346_b,361_b,362_d,367_b,368_a,369_e,"
+            "374_b,381_c,382_b,383_d,385_b,386_c,389_i,38_b,390_d,396_a,398_b,3_a,413_a,417_a,"
+            "418_c,419_b,420_b,422_e,428_a,430_a,431_d,432_e,433_a,437_b,438_c,478_b,479_b,47_a,"
+            "480_a,481_b,482_a,483_a,488_b,491_j,492_j,504_b,505_a,514_a,518_b,52_d,53_d,54_v,"
+            "55_z1,56_z3,66_a,67_i,68_a1,69_i,74_i,77_d,93_a"
+        ),
+        "tv": "z1",
+    }
+    _TOUCHSTONE_ENCODER = json.JSONEncoder(ensure_ascii=False)
+    _TOUCHSTONE_FRAGMENTS: Dict[str, str] = {
+        k: f"{json.dumps(k, ensure_ascii=False)}: {json.dumps(v, ensure_ascii=False)}"
+        for k, v in TOUCHSTONE_DEFAULTS.items()
+    }
+    _TOUCHSTONE_PREFIX = "{" + ", ".join(_TOUCHSTONE_FRAGMENTS.values())
+
     def log(self, msg: str = "") -> None:
         print(msg)
 
+    # ---------------------- 断点日志 ----------------------
+    def save_step(
+        self,
+        task_id: str,
+        step: str,
+        payload: Optional[Dict[str, Any]] = None,
+        run_date: Optional[str] = None,
+    ) -> None:
+        if self.account_index > 0:
+            save_checkpoint(self.account_index, task_id, step, payload, run_date=run_date)
+
+    def get_step(self, task_id: str) -> Optional[str]:
+        if self.account_index <= 0:
+            return None
+        cp = get_checkpoint(self.account_index, task_id)
+        return cp[0] if cp else None
+
+    def resume_pending_cleanups(self) -> None:
+        """
+        上次运行中断时遗留的清理动作：删除评论、撤销关注/收藏。
+        按断点日志里的 payload 补做，成功后把 step 置为 *_reverted。
+        跨天中断（前一天的运行在午夜前挂掉）也要补做：回看 CLEANUP_LOOKBACK_DAYS 天，
+        结果写回原记录的 run_date，不覆盖当天同一任务的进度。
+        """
+        if self.account_index <= 0:
+            return
+
+        since = (date.today() - timedelta(days=CLEANUP_LOOKBACK_DAYS)).isoformat()
+        for cp in list_checkpoints(self.account_index, since=since, steps=_CLEANUP_STEPS):
+            task_id, step, payload = cp["task_id"], cp["step"], cp["payload"]
+            ok = False
+            if step == "comment_submitted" and payload.get("comment_id"):
+                self.log(f"续跑：删除上次遗留的评论 {payload['comment_id']}")
+                ok = self.remove_comment(str(payload["comment_id"])).get("isSuccess", False)
+                next_step = "comment_removed"
+            elif step == "favorite_created":
+                self.log(f"续跑：取消上次遗留的收藏 {payload.get('aid', '')}")
+                ok = self.favorite(
+                    method="destroy",
+                    aid=str(payload.get("aid", "")),
+                    channel_id=str(payload.get("channel_id", "")),
+                ).get("isSuccess", False)
+                next_step = "favorite_reverted"
+            elif step in ("follow_created", "follow_destroyed"):
+                method = "destroy" if step == "follow_created" else "create"
+                self.log(f"续跑：还原上次遗留的关注状态 {payload.get('keyword', '')}")
+                ok = self.follow(
+                    method=method,
+                    ftype=str(payload.get("ftype", "")),
+                    keyword=str(payload.get("keyword", "")),
+                    keyword_id=payload.get("keyword_id"),
+                ).get("isSuccess", False)
+                next_step = "follow_reverted"
+            elif step == "brand_followed":
+                self.log(f"续跑：取消上次遗留的品牌关注 {payload.get('keyword', '')}")
+                ok = self.follow_brand(
+                    method="dingyue_lanmu_del",
+                    keyword_id=str(payload.get("keyword_id", "")),
+                    keyword=str(payload.get("keyword", "")),
+                ).get("isSuccess", False)
+                next_step = "follow_reverted"
+            else:
+                continue
+
+            if ok:
+                self.save_step(task_id, next_step, run_date=cp["run_date"])
+            wait(3, 10)
+
     def get_task_notify_message(self, is_success: bool, task: Dict[str, Any]) -> str:
         name = task.get("task_name", "")
         return f"{'🟢' if is_success else '❌'}完成[{name}]任务{'成功' if is_success else '失败！请查看日志'}\n"
@@ -29,10 +275,15 @@ class SmzdmTaskBot(SmzdmBot):
             status = str(task.get("task_status", ""))
             event_type = task.get("task_event_type", "")
 
+            # 今天已在上次运行中完成（接口状态可能尚未刷新），不重复执行
+            if status == "2" and self.get_step(str(task.get("task_id", ""))) == "done":
+                self.log(f"[{task.get('task_name','')}]上次运行已完成，跳过")
+                continue
+
             # 待领取任务
             if status == "3":
                 self.log(f"领取[{task.get('task_name','')}]奖励:")
-                result = self.receive_reward(str(task.get("task_id", "")))
+                result = self.finish_task(task)
                 notify_msg += (
                     f"{'🟢' if result.get('isSuccess') else '❌'}领取[{task.get('task_name','')}]奖励"
                     f"{'成功' if result.get('isSuccess') else '失败！请查看日志'}\n"
@@ -106,18 +357,23 @@ class SmzdmTaskBot(SmzdmBot):
         if not res.get("isSuccess"):
             return {"isSuccess": False}
 
+        task_id = str(task.get("task_id", ""))
+        comment_id = str(((res.get("data") or {}).get("data") or {}).get("comment_ID", ""))
+        self.save_step(task_id, "comment_submitted", {"comment_id": comment_id})
+
         self.log("删除评论")
         wait(20, 30)
-        comment_id = str(((res.get("data") or {}).get("data") or {}).get("comment_ID", ""))
         rm = self.remove_comment(comment_id)
         if not rm.get("isSuccess"):
             self.log("再试一次")
             wait(10, 20)
-            self.remove_comment(comment_id)
+            rm = self.remove_comment(comment_id)
+        if rm.get("isSuccess"):
+            self.save_step(task_id, "comment_removed")
 
         self.log("领取奖励")
         wait(5, 15)
-        return self.receive_reward(str(task.get("task_id", "")))
+        return self.finish_task(task)
 
     # ---------------------- 任务动作：点赞/点值 ----------------------
     def do_rating_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
@@ -175,7 +431,7 @@ class SmzdmTaskBot(SmzdmBot):
 
         self.log("领取奖励")
         wait(5, 15)
-        return self.receive_reward(str(task.get("task_id", "")))
+        return self.finish_task(task)
 
     # ---------------------- 任务动作：收藏 ----------------------
     def do_favorite_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
@@ -217,16 +473,19 @@ class SmzdmTaskBot(SmzdmBot):
                 return {"isSuccess": False}
             channel_id = str(detail.get("channel_id", ""))
 
+        task_id = str(task.get("task_id", ""))
         wait(3, 10)
         self.favorite(method="destroy", aid=article_id, channel_id=channel_id)
         wait(3, 10)
         self.favorite(method="create", aid=article_id, channel_id=channel_id)
+        self.save_step(task_id, "favorite_created", {"aid": article_id, "channel_id": channel_id})
         wait(3, 10)
-        self.favorite(method="destroy", aid=article_id, channel_id=channel_id)
+        if self.favorite(method="destroy", aid=article_id, channel_id=channel_id).get("isSuccess"):
+            self.save_step(task_id, "favorite_reverted")
 
         self.log("领取奖励")
         wait(5, 15)
-        return self.receive_reward(str(task.get("task_id", "")))
+        return self.finish_task(task)
 
     # ---------------------- 任务动作：关注用户 ----------------------
     def do_follow_user_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
@@ -240,20 +499,30 @@ class SmzdmTaskBot(SmzdmBot):
         total = max(total, 0)
         keyword = str(user.get("keyword", ""))
         is_follow = str(user.get("is_follow", "0"))
+        task_id = str(task.get("task_id", ""))
+        payload = {"ftype": "user", "keyword": keyword, "keyword_id": None}
 
         for _ in range(total):
             if is_follow == "1":
                 self.follow(method="destroy", ftype="user", keyword=keyword, keyword_id=None)
+                self.save_step(task_id, "follow_destroyed", payload)
                 wait(3, 10)
-            self.follow(method="create", ftype="user", keyword=keyword, keyword_id=None)
+            created = self.follow(method="create", ftype="user", keyword=keyword, keyword_id=None)
+            if is_follow == "1":
+                # 原本已关注：重新关注失败时仍处于取消关注状态，续跑时需要 create 还原
+                if created.get("isSuccess"):
+                    self.save_step(task_id, "follow_reverted")
+            else:
+                self.save_step(task_id, "follow_created", payload)
             wait(3, 10)
             if is_follow == "0":
-                self.follow(method="destroy", ftype="user", keyword=keyword, keyword_id=None)
+                if self.follow(method="destroy", ftype="user", keyword=keyword, keyword_id=None).get("isSuccess"):
+                    self.save_step(task_id, "follow_reverted")
             wait(3, 10)
 
         self.log("领取奖励")
         wait(5, 15)
-        return self.receive_reward(str(task.get("task_id", "")))
+        return self.finish_task(task)
 
     # ---------------------- 任务动作：关注栏目 ----------------------
     def do_follow_tag_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
@@ -276,16 +545,21 @@ class SmzdmTaskBot(SmzdmBot):
         keyword_id = str(tag_detail.get("lanmu_id", ""))
         keyword = str(((tag_detail.get("lanmu_info") or {}).get("lanmu_name", "")))
 
+        task_id = str(task.get("task_id", ""))
         wait(3, 10)
         self.follow(method="destroy", ftype="tag", keyword=keyword, keyword_id=keyword_id)
         wait(3, 10)
         self.follow(method="create", ftype="tag", keyword=keyword, keyword_id=keyword_id)
+        self.save_step(
+            task_id, "follow_created", {"ftype": "tag", "keyword": keyword, "keyword_id": keyword_id}
+        )
         wait(3, 10)
-        self.follow(method="destroy", ftype="tag", keyword=keyword, keyword_id=keyword_id)
+        if self.follow(method="destroy", ftype="tag", keyword=keyword, keyword_id=keyword_id).get("isSuccess"):
+            self.save_step(task_id, "follow_reverted")
 
         self.log("领取奖励")
         wait(5, 15)
-        return self.receive_reward(str(task.get("task_id", "")))
+        return self.finish_task(task)
 
     # ---------------------- 任务动作：关注品牌 ----------------------
     def do_follow_brand_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
@@ -300,16 +574,19 @@ class SmzdmTaskBot(SmzdmBot):
         bid = str(brand.get("id"))
         title = str(brand.get("title", ""))
 
+        task_id = str(task.get("task_id", ""))
         wait(3, 10)
         self.follow_brand(method="dingyue_lanmu_del", keyword_id=bid, keyword=title)
         wait(3, 10)
         self.follow_brand(method="dingyue_lanmu_add", keyword_id=bid, keyword=title)
+        self.save_step(task_id, "brand_followed", {"keyword_id": bid, "keyword": title})
         wait(3, 10)
-        self.follow_brand(method="dingyue_lanmu_del", keyword_id=bid, keyword=title)
+        if self.follow_brand(method="dingyue_lanmu_del", keyword_id=bid, keyword=title).get("isSuccess"):
+            self.save_step(task_id, "follow_reverted")
 
         self.log("领取奖励")
         wait(5, 15)
-        return self.receive_reward(str(task.get("task_id", "")))
+        return self.finish_task(task)
 
     # ---------------------- 任务动作：抽奖（幸运屋） ----------------------
     def do_crowd_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
@@ -331,7 +608,7 @@ class SmzdmTaskBot(SmzdmBot):
 
         self.log("领取奖励")
         wait(5, 15)
-        return self.receive_reward(str(task.get("task_id", "")))
+        return self.finish_task(task)
 
     # ---------------------- 任务动作：分享 ----------------------
     def do_share_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
@@ -370,7 +647,7 @@ class SmzdmTaskBot(SmzdmBot):
 
         self.log("领取奖励")
         wait(3, 10)
-        return self.receive_reward(str(task.get("task_id", "")))
+        return self.finish_task(task)
 
     # ---------------------- 任务动作：浏览文章 ----------------------
     def do_view_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
@@ -408,7 +685,7 @@ class SmzdmTaskBot(SmzdmBot):
             self.log("模拟阅读文章")
             wait(20, 50)
 
-            resp = request_api(
+            resp = self.request_api(
                 "https://user-api.smzdm.com/task/event_view_article_sync",
                 method="post",
                 headers=self.get_headers(),
@@ -422,7 +699,7 @@ class SmzdmTaskBot(SmzdmBot):
 
         self.log("领取奖励")
         wait(3, 10)
-        return self.receive_reward(str(task.get("task_id", "")))
+        return self.finish_task(task)
 
     # ---------------------- API：关注/取关 ----------------------
     def follow(self, *, method: str, ftype: str, keyword: str, keyword_id: Optional[str]) -> Dict[str, Any]:
@@ -448,7 +725,7 @@ class SmzdmTaskBot(SmzdmBot):
                 }
             )
 
-        resp = request_api(
+        resp = self.request_api(
             f"https://dingyue-api.smzdm.com/dingyue/{method}",
             method="post",
             headers=self.get_headers(),
@@ -469,7 +746,7 @@ class SmzdmTaskBot(SmzdmBot):
 
     # ---------------------- API：随机用户 ----------------------
     def get_user_by_random(self) -> Optional[Dict[str, Any]]:
-        resp = request_api(
+        resp = self.request_api(
             "https://dingyue-api.smzdm.com/tuijian/search_result",
             method="post",
             headers=self.get_headers(),
@@ -483,7 +760,7 @@ class SmzdmTaskBot(SmzdmBot):
 
     # ---------------------- API：参加抽奖 ----------------------
     def join_crowd(self, crowd_id: str) -> Dict[str, Any]:
-        resp = request_api(
+        resp = self.request_api(
             "https://zhiyou.m.smzdm.com/user/crowd/ajax_participate",
             method="post",
             sign=False,
@@ -509,8 +786,17 @@ class SmzdmTaskBot(SmzdmBot):
         return {"isSuccess": resp["isSuccess"], "response": resp["response"]}
 
     # ---------------------- API：获取抽奖信息（抓 HTML） ----------------------
-    def get_crowd(self, name: str, price: int) -> Dict[str, Any]:
-        resp = request_api(
+    def get_crowd_catalogue(self) -> Optional[CrowdCatalogue]:
+        """获取并解析幸运屋页面，本次运行内只请求一次；失败返回 None（下次调用会重试）。"""
+        if self._crowd_catalogue is not None:
+            return self._crowd_catalogue
+
+        shared = os.getenv("SMZDM_CROWD_SHARED", "yes") != "no"
+        if shared and _crowd_cache and time.time() - _crowd_cache["ts"] < CROWD_CACHE_TTL:
+            self._crowd_catalogue = _crowd_cache["catalogue"]
+            return self._crowd_catalogue
+
+        resp = self.request_api(
             "https://zhiyou.smzdm.com/user/crowd/",
             method="get",
             sign=False,
@@ -518,36 +804,39 @@ class SmzdmTaskBot(SmzdmBot):
             headers=self.get_headers_for_web(),
         )
         if not resp["isSuccess"]:
-            self.log(f"获取{name}抽奖失败: {resp['response']}")
+            self.log(f"获取抽奖列表失败: {resp['response']}")
+            return None
+
+        self._crowd_catalogue = CrowdCatalogue(parse_crowds(resp["data"]))
+        if shared:
+            _crowd_cache.update(ts=time.time(), catalogue=self._crowd_catalogue)
+        return self._crowd_catalogue
+
+    def get_crowd(self, name: str, price: int) -> Dict[str, Any]:
+        catalogue = self.get_crowd_catalogue()
+        if catalogue is None:
+            self.log(f"获取{name}抽奖失败")
             return {"isSuccess": False}
 
-        html = resp["data"]
-        pattern = re.compile(
-            rf'<button\s+([^>]+?)>\s+?<div\s+[^>]+?>\s*{re.escape(name)}(?:抽奖)?\s*</div>\s+<span\s+class="reduceNumber">-{price}</span>[\s\S]+?</button>',
-            re.I,
-        )
-        crowds = pattern.findall(html or "")
+        crowds = catalogue.find(name, price)
         if len(crowds) < 1:
             self.log(f"未找到{name}抽奖")
             return {"isSuccess": False}
 
         crowd = None
-        if price > 0 and os.getenv("SMZDM_CROWD_KEYWORD"):
-            keyword = os.getenv("SMZDM_CROWD_KEYWORD", "")
-            for item in crowds:
-                m = re.search(r'data-title="([^"]+)"', item, re.I)
-                if m and keyword in m.group(1):
-                    crowd = item
-                    break
-            if not crowd:
+        keyword = os.getenv("SMZDM_CROWD_KEYWORD", "")
+        if price > 0 and keyword:
+            matched = catalogue.find(name, price, keyword)
+            if matched:
+                crowd = matched[0]
+            else:
                 self.log("未找到符合关键词的抽奖，执行随机选取")
                 crowd = random.choice(crowds)
         else:
             crowd = random.choice(crowds)
 
-        m2 = re.search(r'data-crowd_id="(\d+)"', crowd, re.I)
-        if m2:
-            cid = m2.group(1)
+        if crowd["crowd_id"]:
+            cid = crowd["crowd_id"]
             self.log(f"{name}抽奖ID: {cid}")
             return {"isSuccess": True, "data": cid}
         self.log(f"未找到{name}抽奖ID")
@@ -555,7 +844,7 @@ class SmzdmTaskBot(SmzdmBot):
 
     # ---------------------- API：分享相关 ----------------------
     def share_article_done(self, article_id: str, channel_id: str) -> Dict[str, Any]:
-        resp = request_api(
+        resp = self.request_api(
             "https://user-api.smzdm.com/share/complete_share_rule",
             method="post",
             headers=self.get_headers(),
@@ -576,7 +865,7 @@ class SmzdmTaskBot(SmzdmBot):
                 "upperLevel_url": "排行榜/社区/好文精选/文章_24H/",
             }
         )
-        resp = request_api(
+        resp = self.request_api(
             "https://user-api.smzdm.com/share/callback",
             method="post",
             headers=self.get_headers(),
@@ -594,7 +883,7 @@ class SmzdmTaskBot(SmzdmBot):
         return {"isSuccess": False, "msg": "分享回调失败！"}
 
     def share_daily_reward(self, channel_id: str) -> Dict[str, Any]:
-        resp = request_api(
+        resp = self.request_api(
             "https://user-api.smzdm.com/share/daily_reward",
             method="post",
             headers=self.get_headers(),
@@ -613,7 +902,7 @@ class SmzdmTaskBot(SmzdmBot):
 
     # ---------------------- API：文章/栏目/品牌 ----------------------
     def get_article_list(self, num: int = 1) -> List[Dict[str, Any]]:
-        resp = request_api(
+        resp = self.request_api(
             "https://article-api.smzdm.com/ranking_list/articles",
             method="get",
             headers=self.get_headers(),
@@ -635,7 +924,7 @@ class SmzdmTaskBot(SmzdmBot):
         return []
 
     def get_robot_token(self) -> Optional[str]:
-        resp = request_api(
+        resp = self.request_api(
             "https://user-api.smzdm.com/robot/token",
             method="post",
             headers=self.get_headers(),
@@ -646,7 +935,7 @@ class SmzdmTaskBot(SmzdmBot):
         return None
 
     def get_tag_detail(self, tag_id: str) -> Dict[str, Any]:
-        resp = request_api(
+        resp = self.request_api(
             "https://common-api.smzdm.com/lanmu/config_data",
             method="get",
             headers=self.get_headers(),
@@ -658,7 +947,7 @@ class SmzdmTaskBot(SmzdmBot):
         return {}
 
     def get_tag_by_random(self) -> Optional[Dict[str, Any]]:
-        resp = request_api(
+        resp = self.request_api(
             "https://dingyue-api.smzdm.com/tuijian/search_result",
             method="get",
             headers=self.get_headers(),
@@ -671,7 +960,7 @@ class SmzdmTaskBot(SmzdmBot):
         return None
 
     def get_article_detail(self, article_id: str) -> Optional[Dict[str, Any]]:
-        resp = request_api(
+        resp = self.request_api(
             f"https://article-api.smzdm.com/article_detail/{article_id}",
             method="get",
             headers=self.get_headers(),
@@ -691,7 +980,7 @@ class SmzdmTaskBot(SmzdmBot):
         return None
 
     def get_haojia_detail(self, haojia_id: str) -> Optional[Dict[str, Any]]:
-        resp = request_api(
+        resp = self.request_api(
             f"https://haojia-api.smzdm.com/detail/{haojia_id}",
             method="get",
             headers=self.get_headers(),
@@ -711,7 +1000,7 @@ class SmzdmTaskBot(SmzdmBot):
                 "upperLevel_url": "个人中心/赚奖励/",
             }
         )
-        resp = request_api(
+        resp = self.request_api(
             f"https://user-api.smzdm.com/favorites/{method}",
             method="post",
             headers=self.get_headers(),
@@ -729,32 +1018,24 @@ class SmzdmTaskBot(SmzdmBot):
         return {"isSuccess": resp["isSuccess"], "response": resp["response"]}
 
     def get_touchstone_event(self, obj: Dict[str, Any]) -> str:
-        default_obj = {
-            "search_tv": "f",
-            "sourceRoot": "个人中心",
-            "trafic_version": (
-                "113_a,115_b,116_e,118_b,131_b,132_b,134_b,136_b,139_a,144_a,150_b,153_a,179_a,"
-                "183_b,185_b,188_b,189_b,193_a,196_b,201_a,204_a,205_a,208_b,222_b,226_a,228_a,"
-                "22_b,230_b,232_b,239_b,254_a,255_b,256_b,258_b,260_b,265_a,267_a,269_a,270_c,"
-                "273_b,276_a,278_a,27_a,280_a,281_a,283_b,286_a,287_a,290_a,291_b,295_a,302_a,"
-                "306_b,308_b,312_b,314_a,317_a,318_a,322_b,325_a,326_a,329_b,32_c,332_b,337_c,"
-                "341_a,347_a,349_b,34_a,351_a,353_b,355_a,357_b,366_b,373_B,376_b,378_b,380_b,"
-                "388_b,391_b,401_d,403_b,405_b,407_b,416_a,421_a,424_b,425_b,427_a,436_b,43_j,"
-                "440_a,442_a,444_b,448_a,450_b,451_b,454_b,455_a,458_c,460_a,463_c,464_b,466_b,"
-                "467_b,46_a,470_b,471_b,474_b,475_a,484_b,489_a,494_b,496_b,498_a,500_a,503_b,"
-                "507_b,510_bb,512_b,515_a,520_a,522_b,525_c,527_b,528_a,59_a,65_b,85_b,102_b,"
-                "103_a,106_b,107_b,10_f,11_b,120_a,143_b,157_g,158_c,159_c,160_f,161_d,162_e,"
-                "163_a,164_a,165_a,166_f,171_a,174_a,175_e,176_d,209_b,225_a,235_a,236_b,237_c,"
-                "272_b,296_c,2_f,309_a,315_b,334_a,335_d,339_b,346_b,361_b,362_d,367_b,368_a,369_e,"
-                "374_b,381_c,382_b,383_d,385_b,386_c,389_i,38_b,390_d,396_a,398_b,3_a,413_a,417_a,"
-                "418_c,419_b,420_b,422_e,428_a,430_a,431_d,432_e,433_a,437_b,438_c,478_b,479_b,47_a,"
-                "480_a,481_b,482_a,483_a,488_b,491_j,492_j,504_b,505_a,514_a,518_b,52_d,53_d,54_v,"
-                "55_z1,56_z3,66_a,67_i,68_a1,69_i,74_i,77_d,93_a"
-            ),
-            "tv": "z1",
-        }
-        merged = {**default_obj, **obj}
-        return json.dumps(merged, ensure_ascii=False)
+        """
+        等价于 json.dumps({**TOUCHSTONE_DEFAULTS, **obj}, ensure_ascii=False)（逐字节一致，
+        见 tests/test_touchstone.py），但固定字段直接使用预先序列化好的片段。
+        """
+        encode = self._TOUCHSTONE_ENCODER.encode
+        if any(k in self._TOUCHSTONE_FRAGMENTS for k in obj):
+            # 覆盖了固定字段（如 sourceRoot）：保持原字段位置，只替换值
+            head = "{" + ", ".join(
+                f"{encode(k)}: {encode(obj[k])}" if k in obj else frag
+                for k, frag in self._TOUCHSTONE_FRAGMENTS.items()
+            )
+            obj = {k: v for k, v in obj.items() if k not in self._TOUCHSTONE_FRAGMENTS}
+        else:
+            head = self._TOUCHSTONE_PREFIX
+        if not obj:
+            return head + "}"
+        # 可变部分整体序列化一次，去掉开头的 "{" 后接在固定片段之后
+        return head + ", " + encode(obj)[1:]
 
     def follow_brand(self, *, method: str, keyword_id: str, keyword: str) -> Dict[str, Any]:
         touchstone = self.get_touchstone_event(
@@ -765,7 +1046,7 @@ class SmzdmTaskBot(SmzdmBot):
                 "upperLevel_url": "个人中心/赚奖励/",
             }
         )
-        resp = request_api(
+        resp = self.request_api(
             "https://dingyue-api.smzdm.com/dy/util/api/user_action",
             method="post",
             headers=self.get_headers(),
@@ -783,7 +1064,7 @@ class SmzdmTaskBot(SmzdmBot):
         return {"isSuccess": resp["isSuccess"], "response": resp["response"]}
 
     def get_brand_detail(self, brand_id: str) -> Dict[str, Any]:
-        resp = request_api(
+        resp = self.request_api(
             "https://brand-api.smzdm.com/brand/brand_basic",
             method="get",
             headers=self.get_headers(),
@@ -803,7 +1084,7 @@ class SmzdmTaskBot(SmzdmBot):
         if tab and isinstance(tab, list):
             tab_params = str((tab[0] or {}).get("params", ""))
 
-        resp = request_api(
+        resp = self.request_api(
             "https://common-api.smzdm.com/lanmu/list_data",
             method="get",
             headers=self.get_headers(),
@@ -844,7 +1125,7 @@ class SmzdmTaskBot(SmzdmBot):
             "channel_id": channel_id,
             "wtype": wtype,
         }
-        resp = request_api(
+        resp = self.request_api(
             f"https://user-api.smzdm.com/rating/{method}",
             method="post",
             headers=self.get_headers(),
@@ -866,7 +1147,7 @@ class SmzdmTaskBot(SmzdmBot):
                 "sourceRoot": "社区",
             }
         )
-        resp = request_api(
+        resp = self.request_api(
             "https://comment-api.smzdm.com/comments/submit",
             method="post",
             headers=self.get_headers(),
@@ -891,7 +1172,7 @@ class SmzdmTaskBot(SmzdmBot):
         return {"isSuccess": resp["isSuccess"], "data": resp.get("data"), "response": resp["response"]}
 
     def remove_comment(self, comment_id: str) -> Dict[str, Any]:
-        resp = request_api(
+        resp = self.request_api(
             "https://comment-api.smzdm.com/comments/delete_comment",
             method="post",
             headers=self.get_headers(),
@@ -904,7 +1185,7 @@ class SmzdmTaskBot(SmzdmBot):
         return {"isSuccess": resp["isSuccess"], "response": resp["response"]}
 
     def get_dingyue_status(self, name: str) -> Dict[str, Any]:
-        resp = request_api(
+        resp = self.request_api(
             "https://dingyue-api.smzdm.com/dingyue/follow_status",
             method="post",
             headers=self.get_headers(),
@@ -921,7 +1202,7 @@ class SmzdmTaskBot(SmzdmBot):
         if isinstance(status, dict):
             smzdm_id = str(status.get("smzdm_id", ""))
 
-        resp = request_api(
+        resp = self.request_api(
             "https://tag-api.smzdm.com/theme/detail_feed",
             method="get",
             headers=self.get_headers(),
@@ -945,27 +1226,30 @@ class SmzdmTaskBot(SmzdmBot):
         return []
 
     def get_article_channel_id_for_testing(self, url: str) -> Optional[str]:
-        resp = request_api(
+        # 流式读取文章页，找到 channel_id 后立即断开
+        resp = self.request_api(
             url,
             method="get",
             headers=self.get_headers(),
-            parse_json_resp=False,
             sign=False,
+            match=RE_CHANNEL_ID,
         )
-        if not resp["isSuccess"]:
+        if not resp["isSuccess"] or not resp["data"]:
             self.log(f"获取文章信息失败！{resp['response']}")
             return None
+        return resp["data"]
 
-        html = resp["data"]
-        m = re.search(r"'channel_id'\s*:\s*'(\d+)'", html or "")
-        if not m:
-            self.log(f"获取文章信息失败！{resp['response']}")
-            return None
-        return m.group(1)
+    def finish_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        """领取任务奖励，成功后在断点日志中标记该任务当天已完成。"""
+        task_id = str(task.get("task_id", ""))
+        result = self.receive_reward(task_id)
+        if result.get("isSuccess"):
+            self.save_step(task_id, "done")
+        return result
 
     # ---------------------- 子类需要实现：领取奖励 ----------------------
     def receive_reward(self, task_id: str) -> Dict[str, Any]:
         raise NotImplementedError
 
 
-__all__ = ["SmzdmTaskBot"]
+__all__ = ["SmzdmTaskBot", "CrowdCatalogue", "parse_crowds"]
@@ -0,0 +1,51 @@
+"""
+get_touchstone_event 与 json.dumps({**TOUCHSTONE_DEFAULTS, **obj}, ensure_ascii=False) 逐字节一致的校验。
+
+用法（不计时，改动 TOUCHSTONE_DEFAULTS 或拼接逻辑后跑一次）：
+- python -m pytest -q tests/test_touchstone.py
+- python tests/test_touchstone.py
+"""
+from __future__ import annotations
+
+import json
+import os
+import random
+import sys
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from smzdm_tasklib import SmzdmTaskBot  # noqa: E402
+
+
+def reference(obj: Dict[str, Any]) -> str:
+    return json.dumps({**SmzdmTaskBot.TOUCHSTONE_DEFAULTS, **obj}, ensure_ascii=False)
+
+
+def cases() -> List[Dict[str, Any]]:
+    rnd = random.Random(0)
+    keys = list(SmzdmTaskBot.TOUCHSTONE_DEFAULTS) + ["sourceMode", "sourcePage", "event_value", "a\"b", "中文"]
+    values: List[Any] = ["", "x", "中文\n\t\"", 0, -1, 3.25, True, False, None, {"k": [1, "v"]}]
+    fixed: List[Dict[str, Any]] = [
+        {},
+        {"event_value": {"cid": "null", "is_detail": False, "p": "1"}, "sourceMode": "我的_我的任务页"},
+        {"event_value": {"aid": "1", "is_detail": True}, "sourcePage": "Android/长图文/1/", "sourceRoot": "社区"},
+    ]
+    return fixed + [{k: rnd.choice(values) for k in rnd.sample(keys, rnd.randint(0, len(keys)))} for _ in range(500)]
+
+
+def test_prefix_matches_json_dumps() -> None:
+    expected = json.dumps(SmzdmTaskBot.TOUCHSTONE_DEFAULTS, ensure_ascii=False)
+    assert (SmzdmTaskBot._TOUCHSTONE_PREFIX + "}").encode("utf-8") == expected.encode("utf-8")
+
+
+def test_touchstone_event_matches_json_dumps() -> None:
+    bot = SmzdmTaskBot("sess=test;")
+    for obj in cases():
+        assert bot.get_touchstone_event(obj).encode("utf-8") == reference(obj).encode("utf-8"), obj
+
+
+if __name__ == "__main__":
+    test_prefix_matches_json_dumps()
+    test_touchstone_event_matches_json_dumps()
+    print("ok")